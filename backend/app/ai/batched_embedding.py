@@ -0,0 +1,130 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+from app.core.metrics import metrics
+
+QUEUE_WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+PendingQuery = Tuple[str, asyncio.Future, float]
+
+# Worker threads of the instances created so far, shut down with the app
+_executors: Set[ThreadPoolExecutor] = set()
+
+
+class BatchingEmbedding(BaseEmbedding):
+    """
+    Micro-batching front for a local embedding model.
+
+    Concurrent async query embeddings are collected for up to `max_wait_ms`
+    (or until `max_batch_size` queries are waiting) and encoded with one
+    forward pass on a dedicated worker thread, so the event loop never runs
+    the model. Sync calls and document embeddings go straight to the wrapped
+    model. Queue wait and batch size are published as histograms.
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+    max_batch_size: int = Field(default=32, description="Flush once this many queries are waiting.")
+    max_wait_ms: float = Field(default=5.0, description="Longest time a query waits for its batch to fill.")
+
+    _pending: List[PendingQuery] = PrivateAttr(default_factory=list)
+    _flush_handle: Optional[asyncio.TimerHandle] = PrivateAttr(default=None)
+    _executor: ThreadPoolExecutor = PrivateAttr()
+
+    def __init__(self, **data):
+        data.setdefault("model_name", data["embed_model"].model_name)
+        super().__init__(**data)
+        # One worker: batches run back to back, and new queries pile up meanwhile
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        _executors.add(self._executor)
+        self._queue_wait = metrics.histogram("embedding.queue_wait_ms", QUEUE_WAIT_BUCKETS_MS)
+        self._batch_size = metrics.histogram("embedding.batch_size", BATCH_SIZE_BUCKETS)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchingEmbedding"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self.embed_model.get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self.embed_model.get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self.embed_model.get_text_embedding_batch(texts)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_model.get_text_embedding, text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_model.get_text_embedding_batch, texts)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def close(self):
+        _executors.discard(self._executor)
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def close_all():
+        """
+        Stops the workers of every instance without creating one, so shutdown
+        does not load a model that no request used.
+        """
+        while _executors:
+            _executors.pop().shutdown(wait=False)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[PendingQuery]):
+        loop = asyncio.get_running_loop()
+        try:
+            embeddings = await loop.run_in_executor(self._executor, self._encode_batch, batch)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+    def _encode_batch(self, batch: List[PendingQuery]) -> List[Embedding]:
+        # Measured on the worker, so time spent behind a running batch counts as waiting
+        started = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            self._queue_wait.observe((started - enqueued_at) * 1000)
+        self._batch_size.observe(len(batch))
+
+        return self._embed_queries([query for query, _, _ in batch])
+
+    def _embed_queries(self, queries: List[str]) -> List[Embedding]:
+        # HuggingFaceEmbedding applies the query instruction inside _embed
+        if hasattr(self.embed_model, "_embed"):
+            return self.embed_model._embed(queries, prompt_name="query")
+        return [self.embed_model.get_query_embedding(query) for query in queries]
@@ -0,0 +1,360 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Mapping, Optional, Sequence, Tuple, Union
+
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
+    CompletionResponse,
+    CompletionResponseAsyncGen,
+    CompletionResponseGen,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.llms.llm import LLM, ToolSelection
+from loguru import logger
+
+from app.core.metrics import metrics
+
+CACHE_MODES = ("off", "readwrite", "record", "replay")
+# Marks the tool calls of a replayed response in its message's additional_kwargs
+CACHED_TOOL_CALLS = "cached_tool_calls"
+
+# Stored chunks, or {"chunks", "tool_calls"} for a response that calls tools
+Entry = Union[List[str], dict]
+
+
+class LLMCacheMissError(RuntimeError):
+    """
+    Raised in replay mode when a prompt has no recorded response.
+    """
+
+
+class CachedLLM(FunctionCallingLLM):
+    """
+    Exact-match response cache around another LLM.
+
+    The key is a hash of the fully rendered prompt (or chat messages), the call
+    kind and the model parameters. Hits are served from an in-memory LRU first,
+    then from a SQLite file. Streaming calls are recorded chunk by chunk and
+    replayed as a stream with the same chunk boundaries.
+
+    Modes:
+        readwrite: serve hits, call the LLM and store on a miss
+        record:    always call the LLM and overwrite the stored response
+        replay:    serve hits only, a miss raises LLMCacheMissError
+
+    Tool calling requests are cached too: the key includes the tool
+    declarations and the tool calls of earlier rounds, and the entry stores
+    the response's tool calls next to its text. Such entries are only served
+    in replay mode, since the wrapped LLM cannot send replayed tool calls back
+    to the provider in the next round.
+    """
+
+    llm: LLM = Field(description="The wrapped LLM.")
+    mode: str = Field(default="readwrite", description="One of readwrite, record or replay.")
+    db_path: str = Field(description="SQLite file backing the on-disk tier.")
+    max_entries: int = Field(default=1000, description="Size of the in-memory LRU.")
+
+    _memory: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _memory_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _db: Optional[sqlite3.Connection] = PrivateAttr(default=None)
+    _db_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        if self.mode not in CACHE_MODES or self.mode == "off":
+            raise ValueError(f"Invalid LLM cache mode: {self.mode}")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self.llm.metadata
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        key = self._key("chat", self._render_messages(messages), kwargs)
+        entry = self._read(key)
+        if entry is None:
+            response = self.llm.chat(messages, **kwargs)
+            entry = self._write(key, [response.message.content or ""], self._recorded_tool_calls(response, kwargs))
+        return self._chat_response(entry)
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        key = self._key("complete", prompt, kwargs)
+        entry = self._read(key)
+        if entry is None:
+            response = self.llm.complete(prompt, formatted=formatted, **kwargs)
+            entry = self._write(key, [response.text])
+        return CompletionResponse(text="".join(entry))
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseGen:
+        key = self._key("stream_chat", self._render_messages(messages), kwargs)
+        entry = self._read(key)
+        if entry is not None:
+            return self._replay_chat(entry)
+
+        def gen() -> ChatResponseGen:
+            chunks, response = [], None
+            for response in self.llm.stream_chat(messages, **kwargs):
+                chunks.append(response.delta or "")
+                yield response
+            self._write(key, chunks, self._recorded_tool_calls(response, kwargs))
+
+        return gen()
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        key = self._key("stream_complete", prompt, kwargs)
+        entry = self._read(key)
+        if entry is not None:
+            return self._replay_completion(entry)
+
+        def gen() -> CompletionResponseGen:
+            chunks = []
+            for response in self.llm.stream_complete(prompt, formatted=formatted, **kwargs):
+                chunks.append(response.delta or "")
+                yield response
+            self._write(key, chunks)
+
+        return gen()
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        key = self._key("chat", self._render_messages(messages), kwargs)
+        entry = await asyncio.to_thread(self._read, key)
+        if entry is None:
+            response = await self.llm.achat(messages, **kwargs)
+            entry = await asyncio.to_thread(
+                self._write, key, [response.message.content or ""], self._recorded_tool_calls(response, kwargs)
+            )
+        return self._chat_response(entry)
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        key = self._key("complete", prompt, kwargs)
+        entry = await asyncio.to_thread(self._read, key)
+        if entry is None:
+            response = await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+            entry = await asyncio.to_thread(self._write, key, [response.text])
+        return CompletionResponse(text="".join(entry))
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponseAsyncGen:
+        key = self._key("stream_chat", self._render_messages(messages), kwargs)
+        entry = await asyncio.to_thread(self._read, key)
+        if entry is not None:
+            return self._areplay(self._replay_chat(entry))
+
+        async def gen() -> ChatResponseAsyncGen:
+            chunks, response = [], None
+            async for response in await self.llm.astream_chat(messages, **kwargs):
+                chunks.append(response.delta or "")
+                yield response
+            await asyncio.to_thread(self._write, key, chunks, self._recorded_tool_calls(response, kwargs))
+
+        return gen()
+
+    async def astream_complete(
+            self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        key = self._key("stream_complete", prompt, kwargs)
+        entry = await asyncio.to_thread(self._read, key)
+        if entry is not None:
+            return self._areplay(self._replay_completion(entry))
+
+        async def gen() -> CompletionResponseAsyncGen:
+            chunks = []
+            async for response in await self.llm.astream_complete(prompt, formatted=formatted, **kwargs):
+                chunks.append(response.delta or "")
+                yield response
+            await asyncio.to_thread(self._write, key, chunks)
+
+        return gen()
+
+    def _prepare_chat_with_tools(self, tools, user_msg=None, chat_history=None, **kwargs: Any) -> dict:
+        return self.llm._prepare_chat_with_tools(tools, user_msg=user_msg, chat_history=chat_history, **kwargs)
+
+    def _validate_chat_with_tools_response(self, response: ChatResponse, tools, **kwargs: Any) -> ChatResponse:
+        return self.llm._validate_chat_with_tools_response(response, tools, **kwargs)
+
+    def get_tool_calls_from_response(
+            self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs: Any
+    ) -> List[ToolSelection]:
+        cached = response.message.additional_kwargs.get(CACHED_TOOL_CALLS)
+        if cached is None:
+            return self.llm.get_tool_calls_from_response(
+                response, error_on_no_tool_call=error_on_no_tool_call, **kwargs
+            )
+        if not cached and error_on_no_tool_call:
+            raise ValueError("Expected at least one tool call, but got 0 tool calls.")
+        return [ToolSelection(**tool_call) for tool_call in cached]
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _key(self, kind: str, prompt: str, kwargs: dict) -> str:
+        params = {
+            "kind": kind,
+            "model": self.llm.metadata.model_name,
+            "temperature": getattr(self.llm, "temperature", None),
+            "max_tokens": getattr(self.llm, "max_tokens", None),
+            "kwargs": plain(kwargs),
+            "prompt": prompt,
+        }
+        encoded = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _render_messages(self, messages: Sequence[ChatMessage]) -> str:
+        rendered = []
+        for message in messages:
+            item = [message.role.value, message.content or ""]
+            # Tool ids are random per call, the calls themselves identify the round
+            tool_calls = [
+                [tool_call.tool_name, plain(tool_call.tool_kwargs)]
+                for tool_call in self.get_tool_calls_from_response(
+                    ChatResponse(message=message), error_on_no_tool_call=False
+                )
+            ] if message.additional_kwargs else []
+            if tool_calls:
+                item.append(tool_calls)
+            if message.role == MessageRole.TOOL:
+                item.append(message.additional_kwargs.get("name"))
+            rendered.append(item)
+        return json.dumps(rendered, ensure_ascii=False, default=str)
+
+    def _recorded_tool_calls(self, response: Optional[ChatResponse], kwargs: dict) -> List[dict]:
+        if response is None or "tools" not in kwargs:
+            return []
+        return [
+            {"tool_id": tool_call.tool_id, "tool_name": tool_call.tool_name, "tool_kwargs": plain(tool_call.tool_kwargs)}
+            for tool_call in self.get_tool_calls_from_response(response, error_on_no_tool_call=False)
+        ]
+
+    def _read(self, key: str) -> Optional[Entry]:
+        if self.mode == "record":
+            return None
+
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        tier = "memory"
+
+        if entry is None:
+            with self._db_lock:
+                row = self._connect().execute("SELECT chunks FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                entry = json.loads(row[0])
+                self._remember(key, entry)
+                tier = "disk"
+
+        if entry is not None and (self.mode == "replay" or not isinstance(entry, dict)):
+            metrics.counter(f"llm_cache.{tier}_hits").inc()
+            return entry
+
+        metrics.counter("llm_cache.misses").inc()
+        if self.mode == "replay":
+            raise LLMCacheMissError(f"No recorded LLM response for key {key}")
+        return None
+
+    def _write(self, key: str, chunks: List[str], tool_calls: Optional[List[dict]] = None) -> Entry:
+        entry = {"chunks": chunks, "tool_calls": tool_calls} if tool_calls else chunks
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, chunks, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(entry, ensure_ascii=False), time.time())
+            )
+            db.commit()
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: Entry):
+        with self._memory_lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, chunks TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            logger.info(f"LLM cache opened at {self.db_path} in {self.mode} mode")
+        return self._db
+
+    @staticmethod
+    def _chat_response(entry: Entry) -> ChatResponse:
+        chunks, additional_kwargs = unpack_entry(entry)
+        return ChatResponse(message=ChatMessage(
+            role=MessageRole.ASSISTANT, content="".join(chunks), additional_kwargs=additional_kwargs
+        ))
+
+    @staticmethod
+    def _replay_chat(entry: Entry) -> ChatResponseGen:
+        chunks, additional_kwargs = unpack_entry(entry)
+        content = ""
+        # A response of tool calls only still needs one item to carry them
+        for chunk in chunks or ([""] if additional_kwargs else []):
+            content += chunk
+            message = ChatMessage(role=MessageRole.ASSISTANT, content=content, additional_kwargs=additional_kwargs)
+            yield ChatResponse(message=message, delta=chunk)
+
+    @staticmethod
+    def _replay_completion(chunks: List[str]) -> CompletionResponseGen:
+        text = ""
+        for chunk in chunks:
+            text += chunk
+            yield CompletionResponse(text=text, delta=chunk)
+
+    @staticmethod
+    async def _areplay(gen):
+        for response in gen:
+            yield response
+
+
+def unpack_entry(entry: Entry) -> Tuple[List[str], dict]:
+    """
+    Chunks of a stored entry and the additional_kwargs carrying its tool calls.
+    """
+    if isinstance(entry, dict):
+        return entry["chunks"], {CACHED_TOOL_CALLS: entry["tool_calls"]}
+    return entry, {}
+
+
+def plain(value: Any) -> Any:
+    """
+    JSON-ready copy of tool declarations and arguments, which providers may
+    hand over as pydantic models or protobuf messages and containers.
+    """
+    if isinstance(value, Mapping):
+        return {str(key): plain(item) for key, item in value.items()}
+    if isinstance(value, Sequence) and not isinstance(value, (str, bytes)):
+        return [plain(item) for item in value]
+    if hasattr(value, "model_dump"):
+        return plain(value.model_dump(exclude_none=True))
+    if hasattr(value, "DESCRIPTOR"):
+        from google.protobuf.json_format import MessageToDict
+
+        return MessageToDict(getattr(value, "_pb", value))
+    return value
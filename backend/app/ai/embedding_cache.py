@@ -0,0 +1,309 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+from app.core.metrics import metrics
+
+KEY_BYTES = 16
+# Rows indexed in the recent-keys dict before they are merged into the sorted arrays
+MERGE_ROWS = 16384
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class KeyIndex:
+    """
+    Compact key -> row index, about 12 bytes per row.
+
+    The first 8 bytes of every key are kept in a sorted uint64 array next to
+    the row numbers and looked up with a binary search; the full key is then
+    compared against the keys file, so prefix collisions are harmless. Newly
+    added rows wait in a small dict and are merged into the arrays in bulk.
+    """
+
+    def __init__(self, merge_rows: int = MERGE_ROWS):
+        self.merge_rows = merge_rows
+        # Sorted key prefixes and their rows, swapped as one tuple
+        self._sorted = (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint32))
+        self._recent: Dict[bytes, int] = {}
+        self._keys: Optional[np.ndarray] = None
+
+    def __contains__(self, key: bytes) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: bytes) -> Optional[int]:
+        row = self._recent.get(key)
+        if row is not None:
+            return row
+
+        (prefixes, rows), keys = self._sorted, self._keys
+        prefix = np.frombuffer(key, dtype=np.uint64, count=1)[0]
+        start = int(np.searchsorted(prefixes, prefix, side="left"))
+        while start < len(prefixes) and prefixes[start] == prefix:
+            row = int(rows[start])
+            if keys[row].tobytes() == key:
+                return row
+            start += 1
+        return None
+
+    def extend(self, keys: np.ndarray, first_row: int, new_keys: bytes):
+        """
+        Indexes `new_keys`, stored from `first_row` on; `keys` maps the whole keys file.
+        """
+        self._keys = keys
+        count = len(new_keys) // KEY_BYTES
+        if len(self._recent) + count < self.merge_rows:
+            for i in range(count):
+                self._recent[new_keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]] = first_row + i
+            return
+
+        recent = dict(self._recent)
+        sorted_prefixes, sorted_rows = self._sorted
+        prefixes = np.concatenate([
+            sorted_prefixes,
+            self._key_prefixes(b"".join(recent)),
+            self._key_prefixes(new_keys),
+        ])
+        rows = np.concatenate([
+            sorted_rows,
+            np.fromiter(recent.values(), dtype=np.uint32, count=len(recent)),
+            np.arange(first_row, first_row + count, dtype=np.uint32),
+        ])
+        order = np.argsort(prefixes, kind="stable")
+        # Readers on other threads find a key in the recent dict or in the merged arrays
+        self._sorted = (prefixes[order], rows[order])
+        self._recent = {}
+
+    @staticmethod
+    def _key_prefixes(keys: bytes) -> np.ndarray:
+        matrix = np.frombuffer(keys, dtype=np.uint8).reshape(-1, KEY_BYTES)
+        return np.ascontiguousarray(matrix[:, :8]).view(np.uint64).ravel()
+
+
+class EmbeddingStore:
+    """
+    Append-only, content-addressed vector file.
+
+    `vectors.f32` holds float32 rows and `keys.bin` the 16-byte key of each
+    row, in the same order. Lookups read straight from a read-only memory map,
+    so several processes can share one store; appends take an exclusive file
+    lock, and readers pick up rows written by other processes on their next
+    miss. `refresh` and `put_many` do file IO; async callers run them on a
+    worker thread.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._keys_path = os.path.join(directory, "keys.bin")
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._lock_path = os.path.join(directory, ".lock")
+
+        self.dim: Optional[int] = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.dim = json.load(f)["dim"]
+
+        self._index = KeyIndex()
+        self._rows = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self._index.get(key)
+        if row is None:
+            return None
+        return self._vectors[row]
+
+    def refresh(self):
+        """
+        Indexes rows appended since the last refresh, including by other processes.
+        """
+        with self._lock:
+            if self.dim is None or not os.path.exists(self._keys_path):
+                return
+
+            rows = os.path.getsize(self._keys_path) // KEY_BYTES
+            if rows == self._rows:
+                return
+
+            with open(self._keys_path, "rb") as f:
+                f.seek(self._rows * KEY_BYTES)
+                new_keys = f.read((rows - self._rows) * KEY_BYTES)
+
+            # Maps first, so a row is never indexed before it can be read
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            keys = np.memmap(self._keys_path, dtype=np.uint8, mode="r", shape=(rows, KEY_BYTES))
+            self._index.extend(keys, self._rows, new_keys)
+            self._rows = rows
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    with open(self._meta_path, "w") as f:
+                        json.dump({"dim": self.dim}, f)
+                self.refresh()
+
+                fresh, seen = [], set()
+                for i, key in enumerate(keys):
+                    if key not in seen and key not in self._index:
+                        seen.add(key)
+                        fresh.append(i)
+                if not fresh:
+                    return
+
+                # A crash between the two writes leaves vectors without keys, drop them first
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(self._rows * self.dim * 4)
+                    f.write(vectors[fresh].tobytes())
+                with open(self._keys_path, "ab") as f:
+                    f.write(b"".join(keys[i] for i in fresh))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        self.refresh()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Persistent embedding cache in front of another embedding model.
+
+    Keys are a hash of the model name, the embedding kind (query or text) and
+    the NFC, whitespace-normalized text, so the cache survives restarts and
+    model switches never return stale vectors. Misses in a batch are embedded
+    together by the wrapped model.
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+    cache_dir: str = Field(description="Directory of the on-disk vector store.")
+
+    _store: EmbeddingStore = PrivateAttr()
+
+    def __init__(self, **data):
+        data.setdefault("model_name", data["embed_model"].model_name)
+        data.setdefault("embed_batch_size", data["embed_model"].embed_batch_size)
+        super().__init__(**data)
+        slug = re.sub(r"[^\w.-]+", "_", self.model_name)
+        self._store = EmbeddingStore(os.path.join(self.cache_dir, slug))
+
+        self._hits = metrics.counter("embedding_cache.hits")
+        self._misses = metrics.counter("embedding_cache.misses")
+        metrics.gauge("embedding_cache", lambda: {"rows": len(self._store)})
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = self._key("query", query)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        embedding = self.embed_model.get_query_embedding(query)
+        self._store.put_many([key], np.asarray([embedding]))
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = self._key("query", query)
+        cached = await self._alookup(key)
+        if cached is not None:
+            return cached
+
+        embedding = await self.embed_model.aget_query_embedding(query)
+        await asyncio.to_thread(self._store.put_many, [key], np.asarray([embedding]))
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, embeddings, missing = self._lookup_many(texts)
+        if missing:
+            computed = self.embed_model.get_text_embedding_batch([texts[i] for i in missing])
+            self._fill(keys, embeddings, missing, computed)
+        return embeddings
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys = [self._key("text", text) for text in texts]
+        embeddings = [self._get(key) for key in keys]
+        if any(embedding is None for embedding in embeddings):
+            # Another worker may have embedded them in the meantime
+            await asyncio.to_thread(self._store.refresh)
+            embeddings = [self._count(embedding if embedding is not None else self._get(key))
+                          for key, embedding in zip(keys, embeddings)]
+        else:
+            for embedding in embeddings:
+                self._count(embedding)
+
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = await self.embed_model.aget_text_embedding_batch([texts[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+            await asyncio.to_thread(self._store.put_many, [keys[i] for i in missing], np.asarray(computed))
+        return embeddings
+
+    def _key(self, kind: str, text: str) -> bytes:
+        content = f"{self.model_name}\0{kind}\0{normalize_text(text)}"
+        return hashlib.sha256(content.encode("utf-8")).digest()[:KEY_BYTES]
+
+    def _lookup(self, key: bytes) -> Optional[Embedding]:
+        embedding = self._get(key)
+        if embedding is None:
+            # Another worker may have embedded it in the meantime
+            self._store.refresh()
+            embedding = self._get(key)
+        return self._count(embedding)
+
+    async def _alookup(self, key: bytes) -> Optional[Embedding]:
+        embedding = self._get(key)
+        if embedding is None:
+            await asyncio.to_thread(self._store.refresh)
+            embedding = self._get(key)
+        return self._count(embedding)
+
+    def _get(self, key: bytes) -> Optional[Embedding]:
+        vector = self._store.get(key)
+        return None if vector is None else vector.tolist()
+
+    def _count(self, embedding: Optional[Embedding]) -> Optional[Embedding]:
+        (self._misses if embedding is None else self._hits).inc()
+        return embedding
+
+    def _lookup_many(self, texts: List[str]):
+        keys = [self._key("text", text) for text in texts]
+        embeddings = [self._lookup(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        return keys, embeddings, missing
+
+    def _fill(self, keys: List[bytes], embeddings: List[Optional[Embedding]], missing: List[int], computed):
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+        self._store.put_many([keys[i] for i in missing], np.asarray(computed))
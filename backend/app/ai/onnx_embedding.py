@@ -0,0 +1,97 @@
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from fastembed import TextEmbedding
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from loguru import logger
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+
+def quantize_export(export_dir: Path, model_file: str, output_dir: Path) -> Path:
+    """
+    Writes an int8 dynamically quantized copy of an ONNX export, along with its
+    tokenizer and config files, unless it already exists.
+    """
+    output_model = output_dir / model_file
+    if output_model.exists():
+        return output_dir
+
+    logger.info(f"Quantizing {export_dir / model_file} to int8, this only happens once")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for path in export_dir.iterdir():
+        # The weights are rewritten by the quantizer, everything else is copied as is
+        if path.is_file() and not path.name.startswith(model_file):
+            shutil.copy2(path, output_dir / path.name)
+
+    tmp_model = output_dir / f"{model_file}.tmp"
+    quantize_dynamic(str(export_dir / model_file), str(tmp_model), weight_type=QuantType.QInt8)
+    os.replace(tmp_model, output_model)
+    return output_dir
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """
+    ONNX Runtime backend for the sentence-transformers embedding models.
+
+    The fp32 ONNX export of `model_name` is fetched through fastembed and, with
+    `quantize` on, converted once to int8 with dynamic quantization. Mean
+    pooling, L2 normalization and the (empty by default) instructions match
+    HuggingFaceEmbedding, so the vectors stay compatible with a collection
+    indexed by the torch backend. Torch is never imported.
+    """
+
+    cache_dir: Optional[str] = Field(default=None, description="Where ONNX exports are downloaded and quantized.")
+    quantize: bool = Field(default=True, description="Run the int8 quantized export.")
+    threads: Optional[int] = Field(default=None, description="ONNX Runtime intra-op threads.")
+    query_instruction: str = Field(default="", description="Prefix for query texts.")
+    text_instruction: str = Field(default="", description="Prefix for document texts.")
+
+    _model: TextEmbedding = PrivateAttr()
+
+    def __init__(self, **data):
+        super().__init__(**data)
+
+        # Loading is lazy, so the fp32 weights are only read if they are actually used
+        export = TextEmbedding(self.model_name, cache_dir=self.cache_dir, threads=self.threads, lazy_load=True)
+        if not self.quantize:
+            self._model = export
+            return
+
+        export_dir = Path(export.model._model_dir)
+        model_file = export.model.model_description.model_file
+        quantized_dir = quantize_export(export_dir, model_file, export_dir.parent / f"{export_dir.name}-int8")
+        self._model = TextEmbedding(
+            self.model_name,
+            cache_dir=self.cache_dir,
+            threads=self.threads,
+            specific_model_path=str(quantized_dir),
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embed([query], prompt_name="query")[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed([text], prompt_name="text")[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed(texts, prompt_name="text")
+
+    def _embed(self, texts: List[str], prompt_name: str = "text") -> List[Embedding]:
+        instruction = self.query_instruction if prompt_name == "query" else self.text_instruction
+        if instruction:
+            texts = [f"{instruction} {text}".strip() for text in texts]
+
+        matrix = np.stack(list(self._model.embed(texts, batch_size=self.embed_batch_size)))
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+        return matrix.tolist()
@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.analytics.dataset import CATEGORICAL_FIELDS, FLAG_FIELDS, NUMERIC_FIELDS, iter_chunks
+
+
+class ColumnStore:
+    """
+    The product table as one memory-mapped .npy file per column.
+
+    Numeric columns are float64 with NaN for missing values; categorical and
+    flag columns are int32 dictionary codes (-1 for missing) with their
+    categories in meta.json. The store remembers the size and mtime of the
+    source file it was built from so it can tell when it is stale.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.rows = 0
+        self.meta: dict = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._categories: Dict[str, List] = {}
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_path)
+
+    def is_stale(self, source_path: str) -> bool:
+        if not self.exists():
+            return True
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        return meta.get("source_fingerprint") != source_fingerprint(source_path)
+
+    def open(self) -> "ColumnStore":
+        with open(self.meta_path) as f:
+            self.meta = json.load(f)
+
+        self.rows = self.meta["rows"]
+        self._columns, self._categories = {}, {}
+        for name, column in self.meta["columns"].items():
+            self._columns[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+            if column["kind"] == "categorical":
+                self._categories[name] = column["categories"]
+        return self
+
+    def build(self, source_path: str, chunksize: int = 100_000) -> "ColumnStore":
+        rows, arrays, columns = encode_chunks(iter_chunks(source_path, chunksize))
+
+        # Write next to the live store and swap, readers keep their old maps
+        staging = f"{self.directory}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f"{name}.npy"), array)
+
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({
+                "rows": rows,
+                "columns": columns,
+                "source_fingerprint": source_fingerprint(source_path),
+            }, f, ensure_ascii=False)
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(staging, self.directory)
+        logger.info(f"Built column store with {rows} rows and {len(columns)} columns in {self.directory}")
+        return self.open()
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "ColumnStore":
+        """
+        In-memory store over a few normalized rows, nothing is written.
+        """
+        store = cls("")
+        store.rows, store._columns, columns = encode_chunks([frame])
+        store.meta = {"rows": store.rows, "columns": columns}
+        store._categories = {
+            name: column["categories"] for name, column in columns.items() if column["kind"] == "categorical"
+        }
+        return store
+
+    def has(self, name: str) -> bool:
+        return name in self._columns
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            raise ValueError(f"Unknown field '{name}', available: {', '.join(self._columns)}")
+        return self._columns[name]
+
+    def categories(self, name: str) -> Optional[List]:
+        return self._categories.get(name)
+
+    def is_numeric(self, name: str) -> bool:
+        return self.has(name) and name not in self._categories
+
+
+def encode_chunks(chunks: Iterable[pd.DataFrame]) -> Tuple[int, Dict[str, np.ndarray], Dict[str, dict]]:
+    """
+    Encodes normalized chunks into whole columns. Returns the row count, the
+    arrays and the column descriptions of meta.json.
+    """
+    numeric: Dict[str, List[np.ndarray]] = {}
+    codes: Dict[str, List[np.ndarray]] = {}
+    vocabularies: Dict[str, Dict] = {name: {False: 0, True: 1} for name in FLAG_FIELDS}
+
+    rows = 0
+    for chunk in chunks:
+        for name in NUMERIC_FIELDS:
+            if name in chunk.columns:
+                numeric.setdefault(name, []).append(chunk[name].to_numpy(dtype=np.float64, na_value=np.nan))
+        for name in CATEGORICAL_FIELDS:
+            if name in chunk.columns:
+                vocabulary = vocabularies.setdefault(name, {})
+                codes.setdefault(name, []).append(encode(chunk[name], vocabulary))
+        rows += len(chunk)
+
+    arrays, columns = {}, {}
+    for name, parts in numeric.items():
+        arrays[name] = np.concatenate(parts)
+        columns[name] = {"kind": "numeric"}
+    for name, parts in codes.items():
+        arrays[name] = np.concatenate(parts)
+        vocabulary = vocabularies[name]
+        columns[name] = {"kind": "categorical", "categories": sorted(vocabulary, key=vocabulary.get)}
+    return rows, arrays, columns
+
+
+def encode(series: pd.Series, vocabulary: Dict) -> np.ndarray:
+    for value in pd.unique(series.dropna()):
+        vocabulary.setdefault(value.item() if isinstance(value, np.generic) else value, len(vocabulary))
+    return series.map(vocabulary).fillna(-1).to_numpy(dtype=np.int32)
+
+
+def source_fingerprint(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
@@ -0,0 +1,113 @@
+import io
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from app.chatbot.query_analyzer import BRAND_FIELD, DELIVERY_TYPE_FIELD, HAS_VIDEO_FIELD, PAY_LATER_FIELD
+
+# Columns of the TIKI product table
+NUMERIC_FIELDS = {
+    "price": "giá bán",
+    "quantity_sold": "số lượng đã bán",
+    "rating_average": "điểm đánh giá trung bình",
+    "review_count": "số lượt đánh giá",
+    "favourite_count": "số lượt yêu thích",
+    "number_of_images": "số lượng hình ảnh",
+}
+CATEGORICAL_FIELDS = {
+    DELIVERY_TYPE_FIELD: "loại giao hàng (dropship / seller_delivery / tiki_delivery)",
+    BRAND_FIELD: "thương hiệu",
+    HAS_VIDEO_FIELD: "có video (true / false)",
+    PAY_LATER_FIELD: "hỗ trợ mua trả sau (true / false)",
+}
+FLAG_FIELDS = (HAS_VIDEO_FIELD, PAY_LATER_FIELD)
+
+FLAG_VALUES = {
+    True: True, False: False, 1: True, 0: False,
+    "true": True, "false": False, "1": True, "0": False, "yes": True, "no": False,
+}
+
+
+def describe_fields() -> str:
+    return "\n".join(
+        f"  - {name}: {description}"
+        for name, description in {**NUMERIC_FIELDS, **CATEGORICAL_FIELDS}.items()
+    )
+
+
+def parse_flag(value):
+    if isinstance(value, str):
+        value = value.strip().lower()
+    try:
+        return FLAG_VALUES.get(value)
+    except TypeError:
+        return None
+
+
+def normalize_chunk(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Coerces numeric columns to float and flag columns to booleans, missing
+    values stay NaN / None.
+    """
+    frame = frame.copy()
+    for column in NUMERIC_FIELDS:
+        if column in frame.columns:
+            frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    for column in FLAG_FIELDS:
+        if column in frame.columns:
+            frame[column] = frame[column].map(parse_flag).astype(object)
+    return frame
+
+
+class BoundedReader(io.RawIOBase):
+    """
+    Binary file that ends after `limit` bytes, whatever is written after them.
+    """
+
+    def __init__(self, path: str, limit: int):
+        self._file = open(path, "rb")
+        self._remaining = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def iter_chunks(path: str, chunksize: int = 100_000, max_bytes: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Streams a CSV, JSON lines or Parquet product file in normalized chunks.
+    With `max_bytes`, a CSV or JSON lines file is read only up to that offset.
+    """
+    if path.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+        for start in range(0, len(frame), chunksize):
+            yield normalize_chunk(frame.iloc[start:start + chunksize])
+        return
+
+    source = path
+    if max_bytes is not None:
+        source = io.TextIOWrapper(io.BufferedReader(BoundedReader(path, max_bytes)), encoding="utf-8")
+
+    try:
+        if path.endswith((".jsonl", ".ndjson")):
+            reader = pd.read_json(source, lines=True, chunksize=chunksize)
+        else:
+            reader = pd.read_csv(source, chunksize=chunksize)
+
+        with reader:
+            for chunk in reader:
+                yield normalize_chunk(chunk)
+    finally:
+        if source is not path:
+            source.close()
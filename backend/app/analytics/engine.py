@@ -0,0 +1,308 @@
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.analytics.column_store import ColumnStore, source_fingerprint
+from app.analytics.dataset import FLAG_FIELDS, parse_flag
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+AGGREGATIONS = ("count", "sum", "mean", "median", "min", "max")
+FILTER_CLAUSE = re.compile(r"^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.+?)\s*$")
+
+
+class AnalyticsEngine:
+    """
+    Vectorized analytics over the memory-mapped product column store.
+
+    Every operation takes a filter expression such as
+    `delivery_type=dropship,tiki_delivery; has_video=true; price>=100000`
+    and works on whole columns with NumPy, so a query over millions of rows
+    is a few passes over contiguous arrays. The store is rebuilt from the
+    source file when the file changes, which is checked at most every
+    `check_seconds` with a stat of the file.
+    """
+
+    def __init__(
+            self,
+            source_path: str,
+            store_dir: str,
+            chunksize: int = 100_000,
+            check_seconds: float = 5,
+    ):
+        self.source_path = source_path
+        self.store_dir = store_dir
+        self.chunksize = chunksize
+        self.check_seconds = check_seconds
+
+        self._store: Optional[ColumnStore] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def over(cls, store: ColumnStore) -> "AnalyticsEngine":
+        """
+        Engine over a fixed store with no source file, e.g. ColumnStore.from_frame.
+        """
+        engine = cls(source_path="", store_dir=store.directory, check_seconds=math.inf)
+        engine._store = store
+        return engine
+
+    def available(self) -> bool:
+        return os.path.exists(self.source_path) or ColumnStore(self.store_dir).exists()
+
+    def load(self) -> ColumnStore:
+        store = self._store
+        if store is not None and time.monotonic() - self._checked_at < self.check_seconds:
+            return store
+
+        with self._lock:
+            store = self._store
+            if store is not None and time.monotonic() - self._checked_at < self.check_seconds:
+                return store
+
+            fingerprint = source_fingerprint(self.source_path)
+            if store is None or (fingerprint is not None and fingerprint != store.meta.get("source_fingerprint")):
+                # A fresh instance, readers holding the current one keep its maps
+                store = ColumnStore(self.store_dir)
+                if fingerprint is not None and store.is_stale(self.source_path):
+                    store.build(self.source_path, self.chunksize)
+                else:
+                    store.open()
+                self._store = store
+            self._checked_at = time.monotonic()
+        return store
+
+    def mask(self, filters: str = "", store: Optional[ColumnStore] = None) -> np.ndarray:
+        store = store or self.load()
+        mask = np.ones(store.rows, dtype=bool)
+        for clause in filter(None, (filters or "").split(";")):
+            match = FILTER_CLAUSE.match(clause)
+            if not match:
+                raise ValueError(f"Invalid filter '{clause.strip()}', expected field=value or field>=number")
+
+            name, op, raw = match.groups()
+            column = store.column(name)
+            if store.is_numeric(name):
+                mask &= compare(column, op, float(raw))
+                continue
+
+            if op not in ("=", "!="):
+                raise ValueError(f"Field '{name}' is categorical, only = and != are supported")
+            selected = np.isin(column, self._codes(store, name, raw.split(",")))
+            mask &= selected if op == "=" else ~selected & (column >= 0)
+
+        return mask
+
+    def group_by(
+            self,
+            metric: str,
+            by: str,
+            agg: str = "sum",
+            filters: str = "",
+            top_n: Optional[int] = None,
+            ascending: bool = False,
+    ) -> dict:
+        """
+        Aggregates `metric` per value of the field `by`; metric "count" counts
+        rows. A numeric `by` groups on its distinct values. With `top_n`, only
+        the best groups are returned.
+        """
+        store = self.load()
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{agg}', expected one of {', '.join(AGGREGATIONS)}")
+
+        mask = self.mask(filters, store)
+        if store.is_numeric(by):
+            mask &= ~np.isnan(store.column(by))
+            categories, codes = np.unique(np.asarray(store.column(by)[mask]), return_inverse=True)
+            categories = categories.tolist()
+        else:
+            categories = store.categories(by)
+            codes = np.asarray(store.column(by)[mask])
+        values = None if metric == "count" or agg == "count" else np.asarray(store.column(metric)[mask])
+        result, counts = aggregate(codes, values, "count" if values is None else agg, len(categories))
+
+        present = np.flatnonzero(counts > 0)
+        order = present[np.argsort(result[present], kind="stable")]
+        if not ascending:
+            order = order[::-1]
+        if top_n is not None and top_n > 0:
+            order = order[:top_n]
+
+        total = int(counts.sum())
+        return {
+            "metric": metric,
+            "agg": "count" if values is None else agg,
+            "by": by,
+            "rows": int(mask.sum()),
+            "groups": len(present),
+            "results": [
+                {
+                    "group": categories[i],
+                    "value": round_value(result[i]),
+                    "count": int(counts[i]),
+                    "share": round_value(counts[i] / total) if total else 0.0,
+                }
+                for i in order
+            ],
+        }
+
+    def top_n(self, metric: str, by: str, agg: str = "sum", n: int = 10, filters: str = "") -> dict:
+        return self.group_by(metric, by, agg=agg, filters=filters, top_n=n)
+
+    def percentiles(self, metric: str, percentiles: Sequence[float] = DEFAULT_PERCENTILES, filters: str = "") -> dict:
+        values = self._numeric(metric, filters)
+        if not len(values):
+            return {"metric": metric, "rows": 0}
+
+        points = np.percentile(values, percentiles)
+        return {
+            "metric": metric,
+            "rows": len(values),
+            "mean": round_value(values.mean()),
+            "std": round_value(values.std()),
+            "min": round_value(values.min()),
+            "max": round_value(values.max()),
+            "percentiles": {f"p{p:g}": round_value(v) for p, v in zip(percentiles, points)},
+        }
+
+    def histogram(self, metric: str, bins: int = 20, log_scale: bool = False, filters: str = "") -> dict:
+        values = self._numeric(metric, filters)
+        if log_scale:
+            values = values[values > 0]
+        if not len(values):
+            return {"metric": metric, "rows": 0}
+
+        if log_scale:
+            edges = np.geomspace(values.min(), values.max(), int(bins) + 1)
+            counts, edges = np.histogram(values, bins=edges)
+        else:
+            counts, edges = np.histogram(values, bins=int(bins))
+        return {
+            "metric": metric,
+            "rows": len(values),
+            "edges": [round_value(edge) for edge in edges],
+            "counts": counts.tolist(),
+        }
+
+    def correlation(self, x: str, y: str, method: str = "pearson", filters: str = "") -> dict:
+        store = self.load()
+        mask = self.mask(filters, store)
+        a = np.asarray(store.column(x)[mask], dtype=np.float64)
+        b = np.asarray(store.column(y)[mask], dtype=np.float64)
+        valid = ~(np.isnan(a) | np.isnan(b))
+        a, b = a[valid], b[valid]
+        if len(a) < 3:
+            return {"x": x, "y": y, "method": method, "rows": len(a), "r": None}
+
+        if method == "spearman":
+            a, b = rank(a), rank(b)
+        elif method != "pearson":
+            raise ValueError(f"Unknown correlation method '{method}', expected pearson or spearman")
+
+        r = np.corrcoef(a, b)[0, 1]
+        return {"x": x, "y": y, "method": method, "rows": len(a), "r": None if np.isnan(r) else round_value(r)}
+
+    def points(self, x: str, y: str, limit: Optional[int] = None, filters: str = "") -> dict:
+        """
+        Rows where both numeric fields are present as [x, y] pairs, a fixed
+        random sample of `limit` of them when there are more.
+        """
+        store = self.load()
+        mask = self.mask(filters, store)
+        matrix = np.column_stack((
+            np.asarray(store.column(x)[mask], dtype=np.float64),
+            np.asarray(store.column(y)[mask], dtype=np.float64),
+        ))
+        matrix = matrix[~np.isnan(matrix).any(axis=1)]
+        rows = len(matrix)
+        if limit is not None and rows > limit:
+            matrix = matrix[np.random.default_rng(0).choice(rows, limit, replace=False)]
+        return {"x": x, "y": y, "rows": rows, "points": matrix.tolist()}
+
+    def _numeric(self, metric: str, filters: str) -> np.ndarray:
+        store = self.load()
+        if not store.is_numeric(metric):
+            raise ValueError(f"Field '{metric}' is not numeric")
+        values = np.asarray(store.column(metric)[self.mask(filters, store)])
+        return values[~np.isnan(values)]
+
+    @staticmethod
+    def _codes(store: ColumnStore, name: str, raw_values: List[str]) -> List[int]:
+        is_flag = name in FLAG_FIELDS
+        lookup: Dict = {
+            category if is_flag else str(category).strip().lower(): code
+            for code, category in enumerate(store.categories(name))
+        }
+        keys = (parse_flag(raw) if is_flag else raw.strip().lower() for raw in raw_values)
+        return [lookup[key] for key in keys if key in lookup]
+
+
+def compare(column: np.ndarray, op: str, value: float) -> np.ndarray:
+    if op == "=":
+        return column == value
+    if op == "!=":
+        return column != value
+    if op == ">":
+        return column > value
+    if op == ">=":
+        return column >= value
+    if op == "<":
+        return column < value
+    return column <= value
+
+
+def aggregate(codes: np.ndarray, values: Optional[np.ndarray], agg: str, groups: int):
+    """
+    Per-group aggregation of `values` keyed by dictionary codes with bincount,
+    ufunc.at or sorted segments. Returns (result, counts) arrays of length `groups`.
+    """
+    valid = codes >= 0
+    if values is not None:
+        valid &= ~np.isnan(values)
+        values = values[valid]
+    codes = codes[valid]
+
+    counts = np.bincount(codes, minlength=groups)
+    if agg == "count":
+        return counts.astype(np.float64), counts
+
+    if agg in ("sum", "mean"):
+        sums = np.bincount(codes, weights=values, minlength=groups)
+        return (sums if agg == "sum" else sums / np.maximum(counts, 1)), counts
+
+    if agg in ("min", "max"):
+        result = np.full(groups, np.inf if agg == "min" else -np.inf)
+        (np.minimum if agg == "min" else np.maximum).at(result, codes, values)
+        return np.where(counts > 0, result, np.nan), counts
+
+    # Median: group rows with a stable integer sort on the codes, then select within each segment
+    order = np.argsort(codes, kind="stable")
+    segments = np.split(values[order], np.cumsum(counts)[:-1])
+    result = np.array([np.median(segment) if len(segment) else np.nan for segment in segments])
+    return result, counts
+
+
+def rank(values: np.ndarray) -> np.ndarray:
+    """
+    Average ranks, ties share the mean of their positions.
+    """
+    order = np.argsort(values, kind="mergesort")
+    sorted_values = values[order]
+    first = np.concatenate(([True], sorted_values[1:] != sorted_values[:-1]))
+    starts = np.flatnonzero(first)
+    ends = np.concatenate((starts[1:], [len(values)]))
+    average = (starts + ends + 1) / 2
+
+    ranks = np.empty(len(values))
+    ranks[order] = average[np.cumsum(first) - 1]
+    return ranks
+
+
+def round_value(value) -> float:
+    return float(np.round(value, 4))
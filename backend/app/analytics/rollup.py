@@ -0,0 +1,390 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from app.analytics.column_store import encode, source_fingerprint
+from app.analytics.dataset import FLAG_FIELDS, NUMERIC_FIELDS, iter_chunks, normalize_chunk, parse_flag
+from app.chatbot.query_analyzer import BRAND_FIELD, DELIVERY_TYPE_FIELD, HAS_VIDEO_FIELD, PAY_LATER_FIELD
+
+DIMENSIONS = (BRAND_FIELD, DELIVERY_TYPE_FIELD, HAS_VIDEO_FIELD, PAY_LATER_FIELD)
+METRICS = tuple(NUMERIC_FIELDS)
+
+# Log-bucket quantile sketch with 1% relative error, mergeable by adding bucket counts
+SKETCH_ALPHA = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+ZERO_BUCKET = np.iinfo(np.int32).min
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+class RollupCube:
+    """
+    Precomputed aggregates of the product table per cell of
+    brand x delivery type x has_video x pay_later.
+
+    Each cell holds the product count and, per numeric metric, count, sum,
+    min, max and a log-bucket quantile sketch. Queries only touch cells, never
+    rows, so their cost does not depend on the size of the table. Cells of two
+    cubes combine exactly, which is how appended rows are folded in: CSV and
+    JSON lines sources are read from the last consumed byte offset, anything
+    else (or a rewritten file) triggers a full rebuild.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.meta: dict = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.vocabularies: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _arrays_path(self) -> str:
+        return os.path.join(self.directory, "rollup.npz")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def is_loaded(self) -> bool:
+        return bool(self.arrays)
+
+    def load(self) -> bool:
+        if not os.path.exists(self._meta_path):
+            return False
+
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        with np.load(self._arrays_path) as data:
+            arrays = {name: data[name] for name in data.files}
+
+        self.meta, self.arrays = meta, arrays
+        self.vocabularies = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in meta["vocabularies"].items()
+        }
+        return True
+
+    def refresh(self, source_path: str) -> bool:
+        """
+        Folds rows appended to the source since the last refresh into the cube.
+        Returns True when the cube changed.
+        """
+        with self._lock:
+            if not self.arrays:
+                self.load()
+
+            fingerprint = source_fingerprint(source_path)
+            if fingerprint is None or fingerprint == self.meta.get("source_fingerprint"):
+                return False
+
+            if self._is_append(source_path):
+                self._append(source_path, fingerprint)
+            else:
+                self._rebuild(source_path, fingerprint)
+            return True
+
+    def _is_append(self, source_path: str) -> bool:
+        offset = self.meta.get("offset")
+        if not self.arrays or offset is None or os.path.getsize(source_path) < offset:
+            return False
+        return prefix_hash(source_path, offset) == self.meta.get("prefix_hash")
+
+    def _rebuild(self, source_path: str, fingerprint: str):
+        self.vocabularies = {name: ({False: 0, True: 1} if name in FLAG_FIELDS else {}) for name in DIMENSIONS}
+        offset = os.path.getsize(source_path) if is_line_oriented(source_path) else None
+        arrays, header = None, None
+        # Rows appended during the rebuild are left to the next append
+        for chunk in iter_chunks(source_path, max_bytes=offset):
+            header = header or list(chunk.columns)
+            arrays = combine(arrays, self._summarize_chunk(chunk))
+
+        self._save(arrays if arrays is not None else empty_arrays(), fingerprint, offset, header, source_path)
+        logger.info(f"Rebuilt rollup cube with {len(self.arrays['cells'])} cells from {source_path}")
+
+    def _append(self, source_path: str, fingerprint: str):
+        offset = self.meta["offset"]
+        with open(source_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # A writer may still be in the middle of a line
+        data = data[:data.rfind(b"\n") + 1]
+        if not data.strip():
+            return
+
+        if source_path.endswith((".jsonl", ".ndjson")):
+            frame = pd.read_json(io.BytesIO(data), lines=True)
+        else:
+            frame = pd.read_csv(io.BytesIO(data), names=self.meta["header"], header=None)
+
+        arrays = combine(self.arrays, self._summarize_chunk(normalize_chunk(frame)))
+        self._save(arrays, fingerprint, offset + len(data), self.meta["header"], source_path)
+        logger.info(f"Folded {len(frame)} appended rows into the rollup cube")
+
+    def _summarize_chunk(self, chunk: pd.DataFrame) -> Dict[str, np.ndarray]:
+        codes = np.column_stack([
+            encode(chunk[name], self.vocabularies[name]) if name in chunk.columns
+            else np.full(len(chunk), -1, dtype=np.int32)
+            for name in DIMENSIONS
+        ])
+        values = {
+            metric: chunk[metric].to_numpy(dtype=np.float64, na_value=np.nan)
+            for metric in METRICS if metric in chunk.columns
+        }
+        return summarize(codes, values)
+
+    def _save(self, arrays, fingerprint, offset, header, source_path):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {
+            "source_fingerprint": fingerprint,
+            "offset": offset,
+            "prefix_hash": prefix_hash(source_path, offset) if offset is not None else None,
+            "header": header,
+            "vocabularies": {
+                name: sorted(vocabulary, key=vocabulary.get) for name, vocabulary in self.vocabularies.items()
+            },
+        }
+
+        np.savez(os.path.join(self.directory, "rollup.tmp.npz"), **arrays)
+        os.replace(os.path.join(self.directory, "rollup.tmp.npz"), self._arrays_path)
+        with open(f"{self._meta_path}.tmp", "w") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(f"{self._meta_path}.tmp", self._meta_path)
+
+        self.meta, self.arrays = meta, arrays
+
+    def query(
+            self,
+            metric: str,
+            by: Sequence[str] = (),
+            filters: Optional[Dict[str, List]] = None,
+            quantiles: Sequence[float] = (),
+    ) -> List[dict]:
+        """
+        Aggregates `metric` ("count" for product counts) per combination of the
+        `by` dimensions over the cells matching `filters` (dimension -> values).
+        Each row has products, share, count, sum, mean, min, max and the
+        requested quantiles (0-1, from the sketch).
+        """
+        arrays = self.arrays
+        if not arrays:
+            return []
+
+        cells = arrays["cells"]
+        mask = np.ones(len(cells), dtype=bool)
+        for name, values in (filters or {}).items():
+            mask &= np.isin(cells[:, DIMENSIONS.index(name)], self._codes(name, values))
+
+        columns = [DIMENSIONS.index(name) for name in by]
+        selected = np.flatnonzero(mask)
+        keys, inverse = unique_rows(cells[selected][:, columns])
+        groups = len(keys)
+
+        products = np.bincount(inverse, weights=arrays["rows"][selected], minlength=groups)
+        total = products.sum()
+        rows = [
+            {
+                **{name: self._value(name, int(key[i])) for i, name in enumerate(by)},
+                "products": int(products[g]),
+                "share": float(products[g] / total) if total else 0.0,
+            }
+            for g, key in enumerate(keys)
+        ]
+        if metric == "count" or f"{metric}.count" not in arrays:
+            return rows
+
+        count = np.bincount(inverse, weights=arrays[f"{metric}.count"][selected], minlength=groups)
+        total_sum = np.bincount(inverse, weights=arrays[f"{metric}.sum"][selected], minlength=groups)
+        minimum = np.full(groups, np.inf)
+        maximum = np.full(groups, -np.inf)
+        np.minimum.at(minimum, inverse, arrays[f"{metric}.min"][selected])
+        np.maximum.at(maximum, inverse, arrays[f"{metric}.max"][selected])
+        estimates = self._quantiles(metric, selected, inverse, groups, quantiles) if quantiles else {}
+
+        for g, row in enumerate(rows):
+            if not count[g]:
+                continue
+            row.update({
+                "count": int(count[g]),
+                "sum": float(total_sum[g]),
+                "mean": float(total_sum[g] / count[g]),
+                "min": float(minimum[g]),
+                "max": float(maximum[g]),
+            })
+            for q, values in estimates.items():
+                row[f"p{q * 100:g}"] = float(values[g])
+        return rows
+
+    def _quantiles(
+            self, metric: str, selected: np.ndarray, inverse: np.ndarray, groups: int, quantiles: Sequence[float]
+    ) -> Dict[float, np.ndarray]:
+        """
+        Merges the sketches of each group into a dense (groups x buckets)
+        histogram with one bincount, then reads every quantile from the
+        cumulative counts.
+        """
+        arrays = self.arrays
+        group_of_cell = np.full(len(arrays["cells"]), -1, dtype=np.int64)
+        group_of_cell[selected] = inverse
+
+        group = group_of_cell[arrays[f"{metric}.sketch_cell"]]
+        keep = group >= 0
+        buckets = arrays[f"{metric}.sketch_bucket"][keep].astype(np.int64)
+        zero = buckets == ZERO_BUCKET
+        lowest = int(buckets[~zero].min(initial=0))
+        # Column 0 holds zeros, the rest are the positive buckets from the lowest up
+        index = np.where(zero, 0, buckets - lowest + 1)
+        width = int(index.max(initial=0)) + 1
+
+        dense = np.bincount(
+            group[keep] * width + index, weights=arrays[f"{metric}.sketch_count"][keep], minlength=groups * width
+        ).reshape(groups, width)
+        cumulative = np.cumsum(dense, axis=1)
+        totals = cumulative[:, -1]
+
+        estimates = {}
+        for q in quantiles:
+            position = (cumulative <= (q * (totals - 1))[:, None]).sum(axis=1)
+            values = 2 * SKETCH_GAMMA ** (position - 1 + lowest).astype(np.float64) / (SKETCH_GAMMA + 1)
+            estimates[q] = np.where(position == 0, 0.0, values)
+        return estimates
+
+    def _codes(self, name: str, values: List) -> List[int]:
+        vocabulary = self.vocabularies.get(name, {})
+        if name in FLAG_FIELDS:
+            return [vocabulary[flag] for flag in map(parse_flag, values) if flag in vocabulary]
+        lookup = {str(value).lower(): code for value, code in vocabulary.items()}
+        return [lookup[str(value).lower()] for value in values if str(value).lower() in lookup]
+
+    def _value(self, name: str, code: int):
+        if code < 0:
+            return None
+        return self.meta["vocabularies"][name][code]
+
+
+def empty_arrays() -> Dict[str, np.ndarray]:
+    return summarize(np.empty((0, len(DIMENSIONS)), dtype=np.int32), {})
+
+
+def summarize(codes: np.ndarray, values: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Cube of raw rows: every row is a one-product cell, reduced by cell.
+    """
+    rows = len(codes)
+    units = {"cells": codes.astype(np.int32), "rows": np.ones(rows, dtype=np.int64)}
+    for metric, column in values.items():
+        valid = ~np.isnan(column)
+        units[f"{metric}.count"] = valid.astype(np.int64)
+        units[f"{metric}.sum"] = np.where(valid, column, 0.0)
+        units[f"{metric}.min"] = np.where(valid, column, np.inf)
+        units[f"{metric}.max"] = np.where(valid, column, -np.inf)
+        units[f"{metric}.sketch_cell"] = np.flatnonzero(valid)
+        units[f"{metric}.sketch_bucket"] = sketch_buckets(column[valid])
+        units[f"{metric}.sketch_count"] = np.ones(int(valid.sum()), dtype=np.int64)
+    return reduce_cells(units)
+
+
+def combine(a: Optional[Dict[str, np.ndarray]], b: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    if a is None:
+        return b
+
+    offset = len(a["cells"])
+    units = {"cells": np.concatenate([a["cells"], b["cells"]]), "rows": np.concatenate([a["rows"], b["rows"]])}
+    for name in set(a) | set(b):
+        if name in units:
+            continue
+        metric, field = name.split(".")
+        parts = [
+            arrays.get(name, missing_metric(field, len(arrays["cells"])))
+            for arrays in (a, b)
+        ]
+        if field == "sketch_cell":
+            parts[1] = parts[1] + offset
+        units[name] = np.concatenate(parts)
+    return reduce_cells(units)
+
+
+def missing_metric(field: str, cells: int) -> np.ndarray:
+    if field.startswith("sketch"):
+        return np.empty(0, dtype=np.int64)
+    fill = {"count": 0, "sum": 0.0, "min": np.inf, "max": -np.inf}[field]
+    return np.full(cells, fill, dtype=np.int64 if field == "count" else np.float64)
+
+
+def reduce_cells(units: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    cells, inverse = unique_rows(units["cells"])
+    n = len(cells)
+
+    arrays = {"cells": cells.astype(np.int32), "rows": np.bincount(inverse, weights=units["rows"], minlength=n).astype(np.int64)}
+    for name, column in units.items():
+        if name in arrays or name.endswith((".sketch_bucket", ".sketch_count")):
+            continue
+        metric, field = name.split(".")
+        if field == "count":
+            arrays[name] = np.bincount(inverse, weights=column, minlength=n).astype(np.int64)
+        elif field == "sum":
+            arrays[name] = np.bincount(inverse, weights=column, minlength=n)
+        elif field in ("min", "max"):
+            result = np.full(n, np.inf if field == "min" else -np.inf)
+            (np.minimum if field == "min" else np.maximum).at(result, inverse, column)
+            arrays[name] = result
+        elif field == "sketch_cell":
+            keys = (inverse[column].astype(np.int64) << 32) + (
+                units[f"{metric}.sketch_bucket"].astype(np.int64) - ZERO_BUCKET
+            )
+            unique_keys, positions = np.unique(keys, return_inverse=True)
+            arrays[f"{metric}.sketch_cell"] = (unique_keys >> 32).astype(np.int32)
+            arrays[f"{metric}.sketch_bucket"] = ((unique_keys & 0xFFFFFFFF) + ZERO_BUCKET).astype(np.int32)
+            arrays[f"{metric}.sketch_count"] = np.bincount(
+                positions.reshape(-1), weights=units[f"{metric}.sketch_count"], minlength=len(unique_keys)
+            ).astype(np.int64)
+    return arrays
+
+
+def unique_rows(matrix: np.ndarray):
+    """
+    np.unique(matrix, axis=0, return_inverse=True) for small non-negative-ish
+    integer codes, on mixed-radix int64 keys instead of row-wise comparisons.
+    """
+    if not matrix.shape[1]:
+        return np.empty((min(len(matrix), 1), 0), dtype=matrix.dtype), np.zeros(len(matrix), dtype=np.int64)
+
+    shifted = matrix.astype(np.int64) + 1
+    keys = np.zeros(len(matrix), dtype=np.int64)
+    for column in shifted.T:
+        keys = keys * (int(column.max(initial=0)) + 1) + column
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return matrix[first], inverse.reshape(-1)
+
+
+def sketch_buckets(values: np.ndarray) -> np.ndarray:
+    buckets = np.full(len(values), ZERO_BUCKET, dtype=np.int32)
+    positive = values > 0
+    buckets[positive] = np.ceil(np.log(values[positive]) / np.log(SKETCH_GAMMA)).astype(np.int32)
+    return buckets
+
+
+def is_line_oriented(path: str) -> bool:
+    return not path.endswith(".parquet")
+
+
+def prefix_hash(path: str, offset: int) -> str:
+    """
+    Hash of the whole consumed range [0, offset), so an edit anywhere in the
+    rows already folded in forces a rebuild instead of an append.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = offset
+        while remaining > 0:
+            block = f.read(min(remaining, HASH_BLOCK_BYTES))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
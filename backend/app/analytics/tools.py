@@ -0,0 +1,76 @@
+import functools
+import json
+from typing import Callable, List, Optional
+
+from llama_index.core.tools import FunctionTool
+
+from app.analytics.dataset import describe_fields
+from app.analytics.engine import DEFAULT_PERCENTILES, AnalyticsEngine
+
+FILTERS_HELP = (
+    "`filters` is an optional expression of clauses separated by ';', e.g. "
+    "'delivery_type=dropship,tiki_delivery; has_video=true; price>=100000'."
+)
+
+
+def build_analytics_tools(engine: AnalyticsEngine) -> List[FunctionTool]:
+    """
+    Exposes the analytics engine as function-calling tools. Tools return JSON
+    strings; invalid arguments come back as an error message for the model.
+    """
+
+    def group_by(metric: str, by: str, agg: str = "sum", filters: str = "") -> str:
+        """
+        Aggregates a numeric metric per value of a categorical field (delivery_type, brand, has_video,
+        pay_later). metric may be "count" to count products. agg is one of count, sum, mean, median,
+        min, max. Returns every group with its value, product count and share of products.
+        """
+        return engine.group_by(metric, by, agg=agg, filters=filters)
+
+    def top_n(metric: str, by: str, agg: str = "sum", n: int = 10, filters: str = "") -> str:
+        """
+        Top n groups of a categorical field ranked by an aggregated metric, e.g. top 10 brands by
+        sum of quantity_sold. agg is one of count, sum, mean, median, min, max.
+        """
+        return engine.top_n(metric, by, agg=agg, n=n, filters=filters)
+
+    def percentiles(metric: str, percentiles: Optional[List[float]] = None, filters: str = "") -> str:
+        """
+        Distribution summary of a numeric field: count, mean, std, min, max and the requested
+        percentiles, 5, 25, 50, 75 and 95 by default.
+        """
+        return engine.percentiles(metric, percentiles=percentiles or DEFAULT_PERCENTILES, filters=filters)
+
+    def histogram(metric: str, bins: int = 20, log_scale: bool = False, filters: str = "") -> str:
+        """
+        Histogram of a numeric field: bin edges and product counts per bin. Use log_scale for
+        heavy-tailed fields such as price, quantity_sold or review_count.
+        """
+        return engine.histogram(metric, bins=bins, log_scale=log_scale, filters=filters)
+
+    def correlation(x: str, y: str, method: str = "pearson", filters: str = "") -> str:
+        """
+        Correlation coefficient between two numeric fields, method is pearson or spearman.
+        """
+        return engine.correlation(x, y, method=method, filters=filters)
+
+    return [
+        FunctionTool.from_defaults(
+            fn=as_json(fn),
+            name=fn.__name__,
+            description=f"{' '.join(fn.__doc__.split())} {FILTERS_HELP}\nFields:\n{describe_fields()}",
+        )
+        for fn in (group_by, top_n, percentiles, histogram, correlation)
+    ]
+
+
+def as_json(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs) -> str:
+        try:
+            result = fn(*args, **kwargs)
+        except ValueError as e:
+            result = {"error": str(e)}
+        return json.dumps(result, ensure_ascii=False)
+
+    return wrapper
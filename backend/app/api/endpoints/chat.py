@@ -1,12 +1,15 @@
 from dependency_injector.wiring import Provide, inject
-from fastapi import APIRouter, Depends
+from typing import Callable
+
+from fastapi import APIRouter, Depends, Request, WebSocket
 from fastapi.responses import StreamingResponse
-import json
 
 from app.core.containers.application_container import ApplicationContainer
 
-from app.schema.chat_schema import MessageResponse, MessageCreate
+from app.schema.chat_schema import BatchRequest, MessageResponse, MessageCreate
+from app.services.chat_connection import ChatConnection
 from app.services.chatbot_service import ChatbotService
+from app.util.sse import SSEWriter
 
 router = APIRouter(prefix="/chat", tags=["Chatbot"])
 
@@ -15,38 +18,53 @@ router = APIRouter(prefix="/chat", tags=["Chatbot"])
 @inject
 async def generate_response(
         data: MessageCreate,
-        service: ChatbotService = Depends(Provide[ApplicationContainer.services.chatbot_service])
+        request: Request,
+        service: ChatbotService = Depends(Provide[ApplicationContainer.services.chatbot_service]),
+        sse_writer: SSEWriter = Depends(Provide[ApplicationContainer.services.sse_writer])
 ):
+    # Fails with 409 before streaming when the client has to resend its full history
+    await service.resolve_session(data.session_id, data.version, data.history)
+
     async def response_generator():
         try:
             yield "event: start\ndata: \n\n"
 
-            async for chunk in service.generate_message_stream(data.session_id, data.content, data.history):
-                if chunk:
-                    # Handle error messages with ERROR: prefix
-                    if chunk.startswith("ERROR:"):
-                        error_message = chunk[6:].strip()  # Remove the ERROR: prefix and trim whitespace
-                        yield f"event: error\ndata: {error_message}\n\n"
-                        return
+            events = service.stream_turn(data.session_id, data.content, request.is_disconnected)
+            async for frame in sse_writer.frames(events):
+                yield frame
 
-                    # Handle chart data with CHART: prefix
-                    elif chunk.startswith("CHART:"):
-                        chart_json = chunk[6:]  # Remove the CHART: prefix
-                        yield f"event: chart\ndata: {chart_json}\n\n"
+        except Exception as e:
+            error_message = str(e)
+            yield f"event: error\ndata: {error_message}\n\n"
 
-                    # Handle regular text chunks
-                    else:
-                        if not isinstance(chunk, str):
-                            chunk = str(chunk)
+    return StreamingResponse(
+        response_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"  # Disable buffering in Nginx
+        }
+    )
 
-                        formatted_chunk = chunk.replace("\n", "\\n")
-                        yield f"event: message\ndata: {formatted_chunk}\n\n"
 
+@router.post("/batch")
+@inject
+async def answer_batch(
+        data: BatchRequest,
+        service: ChatbotService = Depends(Provide[ApplicationContainer.services.chatbot_service])
+):
+    # Fails with 400 before streaming when the batch is too large
+    answers = service.answer_batch(data.questions, data.max_concurrency)
+
+    async def response_generator():
+        try:
+            async for answer in answers:
+                yield f"event: answer\ndata: {answer.model_dump_json()}\n\n"
             yield "event: done\ndata: \n\n"
 
         except Exception as e:
-            error_message = str(e)
-            yield f"event: error\ndata: {error_message}\n\n"
+            yield f"event: error\ndata: {str(e)}\n\n"
 
     return StreamingResponse(
         response_generator(),
@@ -54,11 +72,32 @@ async def generate_response(
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable buffering in Nginx
+            "X-Accel-Buffering": "no"
         }
     )
 
 
+@router.websocket("/ws")
+@inject
+async def chat_socket(
+        websocket: WebSocket,
+        connection_factory: Callable[..., ChatConnection] = Depends(
+            Provide[ApplicationContainer.services.chat_connection.provider]
+        )
+):
+    # One connection serves every session of a client, see ChatConnection for the frames
+    await connection_factory(websocket=websocket).serve()
+
+
+@router.delete("/sessions/{session_id}", status_code=204)
+@inject
+async def delete_session(
+        session_id: str,
+        service: ChatbotService = Depends(Provide[ApplicationContainer.services.chatbot_service])
+):
+    await service.delete_session(session_id)
+
+
 
 
 
@@ -1,10 +1,12 @@
 from fastapi import APIRouter
 
 from app.api.endpoints.chat import router as chat_router
+from app.api.endpoints.metrics import router as metrics_router
 
 routers = APIRouter()
 router_list = [
-    chat_router
+    chat_router,
+    metrics_router
 ]
 
 for router in router_list:
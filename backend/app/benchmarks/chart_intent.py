@@ -0,0 +1,95 @@
+"""
+Evaluates the local chart intent classifier against the labelled set in
+data/chart_intent.jsonl and reports accuracy and per-query latency, overall
+and for each path that decided (rule, prototype, llm). The set holds no
+prototype sentences, and many rows avoid the chart keywords so the
+embedding and LLM paths are measured too.
+
+    python -m app.benchmarks.chart_intent [--with-llm]
+
+Run with LLM_CACHE_MODE=record once and LLM_CACHE_MODE=replay afterwards to
+make the LLM fallback offline and deterministic.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+
+from app.chatbot.intent_classifier import ChartIntentClassifier
+from app.core.config import configs
+
+DATASET_PATH = os.path.join(os.path.dirname(__file__), "data", "chart_intent.jsonl")
+
+
+def load_dataset(path: str = DATASET_PATH) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def evaluate(classifier: ChartIntentClassifier, dataset: list[dict]) -> dict:
+    # Warm up prototype embeddings so they are not billed to the first query
+    await classifier.classify("warm up")
+
+    latencies, paths, mistakes = [], {}, []
+    tp = fp = fn = correct = 0
+
+    for row in dataset:
+        started = time.perf_counter()
+        result = await classifier.classify(row["query"])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        expected = row["need_chart"]
+        path = paths.setdefault(result.source, {"samples": 0, "correct": 0})
+        path["samples"] += 1
+        path["correct"] += result.need_chart == expected
+        correct += result.need_chart == expected
+        tp += result.need_chart and expected
+        fp += result.need_chart and not expected
+        fn += expected and not result.need_chart
+        if result.need_chart != expected:
+            mistakes.append({"query": row["query"], "expected": expected, "source": result.source})
+
+    latencies = np.asarray(latencies)
+    return {
+        "samples": len(dataset),
+        "accuracy": correct / len(dataset),
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+        "paths": {
+            source: {"samples": path["samples"], "accuracy": path["correct"] / path["samples"]}
+            for source, path in paths.items()
+        },
+        "latency_ms": {
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "max": float(latencies.max()),
+        },
+        "mistakes": mistakes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--with-llm", action="store_true", help="Allow the LLM fallback for low-confidence queries")
+    args = parser.parse_args()
+
+    from app.core.containers.ai_container import AIContainer
+
+    ai = AIContainer()
+    ai.config.from_dict(configs.dict())
+    classifier = ChartIntentClassifier(
+        embed_model=ai.embed_model(),
+        llm=ai.llm_gemini() if args.with_llm else None,
+        min_margin=configs.CHART_INTENT_MIN_MARGIN,
+    )
+
+    report = asyncio.run(evaluate(classifier, load_dataset(args.dataset)))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Compares the torch and ONNX embedding backends on the queries in
+data/chart_intent.jsonl. Each backend runs in its own subprocess so peak
+memory is measured in isolation. Reports load time, peak RSS, single query
+latency, batch throughput, cosine parity against torch and top-5 neighbour
+agreement.
+
+    python -m app.benchmarks.embedding_backend [--backends torch onnx] [--min-cosine 0.99]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.benchmarks.chart_intent import DATASET_PATH, load_dataset
+from app.core.config import configs
+
+BATCH_SIZE = 32
+NEIGHBOURS = 5
+
+
+def run_backend(backend: str, queries: list[str], output_path: str) -> dict:
+    from app.core.containers.ai_container import AIContainer
+
+    ai = AIContainer()
+    ai.config.from_dict({**configs.dict(), "EMBEDDING_BACKEND": backend})
+
+    started = time.perf_counter()
+    embed_model = ai.base_embedding()
+    load_seconds = time.perf_counter() - started
+
+    embed_model.get_query_embedding("warm up")
+
+    latencies = []
+    embeddings = []
+    for query in queries:
+        started = time.perf_counter()
+        embeddings.append(embed_model.get_query_embedding(query))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    batch = (queries * (BATCH_SIZE // len(queries) + 1))[:BATCH_SIZE]
+    started = time.perf_counter()
+    embed_model.get_text_embedding_batch(batch)
+    batch_seconds = time.perf_counter() - started
+
+    np.save(output_path, np.asarray(embeddings, dtype=np.float32))
+
+    latencies = np.asarray(latencies)
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "query_latency_ms": {
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+        },
+        "batch_texts_per_second": BATCH_SIZE / batch_seconds,
+    }
+
+
+def compare(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = np.sum(reference * candidate, axis=1)
+
+    def neighbours(matrix: np.ndarray) -> np.ndarray:
+        scores = matrix @ matrix.T
+        np.fill_diagonal(scores, -np.inf)
+        return np.argsort(-scores, axis=1)[:, :NEIGHBOURS]
+
+    overlap = [
+        len(set(a) & set(b)) / NEIGHBOURS
+        for a, b in zip(neighbours(reference), neighbours(candidate))
+    ]
+    return {
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        f"top{NEIGHBOURS}_neighbour_overlap": float(np.mean(overlap)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Fail if mean cosine parity is lower")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    queries = [row["query"] for row in load_dataset(args.dataset)]
+
+    if args.run:
+        print(json.dumps(run_backend(args.run, queries, args.output)))
+        return
+
+    reports, embeddings = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends:
+            output_path = os.path.join(tmp, f"{backend}.npy")
+            result = subprocess.run(
+                [sys.executable, "-m", "app.benchmarks.embedding_backend",
+                 "--dataset", args.dataset, "--run", backend, "--output", output_path],
+                capture_output=True, text=True, check=True,
+            )
+            reports.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            embeddings[backend] = np.load(output_path)
+
+    reference = args.backends[0]
+    passed = True
+    for report in reports[1:]:
+        report["parity"] = compare(embeddings[reference], embeddings[report["backend"]])
+        passed &= report["parity"]["cosine_mean"] >= args.min_cosine
+
+    print(json.dumps({"reference": reference, "backends": reports}, indent=2))
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
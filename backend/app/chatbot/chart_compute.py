@@ -0,0 +1,205 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from llama_index.core.schema import NodeWithScore
+from loguru import logger
+
+from app.analytics.column_store import ColumnStore
+from app.analytics.dataset import normalize_chunk
+from app.analytics.engine import AGGREGATIONS, AnalyticsEngine
+from app.chatbot.chart_stream import IncrementalJSONParser
+from app.chatbot.query_analyzer import (
+    BRAND_FIELD, DELIVERY_TYPE_FIELD, HAS_VIDEO_FIELD, PAY_LATER_FIELD, QueryFilters,
+)
+from app.schema.chat_schema import ChartConfig, ChartData, ChartResponse
+
+CHART_TYPES = ("histogram", "bar", "line", "pie", "doughnut", "scatter")
+
+
+@dataclass
+class ChartSpec:
+    """
+    Compact chart description emitted by the LLM; the numbers are computed here.
+    """
+    chart_type: str
+    field: str
+    title: Optional[str] = None
+    y_field: Optional[str] = None
+    group_by: Optional[str] = None
+    agg: str = "count"
+    bins: int = 20
+    top_n: int = 10
+    x_label: Optional[str] = None
+    y_label: Optional[str] = None
+    description: Optional[str] = None
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["ChartSpec"]:
+        parser = IncrementalJSONParser()
+        parser.feed(text)
+        data = parser.value
+        if not parser.done or not data or data.get("chart_type") not in CHART_TYPES or not data.get("field"):
+            return None
+
+        known = cls.__dataclass_fields__
+        spec = cls(**{key: value for key, value in data.items() if key in known and value is not None})
+        spec.agg = spec.agg if spec.agg in AGGREGATIONS else "count"
+        try:
+            spec.bins, spec.top_n = int(spec.bins), int(spec.top_n)
+        except (TypeError, ValueError):
+            spec.bins, spec.top_n = cls.bins, cls.top_n
+        return spec
+
+
+class ChartComputeEngine:
+    """
+    Computes chart labels and datasets with the analytics engine, so the LLM
+    only has to choose what to plot and the chart numbers agree with the
+    analytics tools.
+
+    Rows come from the product column store when there is one, otherwise
+    from the retrieved Qdrant payloads that carry raw product fields. The
+    question's payload filters select the rows that have the named attributes.
+    """
+
+    def __init__(
+            self,
+            analytics: AnalyticsEngine,
+            max_points: int = 2000,
+            max_bins: int = 50,
+            min_rows: int = 5,
+    ):
+        self.analytics = analytics
+        self.max_points = max_points
+        self.max_bins = max_bins
+        self.min_rows = min_rows
+
+    def engine(self, spec: ChartSpec, nodes: List[NodeWithScore]) -> Optional[AnalyticsEngine]:
+        if self.analytics.available():
+            return self.analytics
+
+        records = [node.node.metadata for node in nodes if spec.field in node.node.metadata]
+        if not records:
+            return None
+        return AnalyticsEngine.over(ColumnStore.from_frame(normalize_chunk(pd.DataFrame(records))))
+
+    def compute(
+            self,
+            spec: ChartSpec,
+            nodes: List[NodeWithScore],
+            filters: Optional[QueryFilters] = None,
+    ) -> Optional[ChartResponse]:
+        engine = self.engine(spec, nodes)
+        if engine is None:
+            return None
+
+        store = engine.load()
+        columns = [c for c in (spec.field, spec.y_field, spec.group_by) if c]
+        if any(not store.has(column) for column in columns):
+            logger.info(f"Chart spec references fields missing from the data: {columns}")
+            return None
+
+        expression = filter_expression(filters)
+        if spec.chart_type == "scatter":
+            chart = self._scatter(engine, spec, expression)
+        elif spec.chart_type == "histogram" or (spec.group_by is None and store.is_numeric(spec.field)):
+            chart = self._histogram(engine, spec, expression)
+        else:
+            chart = self._grouped(engine, spec, expression)
+
+        if chart is None:
+            return None
+
+        labels, datasets, description = chart
+        return ChartResponse(
+            chart_data=ChartData(labels=labels, datasets=datasets),
+            chart_config=ChartConfig(
+                type="bar" if spec.chart_type == "histogram" else spec.chart_type,
+                title=spec.title,
+                x_label=spec.x_label,
+                y_label=spec.y_label,
+            ),
+            description=" ".join(part for part in (spec.description, description) if part) or None,
+        )
+
+    def _histogram(self, engine: AnalyticsEngine, spec: ChartSpec, filters: str):
+        bins = int(np.clip(spec.bins, 1, self.max_bins))
+        histogram = engine.histogram(spec.field, bins=bins, filters=filters)
+        if histogram["rows"] < self.min_rows:
+            return None
+
+        summary = engine.percentiles(spec.field, percentiles=(50,), filters=filters)
+        edges = histogram["edges"]
+        labels = [f"{format_number(lo)}–{format_number(hi)}" for lo, hi in zip(edges[:-1], edges[1:])]
+        description = (
+            f"n = {histogram['rows']}, trung vị = {format_number(summary['percentiles']['p50'])}, "
+            f"trung bình = {format_number(summary['mean'])}."
+        )
+        return labels, [make_dataset(spec.y_label or "count", histogram["counts"])], description
+
+    def _grouped(self, engine: AnalyticsEngine, spec: ChartSpec, filters: str):
+        group_by = spec.group_by or spec.field
+        count = spec.agg == "count" or group_by == spec.field
+        result = engine.group_by(
+            "count" if count else spec.field,
+            group_by,
+            agg="count" if count else spec.agg,
+            filters=filters,
+            top_n=None if spec.chart_type == "line" else max(spec.top_n, 1),
+        )
+        if result["rows"] < self.min_rows:
+            return None
+
+        groups = result["results"]
+        if spec.chart_type == "line":
+            groups = sorted(groups, key=lambda group: group["group"])
+
+        label = spec.y_label or (spec.agg if count else f"{spec.agg}({spec.field})")
+        values = [int(group["value"]) if count else group["value"] for group in groups]
+        return [str(group["group"]) for group in groups], [make_dataset(label, values)], None
+
+    def _scatter(self, engine: AnalyticsEngine, spec: ChartSpec, filters: str):
+        if not spec.y_field:
+            return None
+
+        points = engine.points(spec.field, spec.y_field, limit=self.max_points, filters=filters)
+        if points["rows"] < self.min_rows:
+            return None
+
+        correlation = engine.correlation(spec.field, spec.y_field, filters=filters)["r"]
+        data = [{"x": x, "y": y} for x, y in points["points"]]
+        description = f"n = {points['rows']}, hệ số tương quan Pearson r = {correlation or 0:.3f}."
+        return [], [make_dataset(f"{spec.y_field} / {spec.field}", data)], description
+
+
+def make_dataset(label: str, data: List[Any]) -> Dict[str, Any]:
+    return {"label": label, "data": data, "backgroundColor": "auto", "borderColor": "auto"}
+
+
+def format_number(value: float) -> str:
+    if abs(value) >= 100:
+        return f"{value:,.0f}"
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def filter_expression(filters: Optional[QueryFilters]) -> str:
+    """
+    QueryFilters as an analytics filter expression. Unlike the Qdrant filter,
+    rows missing a named attribute are left out: that exception exists for
+    collection-wide statistics chunks, not product rows.
+    """
+    if filters is None or filters.is_empty():
+        return ""
+
+    clauses = []
+    if filters.delivery_types:
+        clauses.append(f"{DELIVERY_TYPE_FIELD}={','.join(filters.delivery_types)}")
+    if filters.brands:
+        clauses.append(f"{BRAND_FIELD}={','.join(filters.brands)}")
+    if filters.has_video is not None:
+        clauses.append(f"{HAS_VIDEO_FIELD}={str(filters.has_video).lower()}")
+    if filters.pay_later is not None:
+        clauses.append(f"{PAY_LATER_FIELD}={str(filters.pay_later).lower()}")
+    return "; ".join(clauses)
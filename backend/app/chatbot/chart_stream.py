@@ -0,0 +1,232 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from app.schema.chat_schema import ChartResponse
+
+LITERAL_CHARS = set("0123456789+-.eEtrufalsn")
+
+
+class IncrementalJSONParser:
+    """
+    Parses one JSON object fed in arbitrary chunks.
+
+    Containers are attached to their parent as soon as they open, so `value`
+    always holds everything parsed so far; strings and literals are attached
+    once complete. Text before the first '{' and after the matching '}' is
+    ignored, and a malformed object restarts the scan at the next '{'.
+    """
+
+    def __init__(self):
+        self.value: Optional[Dict[str, Any]] = None
+        self.done = False
+        # Malformed objects dropped so far, lets callers notice a restart
+        self.restarts = 0
+        self._reset()
+
+    def _reset(self):
+        self.value = None
+        # Frames of [container, pending key, expected token]
+        self._stack: List[list] = []
+        self._closed = set()
+        self._token: Optional[List[str]] = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str):
+        for ch in text:
+            if self.done:
+                return
+            try:
+                self._consume(ch)
+            except ValueError:
+                self.restarts += 1
+                self._reset()
+
+    def is_closed(self, container) -> bool:
+        return id(container) in self._closed
+
+    def _consume(self, ch: str):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                self._complete_string()
+                return
+            self._token.append(ch)
+            return
+
+        if self._token is not None:
+            if ch in LITERAL_CHARS:
+                self._token.append(ch)
+                return
+            self._complete_literal()
+
+        if not self._stack:
+            if ch == "{":
+                self.value = {}
+                self._stack.append([self.value, None, "key"])
+            return
+
+        frame = self._stack[-1]
+        if ch.isspace():
+            return
+        if ch == '"':
+            self._in_string, self._token = True, []
+        elif ch in "{[":
+            container = {} if ch == "{" else []
+            self._attach(container)
+            self._stack.append([container, None, "key" if ch == "{" else "value"])
+        elif ch in "}]":
+            is_dict = isinstance(frame[0], dict)
+            if is_dict != (ch == "}") or frame[2] not in ("comma", "key" if is_dict else "value"):
+                raise ValueError(f"Unexpected {ch!r}")
+            self._stack.pop()
+            self._closed.add(id(frame[0]))
+            if not self._stack:
+                self.done = True
+        elif ch == ":" and frame[2] == "colon":
+            frame[2] = "value"
+        elif ch == "," and frame[2] == "comma":
+            frame[2] = "key" if isinstance(frame[0], dict) else "value"
+        elif ch in LITERAL_CHARS and frame[2] == "value":
+            self._token = [ch]
+        else:
+            raise ValueError(f"Unexpected {ch!r}")
+
+    def _attach(self, value):
+        frame = self._stack[-1]
+        if frame[2] != "value":
+            raise ValueError("Value without a key")
+        if isinstance(frame[0], dict):
+            frame[0][frame[1]] = value
+        else:
+            frame[0].append(value)
+        frame[2] = "comma"
+
+    def _complete_string(self):
+        text = json.loads('"' + "".join(self._token) + '"')
+        self._token = None
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and frame[2] == "key":
+            frame[1], frame[2] = text, "colon"
+        else:
+            self._attach(text)
+
+    def _complete_literal(self):
+        raw = "".join(self._token)
+        self._token = None
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid literal {raw!r}")
+        self._attach(value)
+
+
+class ChartStreamer:
+    """
+    Turns a streamed chart JSON answer into frontend events: a skeleton once
+    the chart type, title and labels are known, then dataset points as they
+    complete. When the parser drops a malformed object the chart already sent
+    is discarded and the next object streams from scratch. `result` validates
+    the finished object against ChartResponse.
+    """
+
+    def __init__(self):
+        self.parser = IncrementalJSONParser()
+        self.skeleton_sent = False
+        self._sent_points: Dict[int, int] = {}
+        self._restarts = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self.parser.feed(text)
+        events = []
+        if self.parser.restarts != self._restarts:
+            self._restarts = self.parser.restarts
+            if self.skeleton_sent:
+                events.append({"type": "chart_discard"})
+            self.skeleton_sent = False
+            self._sent_points = {}
+
+        chart = self.parser.value
+        if not isinstance(chart, dict):
+            return events
+
+        if not self.skeleton_sent:
+            if not self._skeleton_ready(chart):
+                return events
+            events.append(self._skeleton(chart))
+            self.skeleton_sent = True
+
+        points = self._new_points(chart)
+        if points:
+            events.append({"type": "chart_points", "datasets": points})
+        return events
+
+    def result(self) -> Optional[ChartResponse]:
+        chart = self.parser.value
+        if not self.parser.done or not chart:
+            return None
+
+        return ChartResponse.model_validate({
+            "chart_data": {
+                "labels": chart.get("labels") or [],
+                "datasets": chart.get("datasets", []),
+            },
+            "chart_config": {
+                "type": chart.get("chart_type", "bar"),
+                "title": chart.get("title"),
+                "x_label": chart.get("x_label"),
+                "y_label": chart.get("y_label"),
+            },
+            "description": chart.get("description"),
+        })
+
+    def _skeleton_ready(self, chart: dict) -> bool:
+        if "chart_type" not in chart or "title" not in chart:
+            return False
+        labels = chart.get("labels")
+        # Scatter charts have no labels, the datasets follow directly
+        return (isinstance(labels, list) and self.parser.is_closed(labels)) or "datasets" in chart
+
+    @staticmethod
+    def _skeleton(chart: dict) -> Dict[str, Any]:
+        return {
+            "type": "chart_skeleton",
+            "data": {"labels": chart.get("labels") or [], "datasets": []},
+            "config": {
+                "type": chart["chart_type"],
+                "title": chart["title"],
+                "x_label": chart.get("x_label"),
+                "y_label": chart.get("y_label"),
+            },
+        }
+
+    def _new_points(self, chart: dict) -> List[Dict[str, Any]]:
+        datasets = chart.get("datasets")
+        if not isinstance(datasets, list):
+            return []
+
+        points = []
+        for index, dataset in enumerate(datasets):
+            data = dataset.get("data") if isinstance(dataset, dict) else None
+            if not isinstance(data, list):
+                continue
+
+            complete = len(data)
+            # Scatter points are objects, attached to the list before they are complete
+            if data and isinstance(data[-1], (dict, list)) and not self.parser.is_closed(data[-1]):
+                complete -= 1
+
+            sent = self._sent_points.get(index, 0)
+            if complete > sent:
+                points.append({
+                    "index": index,
+                    "label": dataset.get("label"),
+                    "offset": sent,
+                    "data": data[sent:complete],
+                })
+                self._sent_points[index] = complete
+        return points
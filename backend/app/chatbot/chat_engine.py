@@ -1,23 +1,32 @@
-from typing import Optional, Dict, Any
-from app.schema.chat_schema import ChartResponse, ChartData, ChartConfig
-from llama_index.core import Settings
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
+from app.analytics.dataset import describe_fields
+from app.chatbot.chart_compute import ChartComputeEngine, ChartSpec
+from app.chatbot.chart_stream import ChartStreamer
+from app.chatbot.events import CHART, ERROR, TEXT, ChatEvent
+from app.chatbot.intent_classifier import ChartIntentClassifier, normalize_query
+from app.chatbot.prompts import RAG_PROMPT, CHART_PROMPT, CHART_SPEC_PROMPT, CONTEXT_PROMPT, CONDENSE_PROMPT
+from app.chatbot.query_analyzer import QueryAnalyzer, QueryFilters
+from app.chatbot.rollup_router import RollupRouter
+from app.chatbot.semantic_cache import CachedAnswer, SemanticCache
+from app.core.metrics import metrics
+from app.schema.chat_schema import BatchAnswer, BatchQuestion, ChartResponse
+from llama_index.core.base.llms.generic_utils import messages_to_history_str
+from llama_index.core.llms import ChatMessage, MessageRole
 from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.core.storage.chat_store import SimpleChatStore
-from llama_index.core.chat_engine import (
-    CondensePlusContextChatEngine
-)
-import re
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.tools import BaseTool
+import numpy as np
 
 
-import nest_asyncio
 import json
+import time
 import asyncio
 from loguru import logger
 import logging
 
 
-nest_asyncio.apply()
-
 # Bật logging toàn cục mức INFO
 # logging.basicConfig(level=logging.DEBUG)
 
@@ -25,10 +34,70 @@ nest_asyncio.apply()
 # logging.getLogger("llama_index.retrievers").setLevel(logging.DEBUG)
 
 
+async def interleave(*generators):
+    """
+    Yields the items of several async generators in the order they become
+    ready. The first error raised by any generator is re-raised.
+    """
+    queue = asyncio.Queue()
+    finished = object()
+
+    async def drain(generator):
+        try:
+            async for item in generator:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(finished)
+
+    tasks = [asyncio.create_task(drain(generator)) for generator in generators]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@dataclass
+class ChatTurn:
+    """
+    Per-request state of a chat: everything that used to live on the engine.
+    """
+    session_id: str
+    message: str
+    memory: ChatMemoryBuffer
+    need_chart: bool = False
+    query_embedding: Optional[List[float]] = None
+    chat_history: List[ChatMessage] = field(default_factory=list)
+    question: Optional[str] = None
+    question_embedding: Optional[List[float]] = None
+    filters: Optional[QueryFilters] = None
+    speculation: Optional[asyncio.Task] = None
+    # The answer read live aggregates of the product table (rollup cube,
+    # analytics tools or computed chart), which a table refresh makes stale
+    live_data: bool = False
+    # The user and assistant messages the turn added to the chat history
+    exchange: List[ChatMessage] = field(default_factory=list)
+
+
 class ChatEngine:
     """
     Chatbot with RAG pipelines.
     Preserves chat history across all dialogues via memory buffer.
+
+    The engine itself is stateless and shared by all requests: prompt templates
+    are compiled once in app.chatbot.prompts, and each request gets its own
+    ChatTurn with a memory buffer keyed by session id in the shared chat store,
+    which the SessionStore keeps populated.
     """
 
     def __init__(
@@ -37,254 +106,332 @@ class ChatEngine:
             embedding_model,
             retriever,
             chat_store,
+            intent_classifier: ChartIntentClassifier,
+            semantic_cache: Optional[SemanticCache] = None,
+            node_postprocessors: Optional[List[BaseNodePostprocessor]] = None,
+            multi_query: bool = True,
+            query_analyzer: Optional[QueryAnalyzer] = None,
+            speculative_retrieval: bool = True,
+            speculation_threshold: float = 0.9,
+            chart_with_text: bool = True,
+            chart_compute: Optional[ChartComputeEngine] = None,
+            analytics_tools: Optional[List[BaseTool]] = None,
+            max_tool_rounds: int = 3,
+            rollup_router: Optional[RollupRouter] = None,
             token_limit: int = 20000,
             collection: str = 'stats_insights',
             top_k: int = 20,
             temperature: float = 0.6,
             max_tokens: int = 10000
     ):
-        # Load environment variables
         self.token_limit = token_limit
         self.top_k = top_k
 
-        # Initialize LLM & embeddings
         self.llm = llm
         self.embedding_model = embedding_model
         self.retriever = retriever
         self.chat_store = chat_store
-        Settings.llm = self.llm
-        Settings.embed_model = embedding_model
-
-        # Setup persistent memory
-        self.rag_engine = None
-        self.chat_memory = None
-        self.needChart = False
-
-        # Store current query for chart extraction
-        self.current_query = None
-
-    def compose(self, session_id, memory, message):
-        Settings.llm = self.llm
-        Settings.embed_model = self.embedding_model
-
-        self.current_query = message
-        self.needChart = self.detect_chart_intent(message)
-        self.build_prompt(memory, message)
-        self.build_memory(session_id, memory)
-        self.build_chat_engine(self.retriever)
-
-    def build_prompt(self, memory, message):
-        self.rag_prompt = """
-            Bạn là một chuyên gia phân tích dữ liệu thương mại điện tử, thành thạo thống kê và đưa ra những insight kinh doanh cho nền tảng TIKI.  
-            Bạn có quyền truy cập vào:
-              - Cơ sở dữ liệu vector chứa các thống kê tổng hợp và chỉ số thô thu thập từ TIKI:  
-                giá, loại giao hàng (dropship / seller_delivery / tiki_delivery), thương hiệu, số lượt đánh giá, điểm đánh giá trung bình, số lượt yêu thích, cờ mua trả sau, số lượng hình ảnh, cờ có video, số lượng đã bán, v.v.  
-              - Khả năng tính toán các chỉ số ngay lập tức (phân phối, tương quan, xu hướng, so sánh) từ những dữ liệu này.
-
-            ### Khi có yêu cầu từ người dùng:
-            1. **Làm rõ mục đích:**  
-               - Họ muốn tóm tắt ("Top 5 thương hiệu bán chạy nhất"), phân tích phân phối ("Phân phối giá cho sản phẩm dropship"), tìm tương quan ("Mua trả sau ảnh hưởng thế nào đến số lượng bán?"), phân tích xu hướng ("Doanh số theo tuần"), hay phát hiện bất thường?
-            2. **Chuyển ngữ & xác định phạm vi:**  
-               - Biến yêu cầu chung chung thành nhiệm vụ phân tích cụ thể ("Cho tôi top 10 thương hiệu theo tổng số lượng đã bán trong Q2 2025").
-            3. **Truy xuất thống kê liên quan:**  
-               - Lấy các chỉ số tổng hợp hoặc dữ liệu gốc đã lưu từ vector store.
-            4. **Tính toán bổ sung nếu cần:**  
-               - Ví dụ: phần trăm thay đổi, tốc độ tăng trưởng, hệ số tương quan, bảng pivot.
-            5. **Sinh insight:**  
-               - Tóm tắt kết quả chính dưới dạng **gạch đầu dòng**, nhấn mạnh các biến động, điểm bất thường, hoặc hàm ý kinh doanh.
-            6. **Minh họa (nếu yêu cầu):**  
-               - Gợi ý hoặc mô tả loại biểu đồ phù hợp (histogram cho phân phối, line chart cho xu hướng, scatter plot cho tương quan) và cung cấp dữ liệu thô để vẽ.
-            7. **Định dạng trả lời:**  
-               - Sử dụng **Markdown** với các tiêu đề rõ ràng (`### Tóm tắt`, `### Insight`, `### Khuyến nghị`).  
-               - Trình bày bảng số liệu dưới dạng bảng Markdown.  
-               - Khi liệt kê danh sách (thương hiệu, loại giao hàng, sản phẩm), dùng gạch đầu dòng.
-
-            Nếu bạn không biết hoặc không thể tính toán được, hãy trả lời "Tôi không biết."
-        """
+        self.intent_classifier = intent_classifier
+        self.semantic_cache = semantic_cache
+        self.node_postprocessors = node_postprocessors or []
+        self.multi_query = multi_query
+        self.query_analyzer = query_analyzer
+        self.speculative_retrieval = speculative_retrieval
+        self.speculation_threshold = speculation_threshold
+        self.chart_with_text = chart_with_text
+        self.chart_compute = chart_compute
+        self.analytics_tools = analytics_tools or []
+        self.max_tool_rounds = max_tool_rounds
+        self._tools_by_name = {tool.metadata.name: tool for tool in self.analytics_tools}
+        self.rollup_router = rollup_router
+
+        self._speculation_hits = metrics.counter("speculative_retrieval.hits")
+        self._speculation_misses = metrics.counter("speculative_retrieval.misses")
+        metrics.gauge("speculative_retrieval", self.speculation_stats)
+        self._tool_calls = metrics.counter("analytics.tool_calls")
+        self._tool_errors = metrics.counter("analytics.tool_errors")
+        self._tool_latency = metrics.histogram("analytics.tool_ms", (1, 5, 10, 50, 100, 500, 1000))
+
+    async def compose(self, session_id, message) -> ChatTurn:
+        turn = ChatTurn(
+            session_id=session_id,
+            message=message,
+            memory=self.build_memory(session_id)
+        )
+        await self.detect_chart_intent(turn)
 
-        self.chart_prompt = f"""
-            Bạn là một chuyên gia phân tích dữ liệu thương mại điện tử, thành thạo thống kê và đưa ra những insight kinh doanh cho nền tảng TIKI.  
-            Bạn có quyền truy cập vào:
-              - Cơ sở dữ liệu vector chứa các thống kê tổng hợp và chỉ số thô thu thập từ TIKI:  
-                giá, loại giao hàng (dropship / seller_delivery / tiki_delivery), thương hiệu, số lượt đánh giá, điểm đánh giá trung bình, số lượt yêu thích, cờ mua trả sau, số lượng hình ảnh, cờ có video, số lượng đã bán, v.v.  
-              - Khả năng tính toán các chỉ số ngay lập tức (phân phối, tương quan, xu hướng, so sánh) từ những dữ liệu này.
-            Phân tích văn bản sau và trích xuất dữ liệu có cấu trúc phù hợp để vẽ biểu đồ phục vụ nhu cầu phân tích dữ liệu.
-
-            Câu hỏi: {message}
-
-            Hãy trả về JSON với format sau (chỉ trả về JSON, không có text khác):
-            {{
-                "chart_type": "bar|line|histogram|pie|scatter|doughnut",
-                "title": "Tiêu đề biểu đồ",
-                "x_label": "Nhãn trục X (nếu có)",
-                "y_label": "Nhãn trục Y (nếu có)",
-                "labels": ["label1", "label2", ...],
-                "datasets": [
-                    {{
-                        "label": "Tên dataset",
-                        "data": [value1, value2, ...],
-                        "backgroundColor": "auto",
-                        "borderColor": "auto"
-                    }}
-                ],
-                "description": "Mô tả ngắn gọn về biểu đồ"
-            }}
-
-            Và đối với scatter:
-                - Bỏ hoặc để [] cho "labels"
-                - Trong "datasets.data", mỗi phần tử phải là object {{ "x": số, "y": số }}
-                Ví dụ:
-                    "data": [
-                        {{ "x": 10, "y": 200 }},
-                        {{ "x": 15, "y": 350 }},
-                        …
-                    ],
-
-            Lưu ý:
-            - Chọn chart_type phù hợp: bar cho so sánh, line cho xu hướng, pie cho tỷ lệ, vân vân.
-            - Trích xuất tất cả số liệu từ văn bản
-            - Đảm bảo labels và data có cùng độ dài
-            - Nếu không thể trích xuất dữ liệu hoặc không đủ dữ liệu cần thiết, trả về null
-        """
+        return turn
 
-        self.context_prompt = """  
-            Trợ lý chỉ sử dụng các số liệu đã được cung cấp ở dưới để trả lời.  
-            Nếu thiếu dữ liệu hoặc chỉ số cần thiết trong context, hãy nói "Tôi không biết."
+    def build_memory(self, session_id) -> ChatMemoryBuffer:
+        return ChatMemoryBuffer.from_defaults(
+            token_limit=self.token_limit,
+            chat_store=self.chat_store,
+            chat_store_key=session_id
+        )
+
+    async def condense_question(self, chat_history: List[ChatMessage], message: str) -> str:
+        """
+        Condenses the conversation and the latest message into a standalone question.
+        """
+        if not chat_history:
+            return message
 
-            Dưới đây là những dữ liệu, tài liệu liên quan có thể cần thiết cho ngữ cảnh: 
+        llm_input = CONDENSE_PROMPT.format(
+            chat_history=messages_to_history_str(chat_history),
+            question=message
+        )
+        condensed_question = str(await self.llm.acomplete(llm_input)).strip()
+        logger.info(f"Condensed question: {condensed_question}")
 
-            {{context_str}} 
+        return condensed_question
 
-            Yêu cầu: Dựa trên các số liệu được cung cấp, hãy trả lời câu hỏi của người dùng dưới đây một cách rõ ràng và có cấu trúc.
+    async def prepare_question(self, turn: ChatTurn):
         """
-
-        self.condense_prompt = f"""
-            Bạn là một trợ lý AI am hiểu thương mại điện tử. Cho đoạn hội thoại dưới đây và tin nhắn mới nhất,
-            hãy chuyển thành một câu hỏi độc lập, rõ ràng, **bằng tiếng Việt**:
-            ===
-            Hội thoại: {memory}
-            Tin nhắn mới: {message}
-            ===
-            Hãy chỉ trả về câu hỏi rút gọn.
+        Loads the chat history, then condenses and embeds the standalone question.
         """
+        turn.chat_history = await turn.memory.aget(input=turn.message)
+        if turn.chat_history and self.speculative_retrieval:
+            # Retrieve on the raw message while the condense call is in flight
+            turn.speculation = asyncio.create_task(self.speculate(turn))
 
-    def build_chat_engine(self, retriever):
-        self.rag_engine = CondensePlusContextChatEngine(
-            retriever=retriever,
-            llm=self.llm,
-            system_prompt=self.chart_prompt if self.needChart == True else self.rag_prompt,
-            context_prompt=self.context_prompt,
-            condense_prompt=self.condense_prompt,
-            memory=self.chat_memory
-        )
+        turn.question = await self.condense_question(turn.chat_history, turn.message)
 
-    def build_memory(self, session_id, memory):
-        self.memory = memory
-        self.session_id = session_id
-        # load if exists
-        if memory and len(memory) > 0:
-            json_memory = self.process_history()
-            try:
-                self.chat_store = SimpleChatStore.from_json(
-                    json_memory
-                )
-            except Exception as e:
-                print(f"Error initializing chat store from memory: {e}")
+        # The intent classifier may already have embedded the raw message
+        if turn.question == turn.message and turn.query_embedding is not None:
+            turn.question_embedding = turn.query_embedding
+        else:
+            turn.question_embedding = await self.embedding_model.aget_query_embedding(turn.question)
 
-        self.chat_memory = ChatMemoryBuffer.from_defaults(
-            token_limit=self.token_limit,
-            chat_store=self.chat_store,
-            chat_store_key=self.session_id
-        )
+    async def embed_message(self, turn: ChatTurn) -> List[float]:
+        # The intent classifier may already have embedded the raw message
+        if turn.query_embedding is None:
+            turn.query_embedding = await self.embedding_model.aget_query_embedding(turn.message)
+        return turn.query_embedding
 
-    def process_history(self):
-        chat_history = {
-            "store": {
-                self.session_id: []
-            },
-            "class_name": "SimpleChatStore"
-        }
-        for chat_turn in self.memory:
-            message = {
-                "role": chat_turn["role"],
-                'additional_kwargs': {},
-                "blocks": [
-                    {
-                        "block_type": "text",
-                        "text": chat_turn["content"]
-                    }
-                ]
-            }
-            chat_history["store"][self.session_id].append(message)
-
-        return json.dumps(chat_history, ensure_ascii=False)
-
-    def detect_chart_intent(self, query: str) -> bool:
+    def build_filters(self, question: str) -> Optional[QueryFilters]:
+        if self.query_analyzer is None:
+            return None
+
+        filters = self.query_analyzer.analyze(question)
+        return None if filters.is_empty() else filters
+
+    async def fetch_candidates(
+            self, query_bundles: List[QueryBundle], filters: Optional[QueryFilters]
+    ) -> List[NodeWithScore]:
+        query_filter = filters.to_qdrant_filter() if filters else None
+        nodes = await self.retriever.aretrieve_many(query_bundles, query_filter=query_filter)
+        if not nodes and query_filter is not None:
+            nodes = await self.retriever.aretrieve_many(query_bundles)
+        return nodes
+
+    async def speculate(self, turn: ChatTurn) -> tuple[Optional[QueryFilters], List[NodeWithScore]]:
+        filters = self.build_filters(turn.message)
+        query_bundle = QueryBundle(query_str=turn.message, embedding=await self.embed_message(turn))
+        return filters, await self.fetch_candidates([query_bundle], filters)
+
+    async def resolve_speculation(self, turn: ChatTurn, filters: Optional[QueryFilters]) -> Optional[List[NodeWithScore]]:
         """
-        Detects if the query requires chart visualization.
+        Returns the speculative candidates if the condensed question is close
+        enough to the raw message and implies the same filters, otherwise None.
         """
+        task, turn.speculation = turn.speculation, None
+        if task is None:
+            return None
+
         try:
-            detection_prompt = f"""
-                Analyze the following query and response to determine if a chart/graph visualization was asked by user.
+            speculative_filters, nodes = await task
+        except Exception as e:
+            logger.error(f"Error in speculative retrieval: {e}")
+            return None
 
-                Query: {query}
+        raw = np.asarray(turn.query_embedding, dtype=np.float32)
+        condensed = np.asarray(turn.question_embedding, dtype=np.float32)
+        similarity = float(raw @ condensed / ((np.linalg.norm(raw) * np.linalg.norm(condensed)) or 1.0))
 
-                Consider the factor: Does the query explicitly ask for visualization (chart, graph, biểu đồ, visual)?
+        if speculative_filters == filters and similarity >= self.speculation_threshold:
+            self._speculation_hits.inc()
+            return nodes
 
+        self._speculation_misses.inc()
+        logger.info(f"Speculative retrieval discarded, similarity={similarity:.3f}")
+        return None
 
-                Reply with only "YES" if a chart was asked, or "NO" if not needed.
-            """
+    def cancel_speculation(self, turn: ChatTurn):
+        if turn.speculation is not None:
+            turn.speculation.cancel()
+            turn.speculation = None
 
-            llm_response = self.llm.complete(detection_prompt)
-            result = llm_response.text.strip().upper()
+    def speculation_stats(self) -> dict:
+        hits, misses = self._speculation_hits.value, self._speculation_misses.value
+        return {"hit_rate": hits / (hits + misses) if hits + misses else 0.0}
 
-            return "YES" in result
+    async def retrieve(self, turn: ChatTurn) -> List[NodeWithScore]:
+        query_bundle = QueryBundle(query_str=turn.question, embedding=turn.question_embedding)
+        filters = turn.filters = self.build_filters(turn.question)
+        if filters is not None:
+            logger.info(f"Query filters: {filters}")
 
-        except Exception as e:
-            logger.error(f"Error in LLM chart intent detection: {e}")
-            return False
+        nodes = await self.resolve_speculation(turn, filters)
+        if nodes is None:
+            query_bundles = [query_bundle]
+            if self.multi_query and turn.question != turn.message:
+                # The raw message keeps exact terms that condensing may have rephrased
+                query_bundles.append(QueryBundle(query_str=turn.message, embedding=await self.embed_message(turn)))
+            nodes = await self.fetch_candidates(query_bundles, filters)
 
-    def extract_chart_data(self, user_input: str) -> Optional[ChartResponse]:
+        return await self.postprocess(nodes, query_bundle)
+
+    async def postprocess(self, nodes: List[NodeWithScore], query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Rerank, deduplicate and pack the candidates into the context budget
+        for postprocessor in self.node_postprocessors:
+            nodes = await postprocessor.apostprocess_nodes(nodes, query_bundle=query_bundle)
+
+        return nodes
+
+    async def retrieve_batch(self, turns: List[ChatTurn]) -> List[List[NodeWithScore]]:
         """
-        Extracts structured data from response and formats it for chart visualization.
+        Context of several standalone questions: aggregate questions come from
+        the rollup cube, all others share one batched Qdrant request. A
+        candidate retrieved for several questions becomes a single node.
         """
-        try:
+        contexts = [self.answer_from_rollup(turn) for turn in turns]
+        pending = [i for i, nodes in enumerate(contexts) if nodes is None]
+        for i in pending:
+            turns[i].filters = self.build_filters(turns[i].question)
+
+        bundles = [QueryBundle(query_str=turns[i].question, embedding=turns[i].question_embedding) for i in pending]
+        filters = [turns[i].filters.to_qdrant_filter() if turns[i].filters else None for i in pending]
+        rankings = await self.retriever.aretrieve_batch(bundles, filters)
+
+        # Filters that match nothing fall back to an unfiltered query, as in fetch_candidates
+        retry = [k for k, ranking in enumerate(rankings) if not ranking and filters[k] is not None]
+        if retry:
+            for k, ranking in zip(retry, await self.retriever.aretrieve_batch([bundles[k] for k in retry])):
+                rankings[k] = ranking
+
+        shared: Dict[str, BaseNode] = {}
+        for ranking in rankings:
+            for candidate in ranking:
+                candidate.node = shared.setdefault(candidate.node.node_id, candidate.node)
+        total = sum(len(ranking) for ranking in rankings)
+        logger.info(f"Batch retrieval: {len(pending)} questions, {total} candidates, {len(shared)} distinct")
+
+        postprocessed = await asyncio.gather(*(
+            self.postprocess(ranking, bundle) for ranking, bundle in zip(rankings, bundles)
+        ))
+        for i, nodes in zip(pending, postprocessed):
+            contexts[i] = nodes
+        return contexts
+
+    def answer_from_rollup(self, turn: ChatTurn) -> Optional[List[NodeWithScore]]:
+        """
+        Aggregate questions are answered from the rollup cube: its exact numbers
+        become the only context document and vector retrieval is skipped.
+        """
+        if self.rollup_router is None:
+            return None
 
-            llm_response = self.rag_engine.chat(user_input)
-            extracted_text = llm_response.response.strip()
+        filters = self.build_filters(turn.question)
+        facts = self.rollup_router.route(turn.question, filters)
+        if facts is None:
+            return None
 
-            # Extract JSON from response
-            json_match = re.search(r'\{.*\}', extracted_text, re.DOTALL)
-            if not json_match:
-                return None
+        turn.filters = filters
+        turn.live_data = True
+        self.cancel_speculation(turn)
+        return [NodeWithScore(node=TextNode(text=facts), score=1.0)]
 
-            extracted_data = json.loads(json_match.group())
+    def build_messages(
+            self,
+            system_prompt: str,
+            chat_history: List[ChatMessage],
+            nodes: List[NodeWithScore],
+            message: str
+    ) -> List[ChatMessage]:
+        context_str = "\n\n".join(
+            node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes
+        )
+        system_message = CONTEXT_PROMPT.format(context_str=context_str) + system_prompt.strip()
+
+        return [
+            ChatMessage(role=self.llm.metadata.system_role, content=system_message),
+            *chat_history,
+            ChatMessage(role=MessageRole.USER, content=message),
+        ]
+
+    async def write_memory(self, turn: ChatTurn, response: str):
+        turn.exchange = [
+            ChatMessage(role=MessageRole.USER, content=turn.message),
+            ChatMessage(role=MessageRole.ASSISTANT, content=response),
+        ]
+        for message in turn.exchange:
+            await turn.memory.aput(message)
+
+    async def lookup_cache(self, turn: ChatTurn, kind: str) -> Optional[CachedAnswer]:
+        if self.semantic_cache is None:
+            return None
 
-            if not extracted_data or extracted_data == "null":
-                return None
+        filters = self.build_filters(turn.question)
+        return await self.semantic_cache.lookup(turn.question, turn.question_embedding, kind, filters)
+
+    def store_cache(self, turn: ChatTurn, kind: str, payload: Any, started: float):
+        # Nothing invalidates cached aggregates when the product table changes
+        if self.semantic_cache is None or turn.live_data:
+            return
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        filters = self.build_filters(turn.question)
+        self.semantic_cache.store(turn.question, turn.question_embedding, kind, payload, latency_ms, filters)
+
+    async def replay_cached(self, turn: ChatTurn, cached: CachedAnswer):
+        """
+        Replays a cached answer as the same events as a generated one.
+        """
+        text, chart_data = self.unpack_cached(cached)
+        if text:
+            yield ChatEvent(TEXT, text)
+        if chart_data:
+            yield ChatEvent(CHART, chart_data)
+        await self.write_memory(turn, text or json.dumps(chart_data, ensure_ascii=False))
+
+    @staticmethod
+    def unpack_cached(cached: CachedAnswer) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        text = cached.payload if cached.kind == "text" else None
+        chart_data = cached.payload if cached.kind == "chart" else None
+        if cached.kind == "chart_with_text":
+            text, chart_data = cached.payload["text"], cached.payload["chart"]
+        return text, chart_data
+
+    def answer_kind(self, turn: ChatTurn) -> str:
+        """
+        What the answer consists of: text, chart or chart_with_text.
+        """
+        if not turn.need_chart:
+            return "text"
+        return "chart_with_text" if self.chart_with_text else "chart"
+
+    @staticmethod
+    def cache_payload(kind: str, text: str, chart_data: Optional[Dict[str, Any]]) -> Any:
+        if kind == "chart_with_text":
+            return {"text": text, "chart": chart_data}
+        return chart_data if kind == "chart" else text
+
+    async def detect_chart_intent(self, turn: ChatTurn) -> bool:
+        """
+        Detects if the query requires chart visualization.
+        The query embedding computed by the classifier is kept for retrieval.
+        """
+        try:
+            result = await self.intent_classifier.classify(turn.message)
+            turn.need_chart = result.need_chart
+            turn.query_embedding = result.embedding
+            logger.info(f"Chart intent: {result.need_chart} ({result.source}, confidence={result.confidence:.3f})")
 
-            # Create ChartResponse
-            chart_data = ChartData(
-                labels=extracted_data.get('labels', []),
-                datasets=extracted_data.get('datasets', [])
-            )
-
-            chart_config = ChartConfig(
-                type=extracted_data.get('chart_type', 'bar'),
-                title=extracted_data.get('title'),
-                x_label=extracted_data.get('x_label'),
-                y_label=extracted_data.get('y_label')
-            )
-
-            return ChartResponse(
-                chart_data=chart_data,
-                chart_config=chart_config,
-                description=extracted_data.get('description')
-            )
+            return result.need_chart
 
         except Exception as e:
-            logger.error(f"Error extracting chart data: {e}")
-            return None
+            logger.error(f"Error in chart intent detection: {e}")
+            return False
 
     def format_for_frontend(self, chart_response: ChartResponse) -> Dict[str, Any]:
         """
@@ -297,55 +444,285 @@ class ChatEngine:
             "description": chart_response.description
         }
 
-    async def stream_chat(self, user_input: str):
-        if not self.rag_engine:
-            yield "ERROR: Chat engine not properly initialized."
-            return
+    async def generate_text(self, turn: ChatTurn, nodes: List[NodeWithScore]):
+        messages = self.build_messages(RAG_PROMPT, turn.chat_history, nodes, turn.message)
+
+        # Let the model compute exact figures with the analytics tools, streaming
+        # its text as usual; each round of tool calls is answered and streamed again
+        for _ in range(self.max_tool_rounds if self.analytics_tools else 0):
+            response_gen = await self.llm.astream_chat_with_tools(self.analytics_tools, chat_history=messages)
+            last_response = None
+            async for last_response in response_gen:
+                if last_response.delta:
+                    yield "text", last_response.delta
+
+            tool_calls = self.llm.get_tool_calls_from_response(
+                last_response, error_on_no_tool_call=False
+            ) if last_response else []
+            if not tool_calls:
+                return
+
+            turn.live_data = True
+            messages.append(last_response.message)
+            for tool_call in tool_calls:
+                messages.append(await self.call_tool(tool_call))
+
+        response = await self.llm.astream_chat(messages)
+
+        if response is None:
+            raise RuntimeError("Failed to get streaming response")
+
+        async for chunk in self.process_streaming_response(response):
+            if chunk:
+                yield "text", chunk
+
+    async def call_tool(self, tool_call) -> ChatMessage:
+        started = time.perf_counter()
+        tool = self._tools_by_name.get(tool_call.tool_name)
+        if tool is None:
+            output = json.dumps({"error": f"Unknown tool {tool_call.tool_name}"})
+            self._tool_errors.inc()
+        else:
+            # Bad arguments from the model come back to it as an error to recover from
+            try:
+                output = str(await tool.acall(**tool_call.tool_kwargs))
+            except Exception as e:
+                logger.warning(f"Tool {tool_call.tool_name} failed: {e!r}")
+                output = json.dumps({"error": str(e)}, ensure_ascii=False)
+                self._tool_errors.inc()
+
+        self._tool_calls.inc()
+        self._tool_latency.observe((time.perf_counter() - started) * 1000)
+        logger.info(f"Tool {tool_call.tool_name}({tool_call.tool_kwargs}) -> {output[:200]}")
+
+        return ChatMessage(
+            role=MessageRole.TOOL,
+            content=output,
+            additional_kwargs={"tool_call_id": tool_call.tool_id, "name": tool_call.tool_name},
+        )
+
+    async def compute_chart(self, turn: ChatTurn, nodes: List[NodeWithScore]) -> Optional[ChartResponse]:
+        """
+        Asks the LLM for a compact chart spec only and computes the numbers
+        from raw product rows. Returns None when the chart cannot be computed
+        that way, e.g. it needs statistics that only exist in the documents.
+        """
+        messages = [
+            ChatMessage(
+                role=self.llm.metadata.system_role,
+                content=CHART_SPEC_PROMPT.format(message=turn.message, fields=describe_fields())
+            ),
+            *turn.chat_history,
+            ChatMessage(role=MessageRole.USER, content=turn.message),
+        ]
+
+        try:
+            llm_response = await self.llm.achat(messages)
+            spec = ChartSpec.parse(llm_response.message.content or "")
+            if spec is None:
+                return None
+
+            logger.info(f"Chart spec: {spec}")
+            chart_response = await asyncio.to_thread(self.chart_compute.compute, spec, nodes, turn.filters)
+            turn.live_data |= chart_response is not None
+            return chart_response
+
+        except Exception as e:
+            logger.error(f"Error computing chart: {e}")
+            return None
+
+    async def generate_chart(self, turn: ChatTurn, nodes: List[NodeWithScore]):
+        """
+        Streams the chart as the LLM writes its JSON: a skeleton event once the
+        chart type, title and labels are known, partial dataset points, then
+        the chart validated against ChartResponse. A chart that fails
+        validation after its skeleton was sent is discarded.
+        """
+        if self.chart_compute is not None:
+            chart_response = await self.compute_chart(turn, nodes)
+            if chart_response:
+                yield "chart", self.format_for_frontend(chart_response)
+                return
+
+        messages = self.build_messages(
+            CHART_PROMPT.format(message=turn.message), turn.chat_history, nodes, turn.message
+        )
+        streamer = ChartStreamer()
+        chart_response = None
+
+        try:
+            response = await self.llm.astream_chat(messages)
+            async for chunk in self.process_streaming_response(response):
+                for event in streamer.feed(chunk):
+                    yield "chart", event
+                if streamer.parser.done:
+                    break
+
+            chart_response = streamer.result()
+
+        except Exception as e:
+            logger.error(f"Error extracting chart data: {e}")
 
+        if chart_response:
+            yield "chart", self.format_for_frontend(chart_response)
+        elif streamer.skeleton_sent:
+            yield "chart", {"type": "chart_discard"}
+
+    async def stream_chat(self, turn: ChatTurn):
         try:
-            if self.needChart:
-                chart_response = self.extract_chart_data(user_input)
-                if chart_response:
-                    chart_data = self.format_for_frontend(chart_response)
-                    yield json.dumps(chart_data, ensure_ascii=False)
-                    return
-                else:
-                    yield "ERROR: Failed to get chart response"
-                    return
-
-            response = self.rag_engine.stream_chat(user_input)
-
-            if response is None:
-                yield "ERROR: Failed to get streaming response"
+            await self.prepare_question(turn)
+
+            kind = self.answer_kind(turn)
+            with_text = kind != "chart"
+
+            cached = await self.lookup_cache(turn, kind)
+            if cached:
+                async for chunk in self.replay_cached(turn, cached):
+                    yield chunk
                 return
 
-            # Collect full response for chart extraction
+            started = time.perf_counter()
+
+            # Retrieve once, then run the prose answer and the chart extraction
+            # concurrently over the same context, emitting each as it is ready
+            nodes = self.answer_from_rollup(turn) or await self.retrieve(turn)
+            branches = []
+            if with_text:
+                branches.append(self.generate_text(turn, nodes))
+            if turn.need_chart:
+                branches.append(self.generate_chart(turn, nodes))
+
+            # Collect full response for chat memory
             full_response = ""
+            chart_data = None
 
-            async for chunk in self.process_streaming_response(response):
-                if chunk:
-                    # Check for errors
-                    if chunk.startswith("ERROR:"):
-                        yield chunk
-                        return
+            async for branch, item in interleave(*branches):
+                if branch == "chart":
+                    if item["type"] == "chart":
+                        chart_data = item
+                    yield ChatEvent(CHART, item)
+                    continue
 
-                    # Accumulate response
-                    full_response += chunk
+                # Accumulate response
+                full_response += item
+                yield ChatEvent(TEXT, item)
+
+            if turn.need_chart and chart_data is None and not full_response:
+                yield ChatEvent(ERROR, "Failed to get chart response")
+                return
+
+            await self.write_memory(turn, full_response or json.dumps(chart_data, ensure_ascii=False))
+            if turn.need_chart and chart_data is None:
+                # Answered with text only, do not cache a chart-less answer to a chart question
+                logger.warning("Chart extraction failed, answered with text only")
+                return
 
-                    # Yield text chunk
-                    yield json.dumps({
-                        "type": "text",
-                        "content": chunk
-                    }, ensure_ascii=False)
+            self.store_cache(turn, kind, self.cache_payload(kind, full_response, chart_data), started)
 
         except Exception as e:
             print(f"Error in stream_chat: {str(e)}")
-            yield f"ERROR: {str(e)}"
+            yield ChatEvent(ERROR, str(e))
+        finally:
+            # Cache hits and failures never consume the speculative retrieval
+            self.cancel_speculation(turn)
+
+    async def answer_standalone(
+            self, turn: ChatTurn, nodes: List[NodeWithScore]
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Full text and chart of a question without chat history, e.g. of a batch.
+        Nothing is written to chat memory.
+        """
+        kind = self.answer_kind(turn)
+        cached = await self.lookup_cache(turn, kind)
+        if cached:
+            text, chart_data = self.unpack_cached(cached)
+            return text or "", chart_data
+
+        started = time.perf_counter()
+        branches = []
+        if kind != "chart":
+            branches.append(self.generate_text(turn, nodes))
+        if turn.need_chart:
+            branches.append(self.generate_chart(turn, nodes))
+
+        text, chart_data = "", None
+        async for branch, item in interleave(*branches):
+            if branch == "text":
+                text += item
+            elif item["type"] == "chart":
+                chart_data = item
+
+        if turn.need_chart and chart_data is None:
+            if not text:
+                raise RuntimeError("Failed to get chart response")
+            return text, None
+
+        self.store_cache(turn, kind, self.cache_payload(kind, text, chart_data), started)
+        return text, chart_data
+
+    async def answer_batch(
+            self, questions: List[BatchQuestion], max_concurrency: int = 8
+    ) -> AsyncIterator[BatchAnswer]:
+        """
+        Answers standalone questions as one batch and yields each answer as
+        soon as it is ready. Chart intents and embeddings of all questions are
+        requested together, so the embedding batcher encodes them in shared
+        forward passes; retrieval is one Qdrant batch request; at most
+        `max_concurrency` answers are generated at a time. Questions that are
+        identical after normalization are answered once.
+        """
+        started = time.perf_counter()
+        ids: Dict[str, List[str]] = {}
+        turns: Dict[str, ChatTurn] = {}
+        for question in questions:
+            key = normalize_query(question.content)
+            ids.setdefault(key, []).append(question.id)
+            if key not in turns:
+                turns[key] = ChatTurn(session_id="batch", message=question.content, memory=None)
+
+        unique = list(turns.values())
+        await asyncio.gather(*(self.detect_chart_intent(turn) for turn in unique))
+        await asyncio.gather(*(self.embed_message(turn) for turn in unique))
+        for turn in unique:
+            turn.question, turn.question_embedding = turn.message, turn.query_embedding
+        contexts = await self.retrieve_batch(unique)
+        logger.info(f"Batch of {len(questions)} questions prepared in {time.perf_counter() - started:.2f}s")
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer(key: str, turn: ChatTurn, nodes: List[NodeWithScore]):
+            async with semaphore:
+                try:
+                    text, chart_data = await self.answer_standalone(turn, nodes)
+                    return key, {"text": text, "chart": chart_data}
+                except Exception as e:
+                    logger.error(f"Error answering batch question '{turn.message}': {e}")
+                    return key, {"error": str(e)}
+
+        tasks = [
+            asyncio.create_task(answer(key, turn, nodes))
+            for (key, turn), nodes in zip(turns.items(), contexts)
+        ]
+        try:
+            for next_answer in asyncio.as_completed(tasks):
+                key, result = await next_answer
+                for question_id in ids[key]:
+                    yield BatchAnswer(id=question_id, **result)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        logger.info(f"Answered {len(questions)} questions in {time.perf_counter() - started:.2f}s")
 
     async def process_streaming_response(self, response):
         """Process various types of streaming responses."""
+        # Handle streaming chat responses from the async chat engine API
+        if hasattr(response, 'async_response_gen'):
+            async for chunk in self.process_streaming_response(response.async_response_gen()):
+                yield chunk
         # Handle async generators
-        if hasattr(response, '__aiter__'):
+        elif hasattr(response, '__aiter__'):
             async for token in response:
                 if token:
                     text = self.extract_text_from_token(token)
@@ -389,7 +766,5 @@ class ChatEngine:
         """
         return self.chat_store.json()
 
-    def clear_memory(self):
-        if self.chat_memory:
-            self.chat_memory.reset()
-        self.chat_store = SimpleChatStore()
+    def clear_memory(self, session_id):
+        self.chat_store.delete_messages(session_id)
@@ -0,0 +1,186 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms import ChatMessage
+from llama_index.core.storage.chat_store.base import BaseChatStore
+
+from app.core.metrics import metrics
+
+# Rough per-message cost of the tuple, the list slot and the str headers
+MESSAGE_OVERHEAD_BYTES = 120
+SESSION_OVERHEAD_BYTES = 200
+
+CompactMessage = Tuple[str, str]
+
+
+class _Session:
+    __slots__ = ("messages", "size", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.messages: List[CompactMessage] = []
+        self.size = SESSION_OVERHEAD_BYTES
+        self.expires_at = expires_at
+
+
+def _message_size(message: CompactMessage) -> int:
+    return MESSAGE_OVERHEAD_BYTES + len(message[1].encode("utf-8"))
+
+
+def _compact(message: ChatMessage) -> CompactMessage:
+    return sys.intern(message.role.value), message.content or ""
+
+
+class BoundedChatStore(BaseChatStore):
+    """
+    In-memory chat store with a byte budget, per-session TTL and LRU eviction.
+
+    Messages are kept as (interned role, content) tuples instead of ChatMessage
+    objects, which drops additional_kwargs and non-text blocks; the chatbot only
+    stores plain text turns. Counters are published under the `chat_store` gauge.
+    """
+
+    max_bytes: int = Field(default=64 * 1024 * 1024, description="Memory budget for all sessions.")
+    ttl_seconds: int = Field(default=3600, description="Idle time before a session expires.")
+
+    _sessions: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+    _bytes: int = PrivateAttr(default=0)
+    _evictions: int = PrivateAttr(default=0)
+    _expirations: int = PrivateAttr(default=0)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        metrics.gauge("chat_store", self.stats)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BoundedChatStore"
+
+    def set_messages(self, key: str, messages: List[ChatMessage]) -> None:
+        with self._lock:
+            self._drop(key)
+            session = self._session(key)
+            for message in messages:
+                self._append(session, _compact(message))
+            self._enforce_budget()
+
+    def get_messages(self, key: str) -> List[ChatMessage]:
+        with self._lock:
+            session = self._get(key)
+            if session is None:
+                return []
+            return [ChatMessage(role=role, content=content) for role, content in session.messages]
+
+    def add_message(self, key: str, message: ChatMessage, idx: Optional[int] = None) -> None:
+        with self._lock:
+            session = self._session(key)
+            compact = _compact(message)
+            if idx is None:
+                self._append(session, compact)
+            else:
+                session.messages.insert(idx, compact)
+                self._resize(session, _message_size(compact))
+            self._enforce_budget()
+
+    def delete_messages(self, key: str) -> Optional[List[ChatMessage]]:
+        with self._lock:
+            session = self._drop(key)
+            if session is None:
+                return None
+            return [ChatMessage(role=role, content=content) for role, content in session.messages]
+
+    def delete_message(self, key: str, idx: int) -> Optional[ChatMessage]:
+        with self._lock:
+            session = self._get(key)
+            if session is None or idx >= len(session.messages):
+                return None
+            role, content = session.messages.pop(idx)
+            self._resize(session, -_message_size((role, content)))
+            return ChatMessage(role=role, content=content)
+
+    def delete_last_message(self, key: str) -> Optional[ChatMessage]:
+        with self._lock:
+            session = self._get(key)
+            if session is None or not session.messages:
+                return None
+            return self.delete_message(key, len(session.messages) - 1)
+
+    def get_keys(self) -> List[str]:
+        with self._lock:
+            self._expire()
+            return list(self._sessions.keys())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "messages": sum(len(session.messages) for session in self._sessions.values()),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _get(self, key: str) -> Optional[_Session]:
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+
+        now = time.monotonic()
+        if session.expires_at <= now:
+            self._drop(key)
+            self._expirations += 1
+            return None
+
+        session.expires_at = now + self.ttl_seconds
+        self._sessions.move_to_end(key)
+        return session
+
+    def _session(self, key: str) -> _Session:
+        session = self._get(key)
+        if session is None:
+            session = _Session(time.monotonic() + self.ttl_seconds)
+            self._sessions[key] = session
+            self._bytes += session.size
+        return session
+
+    def _append(self, session: _Session, message: CompactMessage):
+        session.messages.append(message)
+        self._resize(session, _message_size(message))
+
+    def _resize(self, session: _Session, delta: int):
+        session.size += delta
+        self._bytes += delta
+
+    def _drop(self, key: str) -> Optional[_Session]:
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            self._bytes -= session.size
+        return session
+
+    def _expire(self):
+        now = time.monotonic()
+        # Sessions are kept in access order, so expired ones are at the front
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if session.expires_at > now:
+                break
+            self._drop(key)
+            self._expirations += 1
+
+    def _enforce_budget(self):
+        self._expire()
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            key = next(iter(self._sessions))
+            self._drop(key)
+            self._evictions += 1
+
+        # A single session larger than the whole budget loses its oldest turns
+        if self._bytes > self.max_bytes and self._sessions:
+            session = next(iter(self._sessions.values()))
+            while self._bytes > self.max_bytes and session.messages:
+                self._resize(session, -_message_size(session.messages.pop(0)))
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+from typing import Any
+
+START = "start"
+TEXT = "text"
+CHART = "chart"
+ERROR = "error"
+SESSION = "session"
+CANCELLED = "cancelled"
+DONE = "done"
+
+# Nothing follows these in a stream
+TERMINAL = frozenset({ERROR, CANCELLED, DONE})
+
+
+@dataclass(slots=True)
+class ChatEvent:
+    """
+    One item of a streamed answer, handed as is from the engine through the
+    service to the transport, which is the only place it gets serialized.
+
+    `data` is the text delta, the chart event dict, the error message, the
+    SessionState or the cancellation reason, depending on `kind`.
+    """
+    kind: str
+    data: Any = None
@@ -0,0 +1,149 @@
+import asyncio
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+
+from app.chatbot.prompts import CHART_INTENT_PROMPT
+
+
+CHART_KEYWORDS = [
+    "biểu đồ", "bieu do", "đồ thị", "do thi", "vẽ", "trực quan hóa", "trực quan hoá", "minh họa", "minh hoạ",
+    "chart", "charts", "graph", "plot", "visualize", "visualise", "visualization", "histogram",
+    "pie", "scatter", "doughnut",
+]
+
+NO_CHART_PATTERNS = [
+    r"không\s+(cần|muốn)\s+(vẽ\s+)?(biểu đồ|đồ thị)",
+    r"khong\s+(can|muon)\s+(ve\s+)?(bieu do|do thi)",
+    r"\b(no|without)\s+(chart|graph|plot)s?\b",
+]
+
+CHART_PROTOTYPES = [
+    "Vẽ biểu đồ top 10 thương hiệu bán chạy nhất",
+    "Cho tôi xem đồ thị số lượng bán theo loại giao hàng",
+    "Trực quan hóa phân phối giá của sản phẩm dropship",
+    "Biểu đồ tròn tỷ lệ sản phẩm có video",
+    "Hiển thị phân phối điểm đánh giá dưới dạng hình",
+    "Minh họa tương quan giữa số lượt yêu thích và số lượng bán",
+    "Show me a bar chart of the top brands by quantity sold",
+    "Plot rating against quantity sold",
+    "Visualize the price distribution for tiki_delivery products",
+]
+
+TEXT_PROTOTYPES = [
+    "Top 5 thương hiệu bán chạy nhất là gì?",
+    "Mua trả sau ảnh hưởng thế nào đến số lượng bán?",
+    "Giá trung bình của sản phẩm tiki_delivery là bao nhiêu?",
+    "Tóm tắt insight về các thương hiệu có nhiều đánh giá",
+    "Sản phẩm có video có bán chạy hơn không?",
+    "Xin chào, bạn có thể giúp gì cho tôi?",
+    "What is the average rating by delivery type?",
+    "Explain the relationship between pay later and sales",
+    "Which brand has the most favourites?",
+]
+
+
+@dataclass
+class IntentResult:
+    need_chart: bool
+    confidence: float
+    source: str  # rule | prototype | llm
+    embedding: Optional[List[float]] = None
+
+
+def normalize_query(query: str) -> str:
+    return unicodedata.normalize("NFC", query).lower().strip()
+
+
+class ChartIntentClassifier:
+    """
+    Local chart intent classifier.
+    Keyword rules first, then nearest-prototype similarity over query embeddings,
+    and only when the prototype margin is too small, a single LLM call.
+    """
+
+    def __init__(
+            self,
+            embed_model,
+            llm=None,
+            min_margin: float = 0.02,
+    ):
+        self.embed_model = embed_model
+        self.llm = llm
+        self.min_margin = min_margin
+
+        self._keyword_pattern = re.compile(
+            r"(?<!\w)(" + "|".join(re.escape(k) for k in CHART_KEYWORDS) + r")(?!\w)"
+        )
+        self._negative_pattern = re.compile("|".join(NO_CHART_PATTERNS))
+
+        self._chart_matrix: Optional[np.ndarray] = None
+        self._text_matrix: Optional[np.ndarray] = None
+        self._prototype_lock = asyncio.Lock()
+
+    async def classify(self, query: str) -> IntentResult:
+        rule_result = self.classify_by_rules(query)
+        if rule_result is not None:
+            return rule_result
+
+        embedding = await self.embed_model.aget_query_embedding(query)
+        need_chart, margin = await self.classify_by_prototypes(embedding)
+        if abs(margin) >= self.min_margin or self.llm is None:
+            return IntentResult(need_chart, abs(margin), "prototype", embedding)
+
+        need_chart = await self.classify_by_llm(query)
+        return IntentResult(need_chart, abs(margin), "llm", embedding)
+
+    def classify_by_rules(self, query: str) -> Optional[IntentResult]:
+        normalized = normalize_query(query)
+        if self._negative_pattern.search(normalized):
+            return IntentResult(False, 1.0, "rule")
+        if self._keyword_pattern.search(normalized):
+            return IntentResult(True, 1.0, "rule")
+        return None
+
+    async def classify_by_prototypes(self, embedding: List[float]) -> tuple[bool, float]:
+        """
+        Returns the decision and the signed margin between the nearest chart
+        prototype and the nearest text prototype.
+        """
+        await self._load_prototypes()
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+
+        chart_score = float(np.max(self._chart_matrix @ vector))
+        text_score = float(np.max(self._text_matrix @ vector))
+        margin = chart_score - text_score
+
+        return margin > 0, margin
+
+    async def classify_by_llm(self, query: str) -> bool:
+        try:
+            llm_response = await self.llm.acomplete(CHART_INTENT_PROMPT.format(query=query))
+            return "YES" in llm_response.text.strip().upper()
+        except Exception as e:
+            logger.error(f"Error in LLM chart intent detection: {e}")
+            return False
+
+    async def _load_prototypes(self):
+        if self._chart_matrix is not None:
+            return
+
+        async with self._prototype_lock:
+            if self._chart_matrix is not None:
+                return
+
+            self._text_matrix = await self._embed_prototypes(TEXT_PROTOTYPES)
+            self._chart_matrix = await self._embed_prototypes(CHART_PROTOTYPES)
+
+    async def _embed_prototypes(self, prototypes: List[str]) -> np.ndarray:
+        embeddings = await asyncio.gather(
+            *(self.embed_model.aget_query_embedding(p) for p in prototypes)
+        )
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
@@ -0,0 +1,198 @@
+import asyncio
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from llama_index.core.utils import get_tokenizer
+
+
+class CrossEncoderRerank(BaseNodePostprocessor):
+    """
+    Rescores candidates with a local cross-encoder in batched forward passes.
+    Scores are the sigmoid of the logits, i.e. relevance probabilities in
+    [0, 1]. The async path runs the model on a worker thread.
+    """
+
+    model_name: str = Field(description="Sentence-transformers cross-encoder model.")
+    top_n: int = Field(default=8, description="Number of nodes kept after reranking.")
+    batch_size: int = Field(default=16, description="Query / passage pairs per forward pass.")
+
+    _model = PrivateAttr(default=None)
+    _model_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CrossEncoderRerank"
+
+    def load_model(self):
+        """
+        Loads the cross-encoder once, concurrent first requests wait for it.
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import torch
+                    from sentence_transformers import CrossEncoder
+
+                    # Explicit, the default activation depends on the model's config
+                    self._model = CrossEncoder(self.model_name, activation_fn=torch.nn.Sigmoid())
+        return self._model
+
+    def _postprocess_nodes(
+            self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        if query_bundle is None or not nodes:
+            return nodes
+
+        model = self.load_model()
+        pairs = [
+            (query_bundle.query_str, node.node.get_content(metadata_mode=MetadataMode.EMBED))
+            for node in nodes
+        ]
+        scores = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        for node, score in zip(nodes, scores):
+            node.score = float(score)
+
+        return sorted(nodes, key=lambda node: node.score, reverse=True)[:self.top_n]
+
+    async def _apostprocess_nodes(
+            self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        return await asyncio.to_thread(self._postprocess_nodes, nodes, query_bundle)
+
+
+class MMRFilter(BaseNodePostprocessor):
+    """
+    Maximal marginal relevance over chunk embeddings. Drops near-duplicates
+    outright and reorders the rest to trade relevance against redundancy.
+    Node scores, min-max scaled, are used as the relevance term.
+
+    Runs on the dense vectors the retriever returns with the candidates;
+    only nodes without one (e.g. built outside Qdrant) are embedded here.
+    """
+
+    embed_model: BaseEmbedding = Field(description="Model used to embed chunks without a stored vector.")
+    lambda_mult: float = Field(default=0.7, description="1.0 ranks by relevance only.")
+    duplicate_threshold: float = Field(default=0.95, description="Cosine above which a chunk is a duplicate.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MMRFilter"
+
+    def _postprocess_nodes(
+            self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        if len(nodes) < 2:
+            return nodes
+
+        missing = self._missing(nodes)
+        if missing:
+            self._fill(missing, self.embed_model.get_text_embedding_batch(self._texts(missing)))
+        return self._select(nodes, [node.node.embedding for node in nodes])
+
+    async def _apostprocess_nodes(
+            self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        if len(nodes) < 2:
+            return nodes
+
+        missing = self._missing(nodes)
+        if missing:
+            self._fill(missing, await self.embed_model.aget_text_embedding_batch(self._texts(missing)))
+        return self._select(nodes, [node.node.embedding for node in nodes])
+
+    @staticmethod
+    def _missing(nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        return [node for node in nodes if node.node.embedding is None]
+
+    @staticmethod
+    def _fill(nodes: List[NodeWithScore], embeddings):
+        for node, embedding in zip(nodes, embeddings):
+            node.node.embedding = embedding
+
+    @staticmethod
+    def _texts(nodes: List[NodeWithScore]) -> List[str]:
+        return [node.node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+
+    def _select(self, nodes: List[NodeWithScore], embeddings) -> List[NodeWithScore]:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+        similarity = matrix @ matrix.T
+        relevance = np.asarray([node.score or 0.0 for node in nodes], dtype=np.float32)
+        # Min-max scaled to the [0, 1] range of the cosine term, whatever stage produced the scores
+        span = float(relevance.max() - relevance.min())
+        relevance = (relevance - relevance.min()) / span if span > 0 else np.ones_like(relevance)
+
+        selected = [int(np.argmax(relevance))]
+        remaining = set(range(len(nodes))) - set(selected)
+        while remaining:
+            candidates = np.fromiter(remaining, dtype=np.int64)
+            redundancy = similarity[np.ix_(candidates, selected)].max(axis=1)
+            keep = redundancy < self.duplicate_threshold
+            remaining -= set(candidates[~keep].tolist())
+            if not keep.any():
+                break
+
+            candidates, redundancy = candidates[keep], redundancy[keep]
+            mmr = self.lambda_mult * relevance[candidates] - (1 - self.lambda_mult) * redundancy
+            best = int(candidates[np.argmax(mmr)])
+            selected.append(best)
+            remaining.remove(best)
+
+        return [nodes[i] for i in selected]
+
+
+class TokenBudgetPacker(BaseNodePostprocessor):
+    """
+    Greedily packs nodes, best first, into a token budget.
+
+    Before packing, the list is cut at the largest drop between consecutive
+    scores when that drop is at least `min_score_gap`, so a few clearly
+    relevant chunks are not padded out with weak ones. The gap is on the
+    [0, 1] scale of the reranker's probabilities; lower-scale scores (RRF,
+    cosine) rarely reach it, and then nothing is cut.
+    """
+
+    token_budget: int = Field(default=3000, description="Maximum context tokens.")
+    min_score_gap: float = Field(default=0.3, description="Score drop that ends the relevant head.")
+    min_nodes: int = Field(default=1, description="Never cut below this many nodes.")
+
+    _tokenizer: Callable = PrivateAttr()
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._tokenizer = get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TokenBudgetPacker"
+
+    def _postprocess_nodes(
+            self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        packed, used = [], 0
+        for node in self._adaptive_cutoff(nodes):
+            tokens = len(self._tokenizer(node.node.get_content(metadata_mode=MetadataMode.LLM)))
+            if used + tokens > self.token_budget:
+                continue
+            packed.append(node)
+            used += tokens
+
+        return packed
+
+    def _adaptive_cutoff(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        if len(nodes) <= self.min_nodes or any(node.score is None for node in nodes):
+            return nodes
+
+        scores = np.asarray(sorted((node.score for node in nodes), reverse=True))
+        gaps = scores[self.min_nodes - 1:-1] - scores[self.min_nodes:]
+        cut = int(np.argmax(gaps))
+        if gaps[cut] < self.min_score_gap:
+            return nodes
+
+        threshold = scores[self.min_nodes - 1 + cut]
+        return [node for node in nodes if node.score >= threshold]
@@ -0,0 +1,157 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from loguru import logger
+from qdrant_client.http import models as rest
+
+from app.chatbot.intent_classifier import normalize_query
+
+# Payload fields written by the ingestion pipeline and indexed for filtering
+DELIVERY_TYPE_FIELD = "delivery_type"
+BRAND_FIELD = "brand"
+HAS_VIDEO_FIELD = "has_video"
+PAY_LATER_FIELD = "pay_later"
+
+PAYLOAD_INDEXES = {
+    DELIVERY_TYPE_FIELD: rest.PayloadSchemaType.KEYWORD,
+    BRAND_FIELD: rest.PayloadSchemaType.KEYWORD,
+    HAS_VIDEO_FIELD: rest.PayloadSchemaType.BOOL,
+    PAY_LATER_FIELD: rest.PayloadSchemaType.BOOL,
+}
+
+DELIVERY_TYPE_PATTERNS = {
+    "dropship": r"drop[\s_-]?ship",
+    "seller_delivery": r"seller[\s_-]?delivery|(người|nhà) bán (tự )?giao",
+    "tiki_delivery": r"tiki[\s_-]?delivery|tiki (tự )?giao",
+}
+
+HAS_VIDEO_PATTERNS = (r"(không|chưa) (có )?video|\b(no|without) videos?\b", r"có video|\bwith videos?\b")
+PAY_LATER_PATTERNS = (
+    r"không (hỗ trợ |có )?(mua )?trả sau|\b(no|without) pay[\s_-]?later\b",
+    r"(mua )?trả sau|pay[\s_-]?later",
+)
+
+# Questions that contrast a segment with the rest need both sides in the context
+COMPARISON_PATTERN = re.compile(
+    r"so sánh|ảnh hưởng|tác động|khác (nhau|biệt)|tương quan|hơn|\bvs\b|\bversus\b|\bcompare|\bimpact|\beffect|"
+    r"\bdifferen|\bcorrelat|\bthan\b"
+)
+
+
+@dataclass
+class QueryFilters:
+    delivery_types: List[str] = field(default_factory=list)
+    brands: List[str] = field(default_factory=list)
+    has_video: Optional[bool] = None
+    pay_later: Optional[bool] = None
+
+    def is_empty(self) -> bool:
+        return not self.delivery_types and not self.brands and self.has_video is None and self.pay_later is None
+
+    def to_qdrant_filter(self) -> Optional[rest.Filter]:
+        """
+        Every named attribute must match, but chunks without the attribute at
+        all (collection-wide statistics) are kept.
+        """
+        conditions = []
+        if self.delivery_types:
+            conditions.append(self._match_or_missing(DELIVERY_TYPE_FIELD, rest.MatchAny(any=self.delivery_types)))
+        if self.brands:
+            conditions.append(self._match_or_missing(BRAND_FIELD, rest.MatchAny(any=self.brands)))
+        if self.has_video is not None:
+            conditions.append(self._match_or_missing(HAS_VIDEO_FIELD, rest.MatchValue(value=self.has_video)))
+        if self.pay_later is not None:
+            conditions.append(self._match_or_missing(PAY_LATER_FIELD, rest.MatchValue(value=self.pay_later)))
+
+        return rest.Filter(must=conditions) if conditions else None
+
+    @staticmethod
+    def _match_or_missing(key: str, match) -> rest.Filter:
+        return rest.Filter(should=[
+            rest.FieldCondition(key=key, match=match),
+            rest.IsEmptyCondition(is_empty=rest.PayloadField(key=key)),
+        ])
+
+
+class QueryAnalyzer:
+    """
+    Extracts payload filters (delivery type, brand, video and pay-later flags)
+    from the condensed question with local rules. Brand names are matched
+    against the brand values present in the collection.
+    """
+
+    def __init__(self, aclient, collection_name: str, max_brands: int = 5000):
+        self.aclient = aclient
+        self.collection_name = collection_name
+        self.max_brands = max_brands
+
+        self._delivery_patterns = {
+            value: re.compile(pattern) for value, pattern in DELIVERY_TYPE_PATTERNS.items()
+        }
+        self._video_patterns = tuple(re.compile(p) for p in HAS_VIDEO_PATTERNS)
+        self._pay_later_patterns = tuple(re.compile(p) for p in PAY_LATER_PATTERNS)
+        self._brand_pattern: Optional[re.Pattern] = None
+        self._brand_values: dict = {}
+
+    async def ensure_payload_indexes(self):
+        """
+        Creates the payload indexes used by the filters. Safe to call on every start.
+        """
+        info = await self.aclient.get_collection(self.collection_name)
+        existing = info.payload_schema or {}
+
+        for field_name, schema in PAYLOAD_INDEXES.items():
+            if field_name in existing:
+                continue
+            try:
+                await self.aclient.create_payload_index(
+                    collection_name=self.collection_name, field_name=field_name, field_schema=schema
+                )
+                logger.info(f"Created {schema.value} payload index on {self.collection_name}.{field_name}")
+            except Exception as e:
+                logger.error(f"Error creating payload index on {field_name}: {e}")
+
+        await self.load_brands()
+
+    async def load_brands(self):
+        try:
+            response = await self.aclient.facet(
+                collection_name=self.collection_name, key=BRAND_FIELD, limit=self.max_brands
+            )
+        except Exception as e:
+            logger.error(f"Error loading brand values: {e}")
+            return
+
+        self._brand_values = {normalize_query(str(hit.value)): str(hit.value) for hit in response.hits}
+        if self._brand_values:
+            names = sorted(self._brand_values, key=len, reverse=True)
+            self._brand_pattern = re.compile(r"(?<!\w)(" + "|".join(re.escape(n) for n in names) + r")(?!\w)")
+        logger.info(f"Loaded {len(self._brand_values)} brand values for query filters")
+
+    def analyze(self, question: str) -> QueryFilters:
+        normalized = normalize_query(question)
+        filters = QueryFilters()
+        if COMPARISON_PATTERN.search(normalized):
+            return filters
+
+        filters.delivery_types = [
+            value for value, pattern in self._delivery_patterns.items() if pattern.search(normalized)
+        ]
+        filters.has_video = self._flag(normalized, self._video_patterns)
+        filters.pay_later = self._flag(normalized, self._pay_later_patterns)
+        if self._brand_pattern is not None:
+            filters.brands = sorted({
+                self._brand_values[match] for match in self._brand_pattern.findall(normalized)
+            })
+
+        return filters
+
+    @staticmethod
+    def _flag(normalized: str, patterns) -> Optional[bool]:
+        negative, positive = patterns
+        if negative.search(normalized):
+            return False
+        if positive.search(normalized):
+            return True
+        return None
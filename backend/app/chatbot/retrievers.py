@@ -0,0 +1,239 @@
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.vector_stores.qdrant import QdrantVectorStore
+from loguru import logger
+from qdrant_client.http import models as rest
+
+# Texts -> (indices, values) per text, same shape as llama-index's sparse encoders
+SparseQueryFn = Callable[[List[str]], Tuple[List[List[int]], List[List[float]]]]
+
+
+def fastembed_sparse_encoders(model_name: str, batch_size: int = 256) -> Tuple[SparseQueryFn, SparseQueryFn]:
+    """
+    Document and query encoders sharing one fastembed model.
+    """
+    from fastembed import SparseTextEmbedding
+
+    model = SparseTextEmbedding(model_name)
+
+    def encode_docs(texts: List[str]):
+        return _sparse_lists(model.embed(texts, batch_size=batch_size))
+
+    def encode_queries(texts: List[str]):
+        # query_embed skips the document-side term weighting that BM25 applies
+        return _sparse_lists(model.query_embed(texts))
+
+    return encode_docs, encode_queries
+
+
+def fastembed_sparse_query_encoder(model_name: str) -> SparseQueryFn:
+    return fastembed_sparse_encoders(model_name)[1]
+
+
+def fastembed_sparse_doc_encoder(model_name: str, batch_size: int = 256) -> SparseQueryFn:
+    return fastembed_sparse_encoders(model_name, batch_size)[0]
+
+
+def _sparse_lists(embeddings) -> Tuple[List[List[int]], List[List[float]]]:
+    embeddings = list(embeddings)
+    return (
+        [embedding.indices.tolist() for embedding in embeddings],
+        [embedding.values.tolist() for embedding in embeddings],
+    )
+
+
+def reciprocal_rank_fusion(rankings: List[List[NodeWithScore]], k: int = 60) -> List[NodeWithScore]:
+    fused: Dict[str, NodeWithScore] = {}
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node in enumerate(ranking):
+            node_id = node.node.node_id
+            fused.setdefault(node_id, node)
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank + 1)
+
+    return [
+        NodeWithScore(node=fused[node_id].node, score=score)
+        for node_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    ]
+
+
+class HybridQdrantRetriever(BaseRetriever):
+    """
+    Dense + sparse retriever on the Qdrant Query API.
+
+    Each query prefetches dense and sparse candidates and Qdrant fuses them
+    with reciprocal rank fusion server-side. Several phrasings of a question
+    (e.g. the raw message and the condensed question) go out in a single
+    query_batch_points request and their rankings are fused with RRF again.
+    Independent questions are batched the same way, keeping one ranking each.
+    Collections without the sparse vector fall back to dense-only queries.
+    Bundles without a dense embedding are embedded with `embed_model`; the
+    sync path sends the same request with the sync client.
+    """
+
+    def __init__(
+            self,
+            vector_store: QdrantVectorStore,
+            client,
+            aclient,
+            collection_name: str,
+            embed_model=None,
+            top_k: int = 15,
+            prefetch_k: int = 40,
+            hybrid: bool = True,
+            sparse_query_fn: Optional[SparseQueryFn] = None,
+            sparse_model_name: Optional[str] = None,
+            rrf_k: int = 60,
+            with_vectors: bool = False,
+    ):
+        super().__init__()
+        self.vector_store = vector_store
+        self.client = client
+        self.aclient = aclient
+        self.collection_name = collection_name
+        self.embed_model = embed_model
+        self.top_k = top_k
+        self.prefetch_k = prefetch_k
+        self.hybrid = hybrid
+        self.sparse_model_name = sparse_model_name
+        self.rrf_k = rrf_k
+        # Returns the stored dense vector as node.embedding, e.g. for MMR
+        self.with_vectors = with_vectors
+
+        # Built here rather than on first use, the async path encodes on worker threads
+        if hybrid and sparse_query_fn is None:
+            sparse_query_fn = fastembed_sparse_query_encoder(sparse_model_name)
+        self._sparse_query_fn = sparse_query_fn
+        self._sparse_available: Optional[bool] = None
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._require_embed_model().get_query_embedding(query_bundle.query_str)
+
+        if self._sparse_available is None and self.hybrid:
+            self._record_sparse(self.client.get_collection(self.collection_name))
+        sparse_vectors = self._encode_sparse([query_bundle]) if self.hybrid and self._sparse_available else None
+
+        requests = self._build_requests([query_bundle], [None], sparse_vectors)
+        responses = self.client.query_batch_points(collection_name=self.collection_name, requests=requests)
+        return self._rankings(responses)[0]
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return await self.aretrieve_many([query_bundle])
+
+    async def aretrieve_many(
+            self, query_bundles: List[QueryBundle], query_filter: Optional[rest.Filter] = None
+    ) -> List[NodeWithScore]:
+        """
+        Retrieves for several phrasings of one question in one round-trip.
+        """
+        rankings = await self.aretrieve_batch(query_bundles, [query_filter] * len(query_bundles))
+        if len(rankings) == 1:
+            return rankings[0]
+        return reciprocal_rank_fusion(rankings, k=self.rrf_k)[:self.top_k]
+
+    async def aretrieve_batch(
+            self, query_bundles: List[QueryBundle], query_filters: Optional[List[Optional[rest.Filter]]] = None
+    ) -> List[List[NodeWithScore]]:
+        """
+        Retrieves for several questions in one round-trip, one ranking per
+        bundle, each with its own filter.
+        """
+        if not query_bundles:
+            return []
+        query_filters = query_filters or [None] * len(query_bundles)
+
+        missing = [bundle for bundle in query_bundles if bundle.embedding is None]
+        if missing:
+            embed_model = self._require_embed_model()
+            embeddings = await asyncio.gather(*(embed_model.aget_query_embedding(b.query_str) for b in missing))
+            for bundle, embedding in zip(missing, embeddings):
+                bundle.embedding = embedding
+
+        sparse_vectors = None
+        if self.hybrid and await self._has_sparse_vectors():
+            sparse_vectors = await asyncio.to_thread(self._encode_sparse, query_bundles)
+
+        requests = self._build_requests(query_bundles, query_filters, sparse_vectors)
+        responses = await self.aclient.query_batch_points(collection_name=self.collection_name, requests=requests)
+        return self._rankings(responses)
+
+    def _build_requests(
+            self,
+            query_bundles: List[QueryBundle],
+            query_filters: List[Optional[rest.Filter]],
+            sparse_vectors: Optional[List[rest.SparseVector]],
+    ) -> List[rest.QueryRequest]:
+        return [
+            self._build_request(bundle.embedding, sparse_vectors[i] if sparse_vectors else None, query_filters[i])
+            for i, bundle in enumerate(query_bundles)
+        ]
+
+    def _rankings(self, responses) -> List[List[NodeWithScore]]:
+        rankings = []
+        for response in responses:
+            result = self.vector_store.parse_to_query_result(response.points)
+            rankings.append([
+                NodeWithScore(node=node, score=score) for node, score in zip(result.nodes, result.similarities)
+            ])
+        return rankings
+
+    def _build_request(
+            self,
+            embedding: List[float],
+            sparse_vector: Optional[rest.SparseVector],
+            query_filter: Optional[rest.Filter],
+    ) -> rest.QueryRequest:
+        dense_name = self.vector_store.dense_vector_name
+        with_vectors = [dense_name] if self.with_vectors else False
+        if sparse_vector is None:
+            return rest.QueryRequest(
+                query=embedding,
+                using=dense_name,
+                filter=query_filter,
+                limit=self.top_k,
+                with_payload=True,
+                with_vector=with_vectors,
+            )
+
+        return rest.QueryRequest(
+            prefetch=[
+                rest.Prefetch(query=embedding, using=dense_name, filter=query_filter, limit=self.prefetch_k),
+                rest.Prefetch(
+                    query=sparse_vector,
+                    using=self.vector_store.sparse_vector_name,
+                    filter=query_filter,
+                    limit=self.prefetch_k,
+                ),
+            ],
+            query=rest.FusionQuery(fusion=rest.Fusion.RRF),
+            limit=self.top_k,
+            with_payload=True,
+            with_vector=with_vectors,
+        )
+
+    def _encode_sparse(self, query_bundles: List[QueryBundle]) -> List[rest.SparseVector]:
+        indices, values = self._sparse_query_fn([bundle.query_str for bundle in query_bundles])
+        return [rest.SparseVector(indices=i, values=v) for i, v in zip(indices, values)]
+
+    def _require_embed_model(self):
+        if self.embed_model is None:
+            raise ValueError("Query bundles without an embedding need an embed_model")
+        return self.embed_model
+
+    async def _has_sparse_vectors(self) -> bool:
+        if self._sparse_available is None:
+            self._record_sparse(await self.aclient.get_collection(self.collection_name))
+        return self._sparse_available
+
+    def _record_sparse(self, info):
+        sparse_vectors = info.config.params.sparse_vectors or {}
+        self._sparse_available = self.vector_store.sparse_vector_name in sparse_vectors
+        if not self._sparse_available:
+            logger.warning(
+                f"Collection {self.collection_name} has no sparse vector "
+                f"'{self.vector_store.sparse_vector_name}', using dense retrieval only"
+            )
@@ -0,0 +1,249 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from app.analytics.dataset import CATEGORICAL_FIELDS, NUMERIC_FIELDS
+from app.analytics.rollup import RollupCube
+from app.chatbot.chart_compute import format_number
+from app.chatbot.intent_classifier import normalize_query
+from app.chatbot.query_analyzer import BRAND_FIELD, DELIVERY_TYPE_FIELD, HAS_VIDEO_FIELD, PAY_LATER_FIELD, QueryFilters
+from app.core.metrics import metrics
+
+# Most specific first: "lượt đánh giá" is a review count, "đánh giá" alone is the rating
+METRIC_PATTERNS = [
+    ("review_count", r"lượt đánh giá|số (lượng )?đánh giá|nhận xét|\breviews?\b|review count"),
+    ("favourite_count", r"yêu thích|\bfavou?rites?\b|\blikes?\b"),
+    ("number_of_images", r"hình ảnh|số (lượng )?ảnh|\bimages?\b|\bphotos?\b"),
+    ("rating_average", r"đánh giá|điểm|\bsao\b|\bratings?\b|\bstars?\b"),
+    ("quantity_sold", r"đã bán|bán (được|ra|chạy)|lượng bán|doanh số|\bsold\b|\bsales\b|best[\s-]?sell"),
+    ("price", r"\bgiá\b|\bprices?\b|\bcost\b"),
+]
+
+DIMENSION_PATTERNS = [
+    (BRAND_FIELD, r"thương hiệu|nhãn hàng|\bhãng\b|\bbrands?\b"),
+    (DELIVERY_TYPE_FIELD, r"(loại|hình thức|phương thức|kiểu) giao( hàng)?|giao hàng|delivery"),
+    (HAS_VIDEO_FIELD, r"video"),
+    (PAY_LATER_FIELD, r"trả sau|pay[\s_-]?later"),
+]
+GROUPING_PATTERN = re.compile(r"\btheo\b|\bmỗi\b|\btừng\b|\bcác\b|giữa|\bby\b|\bper\b|\beach\b|\bacross\b")
+
+AGGREGATION_PATTERNS = [
+    ("median", r"trung vị|\bmedian\b"),
+    ("mean", r"trung bình|bình quân|\baverage\b|\bmean\b|\bavg\b"),
+    ("sum", r"\btổng\b|\btotal\b|\bsum\b"),
+    ("max", r"cao nhất|lớn nhất|nhiều nhất|\bmax(imum)?\b|\bhighest\b"),
+    ("min", r"thấp nhất|nhỏ nhất|ít nhất|\bmin(imum)?\b|\blowest\b"),
+    ("count", r"bao nhiêu sản phẩm|số (lượng )?sản phẩm|how many|number of products|\bcount\b"),
+]
+
+TOP_PATTERN = re.compile(
+    r"\btop\s*(\d+)?|(\d+)\s+(thương hiệu|nhãn hàng|hãng|brands?)|xếp hạng|\brank|"
+    r"(thương hiệu|nhãn hàng|hãng|loại giao hàng) nào|\bwhich (brand|delivery)"
+)
+# Questions about individual products need the product documents, not aggregates
+PRODUCT_PATTERN = re.compile(r"sản phẩm nào|\bwhich products?\b|\btên\b|\bname of\b")
+ASCENDING_PATTERN = re.compile(r"thấp nhất|ít nhất|kém nhất|\blowest\b|\bleast\b|\bbottom\b|\bworst\b")
+SHARE_PATTERN = re.compile(r"t[ỷỉ] lệ|phần trăm|bao nhiêu %|\bshare\b|percent|proportion|\bratio\b")
+
+# Counts add up across products, the rest are compared by their average
+SUMMED_METRICS = ("quantity_sold", "review_count", "favourite_count")
+QUANTILE_LABELS = {"median": 0.5}
+STATISTIC_LABELS = {"sum": "tổng", "mean": "trung bình", "median": "trung vị", "min": "nhỏ nhất", "max": "lớn nhất"}
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 50
+
+
+@dataclass
+class RollupQuestion:
+    metric: str
+    agg: str
+    by: Optional[str] = None
+    top_n: Optional[int] = None
+    ascending: bool = False
+
+
+class RollupRouter:
+    """
+    Answers aggregate questions (top N brands by a metric, a metric per
+    delivery type, share of pay-later products, ...) from the rollup cube.
+
+    The question is parsed with local rules; when it is an aggregate over the
+    cube's dimensions, the exact numbers are returned as a context document
+    and vector retrieval is skipped. Anything else returns None.
+    """
+
+    def __init__(self, cube: RollupCube, source_path: str, refresh_seconds: int = 60):
+        self.cube = cube
+        self.source_path = source_path
+        self.refresh_seconds = refresh_seconds
+
+        self._metrics = [(name, re.compile(pattern)) for name, pattern in METRIC_PATTERNS]
+        self._dimensions = [(name, re.compile(pattern)) for name, pattern in DIMENSION_PATTERNS]
+        self._aggregations = [(name, re.compile(pattern)) for name, pattern in AGGREGATION_PATTERNS]
+
+        self._checked_at = time.monotonic()
+        self._refreshing: Optional[asyncio.Task] = None
+
+        self._hits = metrics.counter("rollup.hits")
+        self._misses = metrics.counter("rollup.misses")
+
+    async def refresh(self):
+        try:
+            if await asyncio.to_thread(self.cube.refresh, self.source_path):
+                logger.info(f"Rollup cube refreshed from {self.source_path}")
+        except Exception as e:
+            logger.error(f"Error refreshing rollup cube: {e}")
+
+    def schedule_refresh(self):
+        """
+        Folds new rows into the cube in the background at most every
+        `refresh_seconds`, questions keep reading the current cube meanwhile.
+        """
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        if self._refreshing is not None and not self._refreshing.done():
+            return
+        self._checked_at = time.monotonic()
+        self._refreshing = asyncio.create_task(self.refresh())
+
+    def parse(self, question: str) -> Optional[RollupQuestion]:
+        normalized = normalize_query(question)
+        if PRODUCT_PATTERN.search(normalized):
+            return None
+
+        metric = self._first(self._metrics, normalized)
+        agg = self._first(self._aggregations, normalized)
+        dimensions = [name for name, pattern in self._dimensions if pattern.search(normalized)]
+
+        if SHARE_PATTERN.search(normalized) and dimensions:
+            # "tỷ lệ sản phẩm có video": the flag is what is being split, not a filter
+            return RollupQuestion(metric="count", agg="count", by=dimensions[0])
+
+        top = TOP_PATTERN.search(normalized)
+        if top and metric:
+            n = int(top.group(1) or top.group(2) or DEFAULT_TOP_N)
+            return RollupQuestion(
+                metric=metric,
+                # "nhiều nhất" ranks the groups, it does not ask for a per-group maximum
+                agg=agg if agg in ("mean", "median", "sum") else self._default_agg(metric),
+                by=dimensions[0] if dimensions else BRAND_FIELD,
+                top_n=min(n, MAX_TOP_N),
+                ascending=bool(ASCENDING_PATTERN.search(normalized)),
+            )
+
+        if agg is None:
+            return None
+        if agg == "count":
+            metric = "count"
+        elif metric is None:
+            return None
+
+        if dimensions and GROUPING_PATTERN.search(normalized):
+            return RollupQuestion(metric=metric, agg=agg, by=dimensions[0])
+        return RollupQuestion(metric=metric, agg=agg)
+
+    def route(self, question: str, filters: Optional[QueryFilters]) -> Optional[str]:
+        """
+        Returns the facts answering `question` as markdown, or None when the
+        question is not an aggregate the cube can answer.
+        """
+        self.schedule_refresh()
+        if not self.cube.is_loaded():
+            return None
+
+        parsed = self.parse(question)
+        if parsed is None:
+            self._misses.inc()
+            return None
+
+        conditions = as_conditions(filters)
+        conditions.pop(parsed.by, None)
+        rows = self.cube.query(
+            parsed.metric,
+            by=(parsed.by,) if parsed.by else (),
+            filters=conditions,
+            quantiles=(QUANTILE_LABELS[parsed.agg],) if parsed.agg in QUANTILE_LABELS else (),
+        )
+        rows = [row for row in rows if row["products"]]
+        if not rows:
+            self._misses.inc()
+            return None
+
+        self._hits.inc()
+        logger.info(f"Answering from rollup cube: {parsed}, filters={conditions}")
+        return format_facts(parsed, rows, conditions)
+
+    @staticmethod
+    def _first(patterns, normalized: str) -> Optional[str]:
+        return next((name for name, pattern in patterns if pattern.search(normalized)), None)
+
+    @staticmethod
+    def _default_agg(metric: str) -> str:
+        return "sum" if metric in SUMMED_METRICS else "mean"
+
+
+def as_conditions(filters: Optional[QueryFilters]) -> Dict[str, List]:
+    if filters is None:
+        return {}
+
+    conditions = {}
+    if filters.delivery_types:
+        conditions[DELIVERY_TYPE_FIELD] = filters.delivery_types
+    if filters.brands:
+        conditions[BRAND_FIELD] = filters.brands
+    if filters.has_video is not None:
+        conditions[HAS_VIDEO_FIELD] = [filters.has_video]
+    if filters.pay_later is not None:
+        conditions[PAY_LATER_FIELD] = [filters.pay_later]
+    return conditions
+
+
+def aggregate_value(row: dict, agg: str) -> Optional[float]:
+    if agg == "count":
+        return row["products"]
+    if agg == "median":
+        return row.get("p50")
+    return row.get(agg)
+
+
+def format_facts(parsed: RollupQuestion, rows: List[dict], conditions: Dict[str, List]) -> str:
+    """
+    Exact aggregates as a markdown table for the context prompt.
+    """
+    label = "số sản phẩm"
+    if parsed.metric != "count":
+        label = f"{STATISTIC_LABELS[parsed.agg]} của {parsed.metric} ({NUMERIC_FIELDS[parsed.metric]})"
+    rows = [row for row in rows if aggregate_value(row, parsed.agg) is not None]
+    rows.sort(key=lambda row: aggregate_value(row, parsed.agg), reverse=not parsed.ascending)
+    if parsed.top_n:
+        rows = rows[:parsed.top_n]
+
+    lines = [f"### Số liệu chính xác từ bảng tổng hợp toàn bộ sản phẩm: {label}"]
+    if conditions:
+        scope = "; ".join(f"{name} = {', '.join(map(str, values))}" for name, values in conditions.items())
+        lines.append(f"Phạm vi: {scope}")
+    if parsed.agg == "median":
+        lines.append("Trung vị được ước lượng từ sketch với sai số tương đối dưới 1%.")
+
+    dimension = parsed.by or "phạm vi"
+    header = [dimension, "số sản phẩm", "tỷ lệ sản phẩm"]
+    statistics = [] if parsed.metric == "count" else ["mean", "min", "max"]
+    if parsed.agg not in statistics + ["count"]:
+        statistics.insert(0, parsed.agg)
+    header += [STATISTIC_LABELS.get(name, name) for name in statistics]
+    lines += ["", "| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+
+    for row in rows:
+        group = row.get(parsed.by, "không rõ") if parsed.by else "tất cả"
+        cells = [str(group), str(row["products"]), f"{row['share'] * 100:.2f}%"]
+        cells += [format_number(aggregate_value(row, name)) for name in statistics]
+        lines.append("| " + " | ".join(cells) + " |")
+
+    if parsed.by:
+        lines.append(f"\n{CATEGORICAL_FIELDS[parsed.by]}: {len(rows)} nhóm được liệt kê.")
+    return "\n".join(lines)
+
@@ -0,0 +1,168 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from app.core.metrics import metrics
+from app.ingestion.manifest import sync_version
+
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    kind: str  # text | chart | chart_with_text
+    payload: Any
+    created_at: float
+    latency_ms: float
+    filters: Any = None  # QueryFilters of the question, None without any
+
+
+class SemanticCache:
+    """
+    In-process semantic cache of final answers, keyed on the embedding of the
+    condensed standalone question.
+
+    Entries live in a fixed-size matrix of normalized embeddings that is
+    overwritten oldest-first. A lookup is a single matrix-vector product, and
+    a hit must also carry the same numbers and payload filters as the
+    question. The cache is cleared whenever the Qdrant collection fingerprint
+    changes: its point counts, or the sync version alias that every ingestion
+    bumps, which also covers documents updated in place.
+    """
+
+    def __init__(
+            self,
+            aclient=None,
+            collection_name: Optional[str] = None,
+            threshold: float = 0.95,
+            ttl_seconds: int = 3600,
+            max_entries: int = 2000,
+            refresh_seconds: int = 60,
+    ):
+        self.aclient = aclient
+        self.collection_name = collection_name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.refresh_seconds = refresh_seconds
+
+        self._matrix: Optional[np.ndarray] = None
+        self._entries: List[Optional[CachedAnswer]] = [None] * max_entries
+        self._next_slot = 0
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._check_lock = asyncio.Lock()
+
+        self._hits = metrics.counter("semantic_cache.hits")
+        self._misses = metrics.counter("semantic_cache.misses")
+        self._latency_saved = metrics.counter("semantic_cache.latency_saved_ms")
+        metrics.gauge("semantic_cache", self.stats)
+
+    async def lookup(
+            self, question: str, embedding: List[float], kind: str, filters: Any = None
+    ) -> Optional[CachedAnswer]:
+        await self._check_collection()
+
+        entry = self._best_match(question, self._normalize(embedding), kind, filters)
+        if entry is None:
+            self._misses.inc()
+            return None
+
+        self._hits.inc()
+        self._latency_saved.inc(entry.latency_ms)
+        logger.info(f"Semantic cache hit: '{question}' -> '{entry.question}'")
+        return entry
+
+    def store(
+            self, question: str, embedding: List[float], kind: str, payload: Any, latency_ms: float, filters: Any = None
+    ):
+        vector = self._normalize(embedding)
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+        slot = self._next_slot
+        self._matrix[slot] = vector
+        self._entries[slot] = CachedAnswer(question, kind, payload, time.monotonic(), latency_ms, filters)
+        self._next_slot = (slot + 1) % self.max_entries
+
+    def invalidate(self):
+        self._entries = [None] * self.max_entries
+        self._next_slot = 0
+        if self._matrix is not None:
+            self._matrix.fill(0.0)
+
+    def stats(self) -> dict:
+        hits, misses = self._hits.value, self._misses.value
+        return {
+            "entries": sum(entry is not None for entry in self._entries),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "latency_saved_ms": self._latency_saved.value,
+        }
+
+    def _best_match(self, question: str, vector: np.ndarray, kind: str, filters: Any) -> Optional[CachedAnswer]:
+        if self._matrix is None:
+            return None
+
+        scores = self._matrix @ vector
+        now = time.monotonic()
+        numbers = NUMBER_PATTERN.findall(question)
+
+        candidates = np.flatnonzero(scores >= self.threshold)
+        for slot in candidates[np.argsort(scores[candidates])[::-1]]:
+            entry = self._entries[slot]
+            if entry is None or entry.kind != kind:
+                continue
+            if now - entry.created_at > self.ttl_seconds:
+                self._entries[slot] = None
+                self._matrix[slot] = 0.0
+                continue
+            # "top 5" and "top 10" embed almost identically but need different answers
+            if NUMBER_PATTERN.findall(entry.question) != numbers:
+                continue
+            # Likewise "dropship" and "tiki_delivery", or two brands
+            if entry.filters != filters:
+                continue
+
+            return entry
+
+        return None
+
+    async def _check_collection(self):
+        if self.aclient is None or not self.collection_name:
+            return
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+
+        async with self._check_lock:
+            if time.monotonic() - self._checked_at < self.refresh_seconds:
+                return
+            self._checked_at = time.monotonic()
+
+            try:
+                info = await self.aclient.get_collection(self.collection_name)
+                aliases = await self.aclient.get_collection_aliases(self.collection_name)
+                fingerprint = (
+                    info.points_count,
+                    info.indexed_vectors_count,
+                    info.segments_count,
+                    sync_version(self.collection_name, (alias.alias_name for alias in aliases.aliases)),
+                )
+            except Exception as e:
+                logger.error(f"Error checking collection for semantic cache: {e}")
+                return
+
+            if self._fingerprint is not None and fingerprint != self._fingerprint:
+                logger.info(f"Collection {self.collection_name} changed, clearing semantic cache")
+                self.invalidate()
+            self._fingerprint = fingerprint
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
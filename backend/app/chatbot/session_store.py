@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+import aiosqlite
+from llama_index.core.llms import ChatMessage
+from loguru import logger
+
+
+@dataclass
+class SessionEntry:
+    version: int
+    expires_at: float
+
+
+class SessionStore:
+    """
+    Server-side conversation store keyed by session id.
+
+    Hot sessions keep their messages in the chat store and are bounded by an
+    LRU with TTL. Every committed turn is written through to a local SQLite
+    file, so evicted sessions and sessions from before a restart are reloaded
+    on demand. Clients only send the new message plus the last version they
+    received; the full history is needed only after a cache miss.
+    """
+
+    def __init__(
+            self,
+            chat_store,
+            db_path: str,
+            max_sessions: int = 1000,
+            ttl_seconds: int = 3600,
+            retention_seconds: int = 30 * 24 * 3600,
+    ):
+        self.chat_store = chat_store
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.retention_seconds = retention_seconds
+
+        self._sessions: OrderedDict[str, SessionEntry] = OrderedDict()
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_lock = asyncio.Lock()
+        self._commit_lock = asyncio.Lock()
+
+    async def resolve(self, session_id: str, version: Optional[int], history: Optional[List[dict]]) -> Optional[int]:
+        """
+        Makes the session history available in the chat store.
+        Returns the current session version, or None on a cache miss, meaning the
+        client has to upload its full history.
+        """
+        self._evict_expired()
+
+        if history:
+            entry = self._hot(session_id) or await self._load(session_id)
+            messages = [ChatMessage(role=turn["role"], content=turn["content"]) for turn in history]
+            self.chat_store.set_messages(session_id, messages)
+            version = entry.version + 1 if entry else 1
+            # The upload replaces the durable history as well, turns are appended to it
+            await self._save(session_id, version, serialize(messages))
+            return self._touch(session_id, version).version
+
+        entry = self._hot(session_id) or await self._load(session_id)
+        if entry is None:
+            if version:
+                return None
+            return self._touch(session_id, 0).version
+
+        if version is not None and version != entry.version:
+            return None
+
+        return self._touch(session_id, entry.version).version
+
+    async def commit(self, session_id: str, messages: List[ChatMessage]) -> int:
+        """
+        Appends the messages of a finished turn to the durable history and bumps
+        the session version. Both build on the SQLite row, since the hot copy in
+        the chat store may have been trimmed or evicted during the turn.
+        """
+        async with self._commit_lock:
+            db = await self._connect()
+            async with db.execute(
+                    "SELECT version, messages FROM sessions WHERE session_id = ?", (session_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            version, stored = (row[0] + 1, json.loads(row[1])) if row else (1, [])
+            await self._save(session_id, version, stored + serialize(messages))
+
+        self._touch(session_id, version)
+        return version
+
+    def keep_alive(self, session_ids: Iterable[str]):
+        """
+        Extends the TTL of the hot sessions among `session_ids`, e.g. those open on a WebSocket.
+        """
+        for session_id in session_ids:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._touch(session_id, entry.version)
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self.chat_store.delete_messages(session_id)
+
+        db = await self._connect()
+        await db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        await db.commit()
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def _hot(self, session_id: str) -> Optional[SessionEntry]:
+        entry = self._sessions.get(session_id)
+        # The chat store may have evicted the messages on its own under memory pressure
+        if entry is not None and entry.version > 0 and not self.chat_store.get_messages(session_id):
+            return None
+        return entry
+
+    def _touch(self, session_id: str, version: int) -> SessionEntry:
+        entry = SessionEntry(version=version, expires_at=time.monotonic() + self.ttl_seconds)
+        self._sessions[session_id] = entry
+        self._sessions.move_to_end(session_id)
+
+        while len(self._sessions) > self.max_sessions:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            self.chat_store.delete_messages(evicted_id)
+
+        return entry
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        # Entries are kept in access order, so expired ones are at the front
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if entry.expires_at > now:
+                break
+            self._sessions.popitem(last=False)
+            self.chat_store.delete_messages(session_id)
+
+    async def _save(self, session_id: str, version: int, messages: List[List[str]]):
+        db = await self._connect()
+        await db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, version, messages, updated_at) VALUES (?, ?, ?, ?)",
+            (session_id, version, json.dumps(messages, ensure_ascii=False), time.time())
+        )
+        await db.commit()
+
+    async def _load(self, session_id: str) -> Optional[SessionEntry]:
+        db = await self._connect()
+        async with db.execute(
+                "SELECT version, messages FROM sessions WHERE session_id = ?", (session_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        if row is None:
+            return None
+
+        version, messages = row
+        self.chat_store.set_messages(session_id, [
+            ChatMessage(role=role, content=content) for role, content in json.loads(messages)
+        ])
+        return self._touch(session_id, version)
+
+    async def _connect(self) -> aiosqlite.Connection:
+        if self._db is not None:
+            return self._db
+
+        async with self._db_lock:
+            if self._db is None:
+                directory = os.path.dirname(self.db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+
+                db = await aiosqlite.connect(self.db_path)
+                await db.execute("PRAGMA journal_mode=WAL")
+                await db.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions ("
+                    "session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                    "messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+                deleted = await db.execute(
+                    "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.retention_seconds,)
+                )
+                await db.commit()
+                logger.info(f"Session store opened at {self.db_path}, pruned {deleted.rowcount} stale sessions")
+                self._db = db
+
+        return self._db
+
+
+def serialize(messages: Iterable[ChatMessage]) -> List[List[str]]:
+    return [[message.role.value, message.content or ""] for message in messages]
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from loguru import logger
+
+from app.chatbot.events import CANCELLED, ChatEvent
+from app.core.metrics import metrics
+
+CANCEL_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+_finished = object()
+
+
+class TurnRegistry:
+    """
+    Runs every chat turn as its own task, at most one per session id.
+
+    The turn's events are handed to the response through a queue, so the
+    turn can be cancelled independently of the response generator: when the
+    client disconnects, when Starlette stops iterating the response, or when
+    a newer message arrives for the same session. Cancelling the task raises
+    CancelledError at whatever the turn is awaiting (the LLM stream, the
+    retrieval, the chart extraction), and their own cleanup cancels the
+    tasks they spawned.
+    """
+
+    def __init__(self, disconnect_poll_ms: float = 50, supersede_timeout_seconds: float = 1.0):
+        self.disconnect_poll_seconds = disconnect_poll_ms / 1000
+        self.supersede_timeout_seconds = supersede_timeout_seconds
+        self._turns: Dict[str, asyncio.Task] = {}
+        self._superseded_turns: Set[asyncio.Task] = set()
+
+        self._disconnects = metrics.counter("chat.cancelled.disconnect")
+        self._superseded = metrics.counter("chat.cancelled.superseded")
+        self._cancel_latency = metrics.histogram("chat.cancel_ms", CANCEL_BUCKETS_MS)
+        metrics.gauge("chat.turns", lambda: {"active": len(self._turns)})
+
+    async def stream(
+            self,
+            session_id: str,
+            events: AsyncIterator[ChatEvent],
+            is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> AsyncIterator[ChatEvent]:
+        """
+        Yields the events of one turn. A superseded turn ends with a
+        `cancelled` event.
+        """
+        await self._supersede(session_id)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        turn = asyncio.create_task(self._pump(events, queue))
+        self._turns[session_id] = turn
+        watcher = asyncio.create_task(self._watch(turn, is_disconnected)) if is_disconnected else None
+
+        try:
+            while True:
+                event = await queue.get()
+                if event is _finished:
+                    break
+                yield event
+
+            if turn in self._superseded_turns:
+                yield ChatEvent(CANCELLED, "superseded")
+            elif not turn.cancelled():
+                # Surfaces an error the turn raised instead of yielding it
+                turn.result()
+        finally:
+            self._superseded_turns.discard(turn)
+            if watcher is not None:
+                watcher.cancel()
+            if not turn.done():
+                # The response stopped iterating: the client went away mid-stream
+                self._disconnects.inc()
+                await self._cancel(turn)
+            if self._turns.get(session_id) is turn:
+                del self._turns[session_id]
+
+    async def _pump(self, events: AsyncIterator[ChatEvent], queue: asyncio.Queue):
+        try:
+            async for event in events:
+                queue.put_nowait(event)
+        finally:
+            queue.put_nowait(_finished)
+
+    async def _watch(self, turn: asyncio.Task, is_disconnected: Callable[[], Awaitable[bool]]):
+        while not turn.done():
+            if await is_disconnected():
+                logger.info("Client disconnected, cancelling the chat turn")
+                self._disconnects.inc()
+                await self._cancel(turn)
+                return
+            await asyncio.sleep(self.disconnect_poll_seconds)
+
+    async def _supersede(self, session_id: str):
+        previous = self._turns.get(session_id)
+        if previous is None or previous.done():
+            return
+
+        logger.info(f"Newer message for session {session_id}, cancelling the previous turn")
+        self._superseded.inc()
+        self._superseded_turns.add(previous)
+        # Wait for it to unwind, so the two turns never write the session together
+        await self._cancel(previous, timeout=self.supersede_timeout_seconds)
+
+    async def _cancel(self, turn: asyncio.Task, timeout: Optional[float] = None):
+        started = time.perf_counter()
+        # Measured from the task itself, the waiter may be cancelled before it wakes up
+        turn.add_done_callback(lambda _: self._cancel_latency.observe((time.perf_counter() - started) * 1000))
+        turn.cancel()
+        await asyncio.wait({turn}, timeout=timeout)
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import List, Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -47,11 +47,95 @@ class Configs(BaseSettings):
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", 10240))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", 0.6))
     EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-large")
-    SCORING_MODEL_NAME: str = os.getenv("SCORING_MODEL_NAME", "all-mpnet-base-v2")
+    SCORING_MODEL_NAME: str = os.getenv("SCORING_MODEL_NAME", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    EMBEDDING_ONNX_CACHE_DIR: str = os.getenv("EMBEDDING_ONNX_CACHE_DIR", os.path.join(PROJECT_ROOT, "data", "onnx_models"))
+    EMBEDDING_ONNX_QUANTIZE: bool = os.getenv("EMBEDDING_ONNX_QUANTIZE", "true").lower() == "true"
+    EMBEDDING_ONNX_THREADS: Optional[int] = int(os.getenv("EMBEDDING_ONNX_THREADS")) if os.getenv("EMBEDDING_ONNX_THREADS") else None
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+    EMBEDDING_BATCH_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(PROJECT_ROOT, "data", "embedding_cache"))
 
     TOP_K: int = int(os.getenv("TOP_K", 15))
     TOKEN_LIMIT: int = int(os.getenv("TOKEN_LIMIT", 20048))
 
+    # Hybrid dense + sparse retrieval, and fusing the raw message with the condensed question
+    HYBRID_ENABLED: bool = os.getenv("HYBRID_ENABLED", "true").lower() == "true"
+    SPARSE_MODEL_NAME: str = os.getenv("SPARSE_MODEL_NAME", "Qdrant/bm25")
+    HYBRID_PREFETCH_K: int = int(os.getenv("HYBRID_PREFETCH_K", 40))
+    MULTI_QUERY_ENABLED: bool = os.getenv("MULTI_QUERY_ENABLED", "true").lower() == "true"
+
+    # Retrieve on the raw message while the question is condensed, keep it if the two embed closely enough
+    SPECULATIVE_RETRIEVAL_ENABLED: bool = os.getenv("SPECULATIVE_RETRIEVAL_ENABLED", "true").lower() == "true"
+    SPECULATION_THRESHOLD: float = float(os.getenv("SPECULATION_THRESHOLD", 0.9))
+
+    # Retrieved candidates are reranked, deduplicated and packed into a context token budget
+    RERANK_TOP_N: int = int(os.getenv("RERANK_TOP_N", 8))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", 16))
+    MMR_LAMBDA: float = float(os.getenv("MMR_LAMBDA", 0.7))
+    MMR_DUPLICATE_THRESHOLD: float = float(os.getenv("MMR_DUPLICATE_THRESHOLD", 0.95))
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+    # Drop between reranker probabilities (0-1) that ends the relevant head
+    CONTEXT_MIN_SCORE_GAP: float = float(os.getenv("CONTEXT_MIN_SCORE_GAP", 0.3))
+
+    # Minimum similarity margin between chart / text prototypes before falling back to the LLM
+    CHART_INTENT_MIN_MARGIN: float = float(os.getenv("CHART_INTENT_MIN_MARGIN", 0.02))
+
+    # Raw TIKI product table (CSV, JSON lines or Parquet) behind chart computation and analytics
+    PRODUCT_DATASET_PATH: str = os.getenv("PRODUCT_DATASET_PATH", os.path.join(PROJECT_ROOT, "data", "products.csv"))
+
+    # Columnar analytics over the product table, offered to the LLM as function-calling tools
+    ANALYTICS_ENABLED: bool = os.getenv("ANALYTICS_ENABLED", "true").lower() == "true"
+    ANALYTICS_STORE_DIR: str = os.getenv("ANALYTICS_STORE_DIR", os.path.join(PROJECT_ROOT, "data", "analytics"))
+    ANALYTICS_MAX_TOOL_ROUNDS: int = int(os.getenv("ANALYTICS_MAX_TOOL_ROUNDS", 3))
+
+    # Precomputed aggregates per brand x delivery type x flags for common aggregate questions
+    ROLLUP_ENABLED: bool = os.getenv("ROLLUP_ENABLED", "true").lower() == "true"
+    ROLLUP_DIR: str = os.getenv("ROLLUP_DIR", os.path.join(PROJECT_ROOT, "data", "rollup"))
+    ROLLUP_REFRESH_SECONDS: int = int(os.getenv("ROLLUP_REFRESH_SECONDS", 60))
+
+    # Chart questions also stream a prose answer, generated concurrently over the same context
+    CHART_WITH_TEXT_ENABLED: bool = os.getenv("CHART_WITH_TEXT_ENABLED", "true").lower() == "true"
+
+    # Charts computed from raw product rows, the LLM only picks fields, grouping and bins
+    CHART_COMPUTE_ENABLED: bool = os.getenv("CHART_COMPUTE_ENABLED", "true").lower() == "true"
+    CHART_MAX_POINTS: int = int(os.getenv("CHART_MAX_POINTS", 2000))
+    CHART_MAX_BINS: int = int(os.getenv("CHART_MAX_BINS", 50))
+
+    # Server-side chat sessions
+    SESSION_DB_PATH: str = os.getenv("SESSION_DB_PATH", os.path.join(PROJECT_ROOT, "data", "sessions.sqlite3"))
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", 3600))
+    SESSION_RETENTION_SECONDS: int = int(os.getenv("SESSION_RETENTION_SECONDS", 30 * 24 * 3600))
+    CHAT_STORE_MAX_BYTES: int = int(os.getenv("CHAT_STORE_MAX_BYTES", 64 * 1024 * 1024))
+
+    # In-flight turns are cancelled when the client disconnects or sends a newer message
+    DISCONNECT_POLL_MS: float = float(os.getenv("DISCONNECT_POLL_MS", 50))
+
+    # Streamed text is coalesced into one SSE event per window or size, whichever comes first
+    SSE_FLUSH_MS: float = float(os.getenv("SSE_FLUSH_MS", 20))
+    SSE_FLUSH_BYTES: int = int(os.getenv("SSE_FLUSH_BYTES", 512))
+
+    # Sessions open on a chat WebSocket are kept hot at this interval
+    WS_KEEPALIVE_SECONDS: float = float(os.getenv("WS_KEEPALIVE_SECONDS", 60))
+
+    # Batch question API for reports
+    BATCH_MAX_QUESTIONS: int = int(os.getenv("BATCH_MAX_QUESTIONS", 200))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+
+    # Semantic answer cache keyed on the condensed question
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+    SEMANTIC_CACHE_TTL_SECONDS: int = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 3600))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 2000))
+    SEMANTIC_CACHE_REFRESH_SECONDS: int = int(os.getenv("SEMANTIC_CACHE_REFRESH_SECONDS", 60))
+
+    # Exact-match LLM response cache: off | readwrite | record | replay
+    LLM_CACHE_MODE: str = os.getenv("LLM_CACHE_MODE", "readwrite").lower()
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", os.path.join(PROJECT_ROOT, "data", "llm_cache.sqlite3"))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1000))
+
     COHERE_API_TOKEN: str = os.getenv("COHERE_API_TOKEN")
 
     PAGE: int = 1
@@ -2,12 +2,16 @@ from dependency_injector import containers, providers
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.gemini import Gemini
 
+from app.ai.batched_embedding import BatchingEmbedding
+from app.ai.cached_llm import CachedLLM
+from app.ai.embedding_cache import CachedEmbedding
+from app.ai.onnx_embedding import OnnxEmbedding
 
 
 class AIContainer(containers.DeclarativeContainer):
     config = providers.Configuration()
 
-    llm_gemini = providers.Singleton(
+    gemini = providers.Singleton(
         Gemini,
         model_name='models/gemini-2.0-flash',
         api_key=config.GEMINI_TOKEN,
@@ -15,8 +19,62 @@ class AIContainer(containers.DeclarativeContainer):
         temperature=config.TEMPERATURE
     )
 
-    embed_model = providers.Singleton(
+    cached_gemini = providers.Singleton(
+        CachedLLM,
+        llm=gemini,
+        mode=config.LLM_CACHE_MODE,
+        db_path=config.LLM_CACHE_PATH,
+        max_entries=config.LLM_CACHE_MAX_ENTRIES,
+    )
+
+    # LLM_CACHE_MODE=off talks to Gemini directly
+    llm_gemini = providers.Selector(
+        config.LLM_CACHE_MODE,
+        off=gemini,
+        readwrite=cached_gemini,
+        record=cached_gemini,
+        replay=cached_gemini,
+    )
+
+    huggingface_embedding = providers.Singleton(
         HuggingFaceEmbedding,
         model_name=config.EMBEDDING_MODEL_NAME
     )
 
+    onnx_embedding = providers.Singleton(
+        OnnxEmbedding,
+        model_name=config.EMBEDDING_MODEL_NAME,
+        cache_dir=config.EMBEDDING_ONNX_CACHE_DIR,
+        quantize=config.EMBEDDING_ONNX_QUANTIZE,
+        threads=config.EMBEDDING_ONNX_THREADS,
+    )
+
+    # EMBEDDING_BACKEND=onnx runs the int8 ONNX export of the same model
+    base_embedding = providers.Selector(
+        config.EMBEDDING_BACKEND,
+        torch=huggingface_embedding,
+        onnx=onnx_embedding,
+    )
+
+    # Concurrent query embeddings share one forward pass off the event loop
+    batching_embedding = providers.Singleton(
+        BatchingEmbedding,
+        embed_model=base_embedding,
+        max_batch_size=config.EMBEDDING_BATCH_SIZE,
+        max_wait_ms=config.EMBEDDING_BATCH_WAIT_MS,
+    )
+
+    cached_embedding = providers.Singleton(
+        CachedEmbedding,
+        embed_model=batching_embedding,
+        cache_dir=config.EMBEDDING_CACHE_DIR,
+    )
+
+    # Repeated texts are served from the on-disk cache before reaching the model
+    embed_model = providers.Callable(
+        lambda enabled, cached, batching: cached() if enabled else batching(),
+        enabled=config.EMBEDDING_CACHE_ENABLED,
+        cached=cached_embedding.provider,
+        batching=batching_embedding.provider,
+    )
+
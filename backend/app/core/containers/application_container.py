@@ -38,5 +38,7 @@ class ApplicationContainer(containers.DeclarativeContainer):
     services = providers.Container(
         ServiceContainer,
         config=config,
-        chat_engine=chatbot.chat_engine
+        chat_engine=chatbot.chat_engine,
+        session_store=chatbot.session_store,
+        turn_registry=chatbot.turn_registry
     )
@@ -1,9 +1,20 @@
 from dependency_injector import containers, providers
 
+from app.analytics.engine import AnalyticsEngine
+from app.analytics.rollup import RollupCube
+from app.analytics.tools import build_analytics_tools
+from app.chatbot.chart_compute import ChartComputeEngine
 from app.chatbot.chat_engine import ChatEngine
-from llama_index.core import VectorStoreIndex
+from app.chatbot.chat_store import BoundedChatStore
+from app.chatbot.intent_classifier import ChartIntentClassifier
+from app.chatbot.query_analyzer import QueryAnalyzer
+from app.chatbot.postprocessors import CrossEncoderRerank, MMRFilter, TokenBudgetPacker
+from app.chatbot.retrievers import HybridQdrantRetriever, fastembed_sparse_encoders
+from app.chatbot.rollup_router import RollupRouter
+from app.chatbot.semantic_cache import SemanticCache
+from app.chatbot.session_store import SessionStore
+from app.chatbot.turn_registry import TurnRegistry
 from llama_index.vector_stores.qdrant import QdrantVectorStore
-from llama_index.core.storage.chat_store import SimpleChatStore
 
 
 class ChatbotContainer(containers.DeclarativeContainer):
@@ -16,6 +27,13 @@ class ChatbotContainer(containers.DeclarativeContainer):
     llm = AI.llm_gemini
     embed_model = AI.embed_model
 
+    # (document, query) sparse encoders over one fastembed model, shared by the store and the retriever
+    sparse_encoders = providers.Singleton(
+        lambda enabled, model_name: fastembed_sparse_encoders(model_name) if enabled else (None, None),
+        enabled=config.HYBRID_ENABLED,
+        model_name=config.SPARSE_MODEL_NAME,
+    )
+
     # Vector store components
     vector_store = providers.Singleton(
         QdrantVectorStore,
@@ -23,34 +41,149 @@ class ChatbotContainer(containers.DeclarativeContainer):
         aclient=async_qdrant_client,
         collection_name=config.QDRANT_COLLECTION_NAME,
         dense_vector_name="text-dense",
-        enable_hybrid=False
+        enable_hybrid=config.HYBRID_ENABLED,
+        sparse_doc_fn=sparse_encoders.provided[0],
+        sparse_query_fn=sparse_encoders.provided[1],
     )
 
-    # Index components
-    index = providers.Singleton(
-        VectorStoreIndex.from_vector_store,
+    # Dense + sparse retriever, batches query variants into one Qdrant request
+    embedding_retriever = providers.Singleton(
+        HybridQdrantRetriever,
         vector_store=vector_store,
+        client=qdrant_client,
+        aclient=async_qdrant_client,
+        collection_name=config.QDRANT_COLLECTION_NAME,
         embed_model=embed_model,
-        use_async=True,
+        top_k=config.TOP_K,
+        prefetch_k=config.HYBRID_PREFETCH_K,
+        hybrid=config.HYBRID_ENABLED,
+        sparse_query_fn=sparse_encoders.provided[1],
+        # MMR runs on the stored chunk vectors instead of re-embedding the candidates
+        with_vectors=True,
+    )
+
+    query_analyzer = providers.Singleton(
+        QueryAnalyzer,
+        aclient=async_qdrant_client,
+        collection_name=config.QDRANT_COLLECTION_NAME,
     )
 
-    # Embedding-based job retriever
-    embedding_retriever = providers.Factory(
-        lambda idx, top_k: idx.as_retriever(similarity_top_k=top_k),
-        idx=index,
-        top_k=20,
+    # Candidate postprocessing: cross-encoder rerank, MMR, token budget packing
+    reranker = providers.Singleton(
+        CrossEncoderRerank,
+        model_name=config.SCORING_MODEL_NAME,
+        top_n=config.RERANK_TOP_N,
+        batch_size=config.RERANK_BATCH_SIZE,
     )
 
+    mmr_filter = providers.Singleton(
+        MMRFilter,
+        embed_model=embed_model,
+        lambda_mult=config.MMR_LAMBDA,
+        duplicate_threshold=config.MMR_DUPLICATE_THRESHOLD,
+    )
 
+    context_packer = providers.Singleton(
+        TokenBudgetPacker,
+        token_budget=config.CONTEXT_TOKEN_BUDGET,
+        min_score_gap=config.CONTEXT_MIN_SCORE_GAP,
+    )
+
+    node_postprocessors = providers.List(reranker, mmr_filter, context_packer)
 
     # Helper components
-    chat_store = providers.Singleton(SimpleChatStore)
+    chat_store = providers.Singleton(
+        BoundedChatStore,
+        max_bytes=config.CHAT_STORE_MAX_BYTES,
+        ttl_seconds=config.SESSION_TTL_SECONDS,
+    )
+
+    session_store = providers.Singleton(
+        SessionStore,
+        chat_store=chat_store,
+        db_path=config.SESSION_DB_PATH,
+        max_sessions=config.SESSION_MAX_SESSIONS,
+        ttl_seconds=config.SESSION_TTL_SECONDS,
+        retention_seconds=config.SESSION_RETENTION_SECONDS,
+    )
+
+    turn_registry = providers.Singleton(TurnRegistry, disconnect_poll_ms=config.DISCONNECT_POLL_MS)
+
+    intent_classifier = providers.Singleton(
+        ChartIntentClassifier,
+        embed_model=embed_model,
+        llm=llm,
+        min_margin=config.CHART_INTENT_MIN_MARGIN,
+    )
+
+    semantic_cache = providers.Singleton(
+        SemanticCache,
+        aclient=async_qdrant_client,
+        collection_name=config.QDRANT_COLLECTION_NAME,
+        threshold=config.SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds=config.SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES,
+        refresh_seconds=config.SEMANTIC_CACHE_REFRESH_SECONDS,
+    )
+
+    analytics_engine = providers.Singleton(
+        AnalyticsEngine,
+        source_path=config.PRODUCT_DATASET_PATH,
+        store_dir=config.ANALYTICS_STORE_DIR,
+    )
+
+    # Only offered to the LLM when there is a product table to query
+    analytics_tools = providers.Callable(
+        lambda enabled, engine: build_analytics_tools(engine) if enabled and engine.available() else None,
+        enabled=config.ANALYTICS_ENABLED,
+        engine=analytics_engine,
+    )
+
+    chart_compute = providers.Singleton(
+        ChartComputeEngine,
+        analytics=analytics_engine,
+        max_points=config.CHART_MAX_POINTS,
+        max_bins=config.CHART_MAX_BINS,
+    )
+
+    rollup_cube = providers.Singleton(RollupCube, directory=config.ROLLUP_DIR)
+
+    rollup_router = providers.Singleton(
+        RollupRouter,
+        cube=rollup_cube,
+        source_path=config.PRODUCT_DATASET_PATH,
+        refresh_seconds=config.ROLLUP_REFRESH_SECONDS,
+    )
 
-    # Main chat engine
-    chat_engine = providers.Factory(
+    # Main chat engine, shared by all requests
+    chat_engine = providers.Singleton(
         ChatEngine,
         llm=llm,
         retriever=embedding_retriever,
         embedding_model=embed_model,
         chat_store=chat_store,
+        intent_classifier=intent_classifier,
+        semantic_cache=providers.Callable(
+            lambda enabled, cache: cache if enabled else None,
+            enabled=config.SEMANTIC_CACHE_ENABLED,
+            cache=semantic_cache,
+        ),
+        node_postprocessors=node_postprocessors,
+        multi_query=config.MULTI_QUERY_ENABLED,
+        query_analyzer=query_analyzer,
+        speculative_retrieval=config.SPECULATIVE_RETRIEVAL_ENABLED,
+        speculation_threshold=config.SPECULATION_THRESHOLD,
+        chart_with_text=config.CHART_WITH_TEXT_ENABLED,
+        chart_compute=providers.Callable(
+            lambda enabled, engine: engine if enabled else None,
+            enabled=config.CHART_COMPUTE_ENABLED,
+            engine=chart_compute,
+        ),
+        analytics_tools=analytics_tools,
+        max_tool_rounds=config.ANALYTICS_MAX_TOOL_ROUNDS,
+        rollup_router=providers.Callable(
+            lambda enabled, router: router if enabled else None,
+            enabled=config.ROLLUP_ENABLED,
+            router=rollup_router,
+        ),
     )
\ No newline at end of file
@@ -1,13 +1,35 @@
 from dependency_injector import containers, providers
+from app.services.chat_connection import ChatConnection
 from app.services.chatbot_service import ChatbotService
+from app.util.sse import SSEWriter
 
 
 class ServiceContainer(containers.DeclarativeContainer):
     config = providers.Configuration()
     chat_engine = providers.Dependency()
+    session_store = providers.Dependency()
+    turn_registry = providers.Dependency()
 
 
     chatbot_service = providers.Factory(
         ChatbotService,
-        chat_engine=chat_engine
-    )
\ No newline at end of file
+        chat_engine=chat_engine,
+        session_store=session_store,
+        turn_registry=turn_registry,
+        batch_max_questions=config.BATCH_MAX_QUESTIONS,
+        batch_max_concurrency=config.BATCH_MAX_CONCURRENCY
+    )
+
+    sse_writer = providers.Singleton(
+        SSEWriter,
+        flush_ms=config.SSE_FLUSH_MS,
+        flush_bytes=config.SSE_FLUSH_BYTES
+    )
+
+    # Called with the websocket, one per connection
+    chat_connection = providers.Factory(
+        ChatConnection,
+        service=chatbot_service,
+        coalescer=sse_writer,
+        keepalive_seconds=config.WS_KEEPALIVE_SECONDS
+    )
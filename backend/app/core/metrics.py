@@ -0,0 +1,85 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Sequence
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, cumulative like Prometheus buckets.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self._count
+
+            return {
+                "count": self._count,
+                "sum": self._sum,
+                "mean": self._sum / self._count if self._count else 0.0,
+                "buckets": buckets,
+            }
+
+
+class MetricsRegistry:
+    """
+    Process-local registry of counters, histograms and gauges, exposed at /metrics.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str) -> Counter:
+        with self._lock:
+            return self._counters.setdefault(name, Counter())
+
+    def histogram(self, name: str, buckets: Sequence[float]) -> Histogram:
+        with self._lock:
+            return self._histograms.setdefault(name, Histogram(buckets))
+
+    def gauge(self, name: str, collect: Callable[[], dict]):
+        with self._lock:
+            self._gauges[name] = collect
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": {name: counter.value for name, counter in self._counters.items()},
+            "histograms": {name: histogram.snapshot() for name, histogram in self._histograms.items()},
+            "gauges": {name: collect() for name, collect in self._gauges.items()},
+        }
+
+
+metrics = MetricsRegistry()
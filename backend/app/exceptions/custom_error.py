@@ -8,6 +8,8 @@ class CustomError(Enum):
     CHAT_ENGINE_ERROR = (status.HTTP_500_INTERNAL_SERVER_ERROR, "100", "Chat engine could not initialized")
     INTERNAL_SERVER_ERROR = (status.HTTP_500_INTERNAL_SERVER_ERROR, "101", "Internal server error")
     NOT_FOUND = (status.HTTP_404_NOT_FOUND, "102", "The resource could not be found")
+    SESSION_CACHE_MISS = (status.HTTP_409_CONFLICT, "103", "Session history is out of date, resend the full history")
+    BATCH_TOO_LARGE = (status.HTTP_400_BAD_REQUEST, "104", "Too many questions in one batch")
     # …
 
     def __init__(self, http_status: int, code: str, message: str):
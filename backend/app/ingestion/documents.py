@@ -0,0 +1,168 @@
+import math
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from llama_index.core.schema import TextNode
+
+from app.analytics.dataset import CATEGORICAL_FIELDS, FLAG_FIELDS, NUMERIC_FIELDS
+from app.analytics.rollup import METRICS, RollupCube
+from app.chatbot.chart_compute import format_number
+from app.chatbot.query_analyzer import BRAND_FIELD, DELIVERY_TYPE_FIELD, HAS_VIDEO_FIELD, PAY_LATER_FIELD
+
+# Stable point ids, re-ingesting the same product or insight overwrites its point
+POINT_NAMESPACE = uuid.UUID("6f1c2a4e-8d3b-4b7a-9e2f-5a0c1d7e3b90")
+
+NAME_FIELDS = ("name", "product_name", "title")
+ID_FIELDS = ("id", "product_id", "sku")
+
+FLAG_LABELS = {
+    HAS_VIDEO_FIELD: ("có video", "không có video"),
+    PAY_LATER_FIELD: ("hỗ trợ mua trả sau", "không hỗ trợ mua trả sau"),
+}
+SEGMENT_QUANTILE = 0.5
+
+
+def point_id(key: str) -> str:
+    return str(uuid.uuid5(POINT_NAMESPACE, key))
+
+
+def product_documents(chunk: pd.DataFrame, start_row: int) -> List[TextNode]:
+    """
+    One statistics document per product row. The numbers go into the payload
+    too, so filters and chart computation can use them without parsing text.
+    """
+    name_field = next((name for name in NAME_FIELDS if name in chunk.columns), None)
+    id_field = next((name for name in ID_FIELDS if name in chunk.columns), None)
+    columns = [c for c in (*NUMERIC_FIELDS, *CATEGORICAL_FIELDS, name_field, id_field) if c and c in chunk.columns]
+
+    nodes = []
+    for offset, record in enumerate(chunk[columns].to_dict("records")):
+        record = {key: value for key, value in record.items() if not is_missing(value)}
+        key = f"product:{record[id_field]}" if id_field in record else f"row:{start_row + offset}"
+        metadata = {
+            name: record[name] for name in (*NUMERIC_FIELDS, *CATEGORICAL_FIELDS) if name in record
+        }
+        if id_field in record:
+            metadata["product_id"] = str(record[id_field])
+        if name_field in record:
+            metadata["name"] = str(record[name_field])
+
+        nodes.append(build_node(key, describe_product(record, name_field), {"kind": "product", **metadata}))
+    return nodes
+
+
+def describe_product(record: dict, name_field: Optional[str]) -> str:
+    parts = [f"Sản phẩm: {record[name_field]}." if name_field in record else "Sản phẩm."]
+    if BRAND_FIELD in record:
+        parts.append(f"Thương hiệu: {record[BRAND_FIELD]}.")
+    for name, label in NUMERIC_FIELDS.items():
+        if name in record:
+            parts.append(f"{label.capitalize()}: {format_number(record[name])}.")
+    if DELIVERY_TYPE_FIELD in record:
+        parts.append(f"Loại giao hàng: {record[DELIVERY_TYPE_FIELD]}.")
+    for name in FLAG_FIELDS:
+        if name in record:
+            positive, negative = FLAG_LABELS[name]
+            parts.append(f"Sản phẩm {positive if record[name] else negative}.")
+    return " ".join(parts)
+
+
+def insight_documents(cube: RollupCube, max_brands: int = 200) -> List[TextNode]:
+    """
+    Statistics per segment (delivery type, flags, the largest brands) and for
+    the whole collection, read from the rollup cube. Segment documents carry
+    the segment attribute in their payload; collection-wide and comparison
+    documents carry none, so filtered queries still see them.
+    """
+    overall = segment_stats(cube)[None]
+    nodes = [build_node("insight:all", describe_segment("toàn bộ sản phẩm", overall), {"kind": "insight"})]
+
+    for dimension in (DELIVERY_TYPE_FIELD, *FLAG_FIELDS, BRAND_FIELD):
+        stats = segment_stats(cube, dimension)
+        values = sorted((v for v in stats if v is not None), key=lambda v: -stats[v]["products"])
+        if dimension == BRAND_FIELD:
+            values = values[:max_brands]
+
+        for value in values:
+            title = f"{CATEGORICAL_FIELDS[dimension]}: {segment_label(dimension, value)}"
+            nodes.append(build_node(
+                f"insight:{dimension}:{value}",
+                describe_segment(title, stats[value]),
+                {"kind": "insight", dimension: value},
+            ))
+
+        if dimension != BRAND_FIELD and len(values) > 1:
+            nodes.append(build_node(
+                f"insight:compare:{dimension}",
+                describe_comparison(dimension, values, stats),
+                {"kind": "insight"},
+            ))
+    return nodes
+
+
+def segment_stats(cube: RollupCube, dimension: Optional[str] = None) -> Dict[object, dict]:
+    """
+    Segment value -> {"products", "share", metric -> row} for every metric.
+    """
+    by = (dimension,) if dimension else ()
+    stats: Dict[object, dict] = {}
+    for row in cube.query("count", by=by):
+        stats[row.get(dimension)] = {"products": row["products"], "share": row["share"]}
+    for metric in METRICS:
+        for row in cube.query(metric, by=by, quantiles=(SEGMENT_QUANTILE,)):
+            if row.get("count"):
+                stats[row.get(dimension)][metric] = row
+    return stats
+
+
+def segment_label(dimension: str, value) -> str:
+    if dimension in FLAG_LABELS:
+        positive, negative = FLAG_LABELS[dimension]
+        return positive if value else negative
+    return str(value)
+
+
+def describe_segment(title: str, stats: dict) -> str:
+    lines = [f"Thống kê {title}: {stats['products']} sản phẩm ({stats['share'] * 100:.2f}% tổng số sản phẩm)."]
+    for metric, label in NUMERIC_FIELDS.items():
+        if metric in stats:
+            row = stats[metric]
+            lines.append(
+                f"- {label.capitalize()}: trung bình {format_number(row['mean'])}, "
+                f"trung vị {format_number(row['p50'])}, thấp nhất {format_number(row['min'])}, "
+                f"cao nhất {format_number(row['max'])}, tổng {format_number(row['sum'])}."
+            )
+    return "\n".join(lines)
+
+
+def describe_comparison(dimension: str, values: Iterable, stats: Dict[object, dict]) -> str:
+    values = list(values)
+    labels = {value: segment_label(dimension, value) for value in values}
+    lines = [f"So sánh theo {CATEGORICAL_FIELDS[dimension]} giữa: {', '.join(labels.values())}."]
+    for value in values:
+        lines.append(f"- {labels[value]}: {stats[value]['products']} sản phẩm ({stats[value]['share'] * 100:.2f}%).")
+    for metric, label in NUMERIC_FIELDS.items():
+        means = [
+            f"{labels[value]} {format_number(stats[value][metric]['mean'])}"
+            for value in values if metric in stats[value]
+        ]
+        if len(means) > 1:
+            lines.append(f"- {label.capitalize()} trung bình: {'; '.join(means)}.")
+    return "\n".join(lines)
+
+
+def build_node(key: str, text: str, metadata: dict) -> TextNode:
+    # The text already states every number, keep the payload out of the embedding and the prompt
+    keys = list(metadata)
+    return TextNode(
+        id_=point_id(key),
+        text=text,
+        metadata=metadata,
+        excluded_embed_metadata_keys=keys,
+        excluded_llm_metadata_keys=keys,
+    )
+
+
+def is_missing(value) -> bool:
+    return value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value))
@@ -0,0 +1,113 @@
+"""
+Builds the Qdrant collection read by the chatbot from the raw product table
+(CSV, JSON lines or Parquet): one statistics document per product plus
+segment and collection-wide insight documents. Progress is checkpointed
+after every chunk, so re-running the same command resumes a failed run.
+
+    python -m app.ingestion.ingest [--source data/products.csv] [--qdrant-path data/qdrant] [--fresh]
+
+Without --qdrant-path the configured QDRANT_URL is used; with it, Qdrant
+runs in local mode on that directory.
+"""
+import argparse
+import asyncio
+import json
+import os
+from typing import Optional
+
+from llama_index.vector_stores.qdrant.base import DEFAULT_SPARSE_VECTOR_NAME
+from loguru import logger
+from qdrant_client import QdrantClient
+from qdrant_client.qdrant_fastembed import IDF_EMBEDDING_MODELS
+
+from app.chatbot.retrievers import fastembed_sparse_doc_encoder
+from app.core.config import configs
+from app.ingestion.manifest import SyncManifest
+from app.ingestion.pipeline import IngestionCheckpoint, IngestionPipeline, IngestionReport
+
+
+def build_embed_model(batch_size: int):
+    from app.core.containers.ai_container import AIContainer
+
+    ai = AIContainer()
+    ai.config.from_dict(configs.dict())
+    embed_model = ai.base_embedding()
+    embed_model.embed_batch_size = batch_size
+    return embed_model
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--source", default=configs.PRODUCT_DATASET_PATH)
+    parser.add_argument("--collection", default=configs.QDRANT_COLLECTION_NAME)
+    parser.add_argument("--qdrant-path", help="Run Qdrant in local mode on this directory")
+    parser.add_argument("--chunksize", type=int, default=10_000, help="Rows read from the source at a time")
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--upload-batch-size", type=int, default=256)
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Concurrent upload_points requests")
+    parser.add_argument("--no-hybrid", action="store_true", help="Skip the sparse vectors")
+    parser.add_argument("--rollup-dir", default=configs.ROLLUP_DIR)
+    parser.add_argument("--max-brands", type=int, default=200, help="Brands that get their own insight document")
+
+
+def build_pipeline(args: argparse.Namespace, manifest: Optional[SyncManifest] = None) -> IngestionPipeline:
+    if args.qdrant_path:
+        client = QdrantClient(path=args.qdrant_path)
+        # Local mode is an in-process store without locking, uploads go one at a time
+        max_in_flight = 1
+    else:
+        client = QdrantClient(url=configs.QDRANT_URL, api_key=configs.QDRANT_API_TOKEN)
+        max_in_flight = args.max_in_flight
+
+    hybrid = configs.HYBRID_ENABLED and not args.no_hybrid
+    return IngestionPipeline(
+        client=client,
+        collection_name=args.collection,
+        embed_model=build_embed_model(args.embed_batch_size),
+        sparse_vector_name=DEFAULT_SPARSE_VECTOR_NAME,
+        sparse_doc_fn=fastembed_sparse_doc_encoder(configs.SPARSE_MODEL_NAME) if hybrid else None,
+        sparse_idf=configs.SPARSE_MODEL_NAME in IDF_EMBEDDING_MODELS,
+        chunksize=args.chunksize,
+        embed_batch_size=args.embed_batch_size,
+        upload_batch_size=args.upload_batch_size,
+        max_in_flight=max_in_flight,
+        manifest=manifest,
+    )
+
+
+def print_report(collection: str, report: IngestionReport, **extra):
+    print(json.dumps({
+        "collection": collection,
+        "documents": report.documents,
+        **extra,
+        "seconds": round(report.seconds, 2),
+        "documents_per_second": round(report.documents_per_second, 1),
+        "embed_seconds": round(report.embed_seconds, 2),
+        "upload_seconds": round(report.upload_seconds, 2),
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--checkpoint", help="Defaults to data/ingestion/<collection>.json")
+    parser.add_argument("--fresh", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+    if not args.collection:
+        parser.error("--collection or QDRANT_COLLECTION_NAME is required")
+
+    pipeline = build_pipeline(args)
+    checkpoint = IngestionCheckpoint(
+        args.checkpoint or os.path.join(configs.PROJECT_ROOT, "data", "ingestion", f"{args.collection}.json")
+    )
+    if args.fresh:
+        checkpoint.clear()
+
+    logger.info(f"Ingesting {args.source} into {args.collection}")
+    report = asyncio.run(pipeline.run(args.source, checkpoint, rollup_dir=args.rollup_dir, max_brands=args.max_brands))
+    pipeline.client.close()
+
+    print_report(args.collection, report, skipped_chunks=report.skipped_chunks)
+
+
+if __name__ == "__main__":
+    main()
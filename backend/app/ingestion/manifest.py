@@ -0,0 +1,127 @@
+import os
+import sqlite3
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from llama_index.core.schema import TextNode
+from loguru import logger
+
+from app.util.hash import content_hash
+
+# SQLite caps the number of bound parameters per statement
+QUERY_BATCH = 900
+# Alias "<collection>.sync.<version>" bumped by every ingestion that changed points
+SYNC_ALIAS_INFIX = ".sync."
+
+
+class SyncManifest:
+    """
+    Content hash -> Qdrant point id of every document in a collection, in a
+    local SQLite file.
+
+    Every run gets a number. Unchanged documents are only re-stamped with it;
+    new or changed ones are recorded once Qdrant acknowledged their upload.
+    At the end, points whose id was not stamped by the run are stale and get
+    deleted. The `salt` (embedding model and vector layout) is part of every
+    hash, so changing the model re-embeds everything.
+    """
+
+    def __init__(self, path: str, salt: str = ""):
+        self.path = path
+        self.salt = salt
+        self.run: Optional[int] = None
+        self._db: Optional[sqlite3.Connection] = None
+
+    def begin(self, reset: bool = False) -> int:
+        db = self._connect()
+        row = db.execute("SELECT value FROM meta WHERE key = 'salt'").fetchone()
+        if reset or (row is not None and row[0] != self.salt):
+            logger.info("Sync manifest reset, every document will be uploaded")
+            db.execute("DELETE FROM manifest")
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('salt', ?)", (self.salt,))
+
+        self.run = (db.execute("SELECT MAX(run) FROM manifest").fetchone()[0] or 0) + 1
+        db.commit()
+        return self.run
+
+    def document_hash(self, node: TextNode) -> str:
+        return content_hash(self.salt, node.node_id, node.text, node.metadata)
+
+    def changed(self, nodes: Sequence[TextNode]) -> Tuple[List[TextNode], List[str]]:
+        """
+        Returns the new or changed nodes with their hashes, and stamps the
+        unchanged ones as seen by this run.
+        """
+        db = self._connect()
+        hashes = [self.document_hash(node) for node in nodes]
+        known = set()
+        for start in range(0, len(hashes), QUERY_BATCH):
+            batch = hashes[start:start + QUERY_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            known.update(row[0] for row in db.execute(
+                f"SELECT hash FROM manifest WHERE hash IN ({placeholders})", batch
+            ))
+
+        db.executemany("UPDATE manifest SET run = ? WHERE hash = ?", [(self.run, h) for h in known])
+        db.commit()
+
+        changed = [(node, h) for node, h in zip(nodes, hashes) if h not in known]
+        return [node for node, _ in changed], [h for _, h in changed]
+
+    def record(self, hashes: Sequence[str], point_ids: Sequence[str]):
+        db = self._connect()
+        db.executemany(
+            "INSERT OR REPLACE INTO manifest (hash, point_id, run) VALUES (?, ?, ?)",
+            [(h, str(point_id), self.run) for h, point_id in zip(hashes, point_ids)],
+        )
+        db.commit()
+
+    def stale_point_ids(self) -> List[str]:
+        return [row[0] for row in self._connect().execute(
+            "SELECT DISTINCT point_id FROM manifest WHERE run < ? "
+            "AND point_id NOT IN (SELECT point_id FROM manifest WHERE run = ?)",
+            (self.run, self.run),
+        )]
+
+    def finish(self):
+        """
+        Forgets everything the run did not see. Call after the stale points are deleted.
+        """
+        db = self._connect()
+        db.execute("DELETE FROM manifest WHERE run < ?", (self.run,))
+        db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS manifest ("
+                "hash TEXT PRIMARY KEY, point_id TEXT NOT NULL, run INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS manifest_run ON manifest (run)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS manifest_point ON manifest (point_id)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        return self._db
+
+
+def sync_alias(collection_name: str, version: str) -> str:
+    return f"{collection_name}{SYNC_ALIAS_INFIX}{version}"
+
+
+def sync_version(collection_name: str, alias_names: Iterable[str]) -> Optional[str]:
+    """
+    Version of the last ingestion into the collection, read from its aliases.
+    In-place upserts leave the point counts unchanged, this does not.
+    """
+    prefix = f"{collection_name}{SYNC_ALIAS_INFIX}"
+    versions = sorted(name[len(prefix):] for name in alias_names if name.startswith(prefix))
+    return versions[-1] if versions else None
@@ -0,0 +1,359 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Deque, List, Optional, Tuple
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import MetadataMode, TextNode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from loguru import logger
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from app.analytics.column_store import source_fingerprint
+from app.analytics.dataset import iter_chunks
+from app.analytics.rollup import RollupCube
+from app.ingestion.documents import insight_documents, product_documents
+from app.ingestion.manifest import SYNC_ALIAS_INFIX, SyncManifest, sync_alias
+
+SparseDocFn = Callable[[List[str]], Tuple[List[List[int]], List[List[float]]]]
+DELETE_BATCH = 1000
+
+
+@dataclass
+class IngestionState:
+    """
+    Progress of one ingestion run. Chunks are committed in order, so a resumed
+    run skips the first `chunks_done` chunks of the same source file.
+    """
+    source_fingerprint: Optional[str]
+    collection_name: str
+    chunksize: int
+    chunks_done: int = 0
+    documents: int = 0
+    insights_done: bool = False
+
+
+class IngestionCheckpoint:
+    """
+    JSON checkpoint next to the data, written atomically after every chunk
+    whose points are all acknowledged by Qdrant.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, fresh: IngestionState) -> IngestionState:
+        if not os.path.exists(self.path):
+            return fresh
+
+        with open(self.path) as f:
+            state = IngestionState(**json.load(f))
+        key = (state.source_fingerprint, state.collection_name, state.chunksize)
+        if key != (fresh.source_fingerprint, fresh.collection_name, fresh.chunksize):
+            logger.info("Checkpoint belongs to another source file or settings, starting over")
+            return fresh
+
+        logger.info(f"Resuming after {state.chunks_done} chunks and {state.documents} documents")
+        return state
+
+    def save(self, state: IngestionState):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(asdict(state), f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@dataclass
+class IngestionReport:
+    documents: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    skipped_chunks: int = 0
+    seconds: float = 0.0
+    embed_seconds: float = 0.0
+    upload_seconds: float = 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class PendingChunk:
+    index: int
+    documents: int
+    uploads: List[asyncio.Task] = field(default_factory=list)
+
+
+class IngestionPipeline:
+    """
+    Builds the stats_insights collection from the raw product table.
+
+    The source is streamed in chunks; each chunk becomes one statistics
+    document per product, embedded in large batches on a worker thread and
+    upserted with `upload_points` batches on other threads, with at most
+    `max_in_flight` uploads outstanding. Embedding the next batch overlaps
+    the uploads of the previous ones. Once every product is in, segment and
+    collection-wide insight documents are generated from the rollup cube.
+
+    Points use the dense / sparse vector names and the payload layout of
+    llama-index's QdrantVectorStore, so the retriever reads them unchanged.
+
+    With a SyncManifest, only documents whose content hash is not in the
+    manifest are embedded and uploaded, and points of documents that no
+    longer exist are deleted at the end.
+    """
+
+    def __init__(
+            self,
+            client: QdrantClient,
+            collection_name: str,
+            embed_model: BaseEmbedding,
+            dense_vector_name: str = "text-dense",
+            sparse_vector_name: Optional[str] = None,
+            sparse_doc_fn: Optional[SparseDocFn] = None,
+            sparse_idf: bool = False,
+            chunksize: int = 10_000,
+            embed_batch_size: int = 256,
+            upload_batch_size: int = 256,
+            max_in_flight: int = 4,
+            max_retries: int = 3,
+            manifest: Optional[SyncManifest] = None,
+    ):
+        self.client = client
+        self.collection_name = collection_name
+        self.embed_model = embed_model
+        self.dense_vector_name = dense_vector_name
+        self.sparse_vector_name = sparse_vector_name
+        self.sparse_doc_fn = sparse_doc_fn
+        self.sparse_idf = sparse_idf
+        self.chunksize = chunksize
+        self.embed_batch_size = embed_batch_size
+        self.upload_batch_size = upload_batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.manifest = manifest
+
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._collection_ready = False
+        self._report = IngestionReport()
+
+    async def run(
+            self,
+            source_path: str,
+            checkpoint: Optional[IngestionCheckpoint] = None,
+            rollup_dir: Optional[str] = None,
+            max_brands: int = 200,
+    ) -> IngestionReport:
+        if self.manifest and checkpoint:
+            raise ValueError("A delta sync has to see every document, it cannot resume from a checkpoint")
+
+        started = time.perf_counter()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._report = report = IngestionReport()
+        self._collection_ready = False
+        if self.manifest:
+            # A dropped collection invalidates whatever the manifest remembers
+            exists = await asyncio.to_thread(self.client.collection_exists, self.collection_name)
+            self.manifest.begin(reset=not exists)
+
+        fresh = IngestionState(source_fingerprint(source_path), self.collection_name, self.chunksize)
+        state = checkpoint.load(fresh) if checkpoint else fresh
+
+        pending: Deque[PendingChunk] = deque()
+        start_row = 0
+        try:
+            for index, chunk in enumerate(iter_chunks(source_path, self.chunksize)):
+                if index < state.chunks_done:
+                    start_row += len(chunk)
+                    report.skipped_chunks += 1
+                    continue
+
+                nodes = product_documents(chunk, start_row)
+                start_row += len(chunk)
+                pending.append(PendingChunk(index, len(nodes), await self.ingest(nodes)))
+                self.commit(pending, state, checkpoint)
+                elapsed = time.perf_counter() - started
+                logger.info(f"Chunk {index}: {report.documents} documents uploaded, {report.documents / elapsed:.0f} docs/s")
+
+            self.commit(pending, state, checkpoint)
+            while pending:
+                await asyncio.gather(*pending[0].uploads)
+                self.commit(pending, state, checkpoint)
+        except BaseException:
+            for chunk in pending:
+                for task in chunk.uploads:
+                    task.cancel()
+            raise
+
+        if not state.insights_done:
+            cube = RollupCube(rollup_dir or os.path.join(os.path.dirname(os.path.abspath(source_path)), "rollup"))
+            await asyncio.to_thread(cube.refresh, source_path)
+            nodes = insight_documents(cube, max_brands=max_brands)
+            await asyncio.gather(*await self.ingest(nodes))
+            state.documents += len(nodes)
+            state.insights_done = True
+            if checkpoint:
+                checkpoint.save(state)
+
+        if self.manifest:
+            report.deleted = await self.delete_stale()
+        if report.documents or report.deleted:
+            await self.bump_version()
+
+        report.seconds = time.perf_counter() - started
+        logger.info(
+            f"Ingested {report.documents} documents into {self.collection_name} in {report.seconds:.1f}s "
+            f"({report.documents_per_second:.0f} docs/s, embedding {report.embed_seconds:.1f}s, "
+            f"upload {report.upload_seconds:.1f}s), {report.skipped} unchanged, {report.deleted} deleted, "
+            f"{report.skipped_chunks} chunks skipped from the checkpoint"
+        )
+        return report
+
+    async def ingest(self, nodes: List[TextNode]) -> List[asyncio.Task]:
+        """
+        Embeds `nodes` batch by batch and schedules their uploads. Returns the
+        upload tasks; waits only when `max_in_flight` uploads are outstanding.
+        """
+        hashes: List[Optional[str]] = [None] * len(nodes)
+        if self.manifest:
+            total = len(nodes)
+            nodes, hashes = self.manifest.changed(nodes)
+            self._report.skipped += total - len(nodes)
+
+        uploads = []
+        for start in range(0, len(nodes), self.embed_batch_size):
+            batch = nodes[start:start + self.embed_batch_size]
+            points = await asyncio.to_thread(self.build_points, batch)
+            await self.ensure_collection(len(next(iter(points[0].vector.values()))))
+
+            for offset in range(0, len(points), self.upload_batch_size):
+                end = offset + self.upload_batch_size
+                await self._in_flight.acquire()
+                uploads.append(asyncio.create_task(
+                    self.upload(points[offset:end], hashes[start + offset:start + end])
+                ))
+        return uploads
+
+    def build_points(self, nodes: List[TextNode]) -> List[rest.PointStruct]:
+        started = time.perf_counter()
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        embeddings = self.embed_model.get_text_embedding_batch(texts)
+        vectors = [{self.dense_vector_name: embedding} for embedding in embeddings]
+        if self.sparse_doc_fn is not None:
+            indices, values = self.sparse_doc_fn(texts)
+            for vector, i, v in zip(vectors, indices, values):
+                vector[self.sparse_vector_name] = rest.SparseVector(indices=i, values=v)
+        self._report.embed_seconds += time.perf_counter() - started
+
+        return [
+            rest.PointStruct(
+                id=node.node_id,
+                vector=vector,
+                payload=node_to_metadata_dict(node, remove_text=False, flat_metadata=False),
+            )
+            for node, vector in zip(nodes, vectors)
+        ]
+
+    async def upload(self, points: List[rest.PointStruct], hashes: List[Optional[str]]):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(
+                self.client.upload_points,
+                collection_name=self.collection_name,
+                points=points,
+                batch_size=len(points),
+                max_retries=self.max_retries,
+                wait=True,
+            )
+        finally:
+            self._in_flight.release()
+        self._report.upload_seconds += time.perf_counter() - started
+        self._report.documents += len(points)
+        if self.manifest:
+            self.manifest.record(hashes, [point.id for point in points])
+
+    async def delete_stale(self) -> int:
+        """
+        Deletes the points of documents the run did not produce, then drops
+        them from the manifest.
+        """
+        stale = self.manifest.stale_point_ids()
+        for start in range(0, len(stale), DELETE_BATCH):
+            await asyncio.to_thread(
+                self.client.delete,
+                collection_name=self.collection_name,
+                points_selector=rest.PointIdsList(points=stale[start:start + DELETE_BATCH]),
+                wait=True,
+            )
+        self.manifest.finish()
+        return len(stale)
+
+    async def bump_version(self):
+        """
+        Points a fresh sync alias at the collection and drops the previous
+        ones, so readers such as the semantic cache notice in-place updates.
+        """
+        response = await asyncio.to_thread(self.client.get_collection_aliases, self.collection_name)
+        prefix = f"{self.collection_name}{SYNC_ALIAS_INFIX}"
+        version = f"{time.time_ns():020d}"
+        operations = [
+            rest.DeleteAliasOperation(delete_alias=rest.DeleteAlias(alias_name=alias.alias_name))
+            for alias in response.aliases if alias.alias_name.startswith(prefix)
+        ]
+        operations.append(rest.CreateAliasOperation(create_alias=rest.CreateAlias(
+            collection_name=self.collection_name, alias_name=sync_alias(self.collection_name, version),
+        )))
+        await asyncio.to_thread(self.client.update_collection_aliases, change_aliases_operations=operations)
+        logger.info(f"Collection {self.collection_name} now at sync version {version}")
+
+    async def ensure_collection(self, vector_size: int):
+        if self._collection_ready:
+            return
+        self._collection_ready = True
+        if await asyncio.to_thread(self.client.collection_exists, self.collection_name):
+            return
+
+        sparse_config = None
+        if self.sparse_doc_fn is not None:
+            sparse_config = {self.sparse_vector_name: rest.SparseVectorParams(
+                index=rest.SparseIndexParams(),
+                modifier=rest.Modifier.IDF if self.sparse_idf else None,
+            )}
+        await asyncio.to_thread(
+            self.client.create_collection,
+            collection_name=self.collection_name,
+            vectors_config={self.dense_vector_name: rest.VectorParams(size=vector_size, distance=rest.Distance.COSINE)},
+            sparse_vectors_config=sparse_config,
+        )
+        logger.info(f"Created collection {self.collection_name} with {vector_size}-d vectors")
+
+    def commit(
+            self,
+            pending: Deque[PendingChunk],
+            state: IngestionState,
+            checkpoint: Optional[IngestionCheckpoint],
+    ):
+        """
+        Checkpoints the leading chunks whose uploads have all finished. A failed
+        upload is raised here, before anything after it is checkpointed.
+        """
+        advanced = False
+        while pending and all(task.done() for task in pending[0].uploads):
+            chunk = pending.popleft()
+            for task in chunk.uploads:
+                task.result()
+            state.chunks_done = chunk.index + 1
+            state.documents += chunk.documents
+            advanced = True
+
+        if advanced and checkpoint:
+            checkpoint.save(state)
@@ -0,0 +1,56 @@
+"""
+Delta sync of the Qdrant collection with the product table. Every product
+and insight document is fingerprinted with a content hash; only documents
+whose hash is not in the local manifest are embedded and upserted, and the
+points of documents that disappeared from the source are deleted.
+
+    python -m app.ingestion.sync [--source data/products.csv] [--qdrant-path data/qdrant] [--reset]
+
+Reports how many documents were skipped, updated and deleted, and the wall time.
+"""
+import argparse
+import asyncio
+import os
+
+from loguru import logger
+
+from app.core.config import configs
+from app.ingestion.ingest import add_arguments, build_pipeline, print_report
+from app.ingestion.manifest import SyncManifest
+
+
+def vector_layout(args: argparse.Namespace) -> str:
+    """
+    Everything besides the document that decides a point's vectors.
+    """
+    sparse_model = "" if args.no_hybrid or not configs.HYBRID_ENABLED else configs.SPARSE_MODEL_NAME
+    return f"{configs.EMBEDDING_BACKEND}:{configs.EMBEDDING_MODEL_NAME}|{sparse_model}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--manifest", help="Defaults to data/ingestion/<collection>.manifest.sqlite3")
+    parser.add_argument("--reset", action="store_true", help="Forget the manifest and upload every document")
+    args = parser.parse_args()
+    if not args.collection:
+        parser.error("--collection or QDRANT_COLLECTION_NAME is required")
+
+    manifest = SyncManifest(
+        args.manifest or os.path.join(configs.PROJECT_ROOT, "data", "ingestion", f"{args.collection}.manifest.sqlite3"),
+        salt=vector_layout(args),
+    )
+    if args.reset:
+        manifest.begin(reset=True)
+
+    pipeline = build_pipeline(args, manifest=manifest)
+    logger.info(f"Syncing {args.collection} with {args.source}")
+    report = asyncio.run(pipeline.run(args.source, rollup_dir=args.rollup_dir, max_brands=args.max_brands))
+    pipeline.client.close()
+    manifest.close()
+
+    print_report(args.collection, report, updated=report.documents, skipped=report.skipped, deleted=report.deleted)
+
+
+if __name__ == "__main__":
+    main()
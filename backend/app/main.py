@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -6,6 +7,7 @@ from starlette.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.ai.batched_embedding import BatchingEmbedding
 from app.api.routes import routers
 from app.core.config import configs
 from app.core.containers.application_container import ApplicationContainer
@@ -33,7 +35,25 @@ class AppCreator:
         @asynccontextmanager
         async def lifespan(app: FastAPI):
             logger.info("Starting application...")
+            try:
+                await self.container.chatbot.query_analyzer().ensure_payload_indexes()
+            except Exception as e:
+                logger.error(f"Error preparing payload indexes: {e}")
+            try:
+                await asyncio.to_thread(self.container.chatbot.reranker().load_model)
+            except Exception as e:
+                logger.error(f"Error loading the reranker model: {e}")
+            try:
+                analytics_engine = self.container.chatbot.analytics_engine()
+                if configs.ANALYTICS_ENABLED and analytics_engine.available():
+                    await asyncio.to_thread(analytics_engine.load)
+            except Exception as e:
+                logger.error(f"Error loading the analytics column store: {e}")
+            if configs.ROLLUP_ENABLED:
+                await self.container.chatbot.rollup_router().refresh()
             yield
+            await self.container.chatbot.session_store().close()
+            BatchingEmbedding.close_all()
             logger.info("Application shutdown complete")
 
         self.app = FastAPI(
@@ -9,11 +9,37 @@ class MessageResponse(BaseModel):
 
 class MessageCreate(BaseModel):
     session_id: str
-    history: list[MessageResponse]
+    # Full history is only needed when the server reports a session cache miss
+    history: Optional[list[MessageResponse]] = None
+    # Session version received in the last `session` event
+    version: Optional[int] = None
     role: str  # user|assistant
     content: str
 
 
+class SessionState(BaseModel):
+    session_id: str
+    version: int
+
+
+class BatchQuestion(BaseModel):
+    id: str
+    content: str
+
+
+class BatchRequest(BaseModel):
+    questions: List[BatchQuestion]
+    # Answers generated at once, capped by the server setting
+    max_concurrency: Optional[int] = None
+
+
+class BatchAnswer(BaseModel):
+    id: str
+    text: str = ""
+    chart: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
 # Chart data schemas
 class ChartData(BaseModel):
     labels: List[str]
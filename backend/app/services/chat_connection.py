@@ -0,0 +1,141 @@
+import asyncio
+import json
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from loguru import logger
+from pydantic import ValidationError
+
+from app.chatbot.events import CANCELLED, ERROR, SESSION, START, ChatEvent
+from app.exceptions.errors.CustomClientException import ClientException
+from app.schema.chat_schema import MessageCreate
+from app.services.chatbot_service import ChatbotService
+from app.util.sse import EventCoalescer
+
+
+class ChatConnection:
+    """
+    One persistent WebSocket carrying the turns of any number of sessions.
+
+    Client frames are JSON objects tagged with a `type`:
+        {"type": "message", "session_id", "content", "role", "version"?, "history"?, "id"?}
+        {"type": "cancel", "session_id"}
+
+    Every server frame is tagged with its session, and with the `id` of the
+    message it answers when the client sent one:
+        {"session_id", "id"?, "event": "start" | "text" | "chart" | "session" | "error" | "cancelled" | "done", "data"}
+
+    Turns of different sessions run concurrently, a new message for a busy
+    session supersedes its turn as on the SSE endpoint. The sessions used on
+    the connection are kept hot in the session store while it is open.
+    """
+
+    def __init__(
+            self,
+            websocket: WebSocket,
+            service: ChatbotService,
+            coalescer: EventCoalescer,
+            keepalive_seconds: float = 60,
+    ):
+        self.websocket = websocket
+        self.service = service
+        self.coalescer = coalescer
+        self.keepalive_seconds = keepalive_seconds
+
+        self.sessions: Set[str] = set()
+        # Latest turn of every session with the tags of its message
+        self._turns: Dict[str, Tuple[asyncio.Task, Dict[str, Any]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._send_lock = asyncio.Lock()
+        self._closed = False
+
+    async def serve(self):
+        await self.websocket.accept()
+        keepalive = asyncio.create_task(self._keep_alive())
+        try:
+            while True:
+                await self.handle(await self.websocket.receive_text())
+        except WebSocketDisconnect:
+            logger.info(f"Chat WebSocket closed with {len(self._tasks)} turns in flight")
+        finally:
+            self._closed = True
+            keepalive.cancel()
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def handle(self, raw: str):
+        try:
+            frame = json.loads(raw)
+            kind = frame.pop("type")
+        except (ValueError, AttributeError, KeyError):
+            await self.send(None, ChatEvent(ERROR, "Frames must be JSON objects with a type"))
+            return
+
+        if kind == "message":
+            tags = {"id": frame.pop("id")} if "id" in frame else {}
+            try:
+                data = MessageCreate(**frame)
+            except ValidationError as e:
+                await self.send(frame.get("session_id"), ChatEvent(ERROR, str(e)), **tags)
+                return
+            self.start_turn(data, tags)
+
+        elif kind == "cancel":
+            session_id = frame.get("session_id")
+            turn, tags = self._turns.get(session_id, (None, {}))
+            if turn is not None and not turn.done():
+                turn.cancel()
+                await asyncio.wait({turn})
+                await self.send(session_id, ChatEvent(CANCELLED, "client"), **tags)
+
+        else:
+            await self.send(frame.get("session_id"), ChatEvent(ERROR, f"Unknown frame type {kind}"))
+
+    def start_turn(self, data: MessageCreate, tags: Dict[str, Any]):
+        task = asyncio.create_task(self.run_turn(data, tags))
+        self._turns[data.session_id] = (task, tags)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run_turn(self, data: MessageCreate, tags: Dict[str, Any]):
+        session_id = data.session_id
+        try:
+            try:
+                await self.service.resolve_session(session_id, data.version, data.history)
+            except HTTPException as e:
+                code = e.code if isinstance(e, ClientException) else None
+                await self.send(session_id, ChatEvent(ERROR, e.detail), code=code, **tags)
+                return
+
+            self.sessions.add(session_id)
+            await self.send(session_id, ChatEvent(START), **tags)
+            async for batch in self.coalescer.batches(self.service.stream_turn(session_id, data.content)):
+                for event in batch:
+                    await self.send(session_id, event, **tags)
+
+        except Exception as e:
+            logger.error(f"Error in WebSocket turn for session {session_id}: {e}")
+            await self.send(session_id, ChatEvent(ERROR, str(e)), **tags)
+        finally:
+            if self._turns.get(session_id, (None,))[0] is asyncio.current_task():
+                del self._turns[session_id]
+
+    async def send(self, session_id: Optional[str], event: ChatEvent, **extra: Any):
+        if self._closed:
+            return
+
+        data = event.data.model_dump() if event.kind == SESSION else event.data
+        frame = {"session_id": session_id, **extra, "event": event.kind, "data": data}
+
+        try:
+            async with self._send_lock:
+                await self.websocket.send_text(json.dumps(frame, ensure_ascii=False))
+        except (WebSocketDisconnect, RuntimeError):
+            # The receive loop notices the disconnect and cancels the turns
+            self._closed = True
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self.keepalive_seconds)
+            self.service.keep_alive(self.sessions)
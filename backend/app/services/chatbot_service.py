@@ -1,98 +1,91 @@
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional
+
 from app.chatbot.chat_engine import ChatEngine
-from app.schema.chat_schema import MessageResponse
+from app.chatbot.events import DONE, ERROR, SESSION, ChatEvent
+from app.chatbot.session_store import SessionStore
+from app.chatbot.turn_registry import TurnRegistry
+from app.exceptions.custom_error import CustomError
+from app.schema.chat_schema import BatchAnswer, BatchQuestion, MessageResponse, SessionState
 from app.services.base_service import BaseService
-import json
-
-
-# Helper function to adapt different types of generators to async generator
-async def async_generator_adapter(generator):
-    """
-    Adapts any type of generator (sync or async) to be used with async for.
-    """
-    # If it's already an async generator
-    if hasattr(generator, '__aiter__'):
-        try:
-            async for item in generator:
-                yield item
-        except Exception as e:
-            print(f"Error in async generator: {e}")
-            raise
-    else:
-        # If it's a regular generator or iterable
-        try:
-            if hasattr(generator, '__iter__'):
-                for item in generator:
-                    yield item
-            else:
-                # If it's not iterable at all, yield it as a single item
-                yield generator
-        except TypeError:
-            # If it's not iterable at all, yield it as a single item
-            yield generator
-        except Exception as e:
-            print(f"Error in sync generator: {e}")
-            raise
 
 
 class ChatbotService(BaseService):
     def __init__(
             self,
-            chat_engine: ChatEngine
+            chat_engine: ChatEngine,
+            session_store: SessionStore,
+            turn_registry: TurnRegistry,
+            batch_max_questions: int = 200,
+            batch_max_concurrency: int = 8
     ):
         self.chat_engine = chat_engine
+        self.session_store = session_store
+        self.turn_registry = turn_registry
+        self.batch_max_questions = batch_max_questions
+        self.batch_max_concurrency = batch_max_concurrency
         super().__init__()
 
-    async def generate_message_stream(self, session_id: str, message: str, history: list[MessageResponse]):
-        try:
+    async def resolve_session(self, session_id: str, version: Optional[int], history: Optional[list[MessageResponse]]):
+        """
+        Loads the server-side session, raising a 409 when the client has to resend its full history.
+        """
+        history = [message.model_dump() for message in history] if history else None
+        current_version = await self.session_store.resolve(session_id, version, history)
+        if current_version is None:
+            raise CustomError.SESSION_CACHE_MISS.as_exception()
 
-            history = history or []
-            history = [message.model_dump() for message in history]
-            self.chat_engine.compose(session_id, history, message)
+        return current_version
 
-            full_response = ""
-            try:
-                generator = self.chat_engine.stream_chat(message)
-                if hasattr(generator, '__await__'):
-                    generator = await generator
+    async def delete_session(self, session_id: str):
+        await self.session_store.delete(session_id)
 
-                async for chunk in async_generator_adapter(generator):
-                    if chunk:
-                        # Handle error messages
-                        if chunk.startswith("ERROR:"):
-                            yield chunk
-                            return
+    def keep_alive(self, session_ids: Iterable[str]):
+        self.session_store.keep_alive(session_ids)
 
-                        # Try to parse as JSON
-                        try:
-                            data = json.loads(chunk)
-
-                            # Handle text chunks
-                            if data.get("type") == "text":
-                                content = data.get("content", "")
-                                full_response += content
-                                yield content
-
-                            # Handle chart data
-                            elif data.get("type") == "chart":
-                                # Yield chart data as special format
-                                chart_json = json.dumps(data, ensure_ascii=False)
-                                yield f"CHART:{chart_json}"
+    def stream_turn(
+            self,
+            session_id: str,
+            message: str,
+            is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncIterator[ChatEvent]:
+        """
+        Streams the answer as a cancellable turn: a client disconnect or a newer
+        message for the same session stops generation, retrieval and charting.
+        """
+        return self.turn_registry.stream(
+            session_id, self.generate_message_stream(session_id, message), is_disconnected
+        )
+
+    def answer_batch(
+            self, questions: List[BatchQuestion], max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[BatchAnswer]:
+        """
+        Answers standalone questions, yielding each answer as it completes.
+        """
+        if len(questions) > self.batch_max_questions:
+            raise CustomError.BATCH_TOO_LARGE.as_exception()
+
+        concurrency = min(max_concurrency or self.batch_max_concurrency, self.batch_max_concurrency)
+        return self.chat_engine.answer_batch(questions, max_concurrency=max(concurrency, 1))
+
+    async def generate_message_stream(self, session_id: str, message: str) -> AsyncIterator[ChatEvent]:
+        """
+        Streams the engine's events unchanged, then commits the turn and ends
+        with the new session version and `done`.
+        """
+        try:
+            turn = await self.chat_engine.compose(session_id, message)
 
-                        except json.JSONDecodeError:
-                            # If it's not JSON, treat as text (backward compatibility)
-                            full_response += chunk
-                            yield chunk
+            async for event in self.chat_engine.stream_chat(turn):
+                yield event
+                if event.kind == ERROR:
+                    return
 
-            except Exception as e:
-                error_msg = f"ERROR: Failed to generate response - {str(e)}"
-                print(error_msg)
-                yield error_msg
-                return
+            version = await self.session_store.commit(session_id, turn.exchange)
+            yield ChatEvent(SESSION, SessionState(session_id=session_id, version=version))
+            yield ChatEvent(DONE)
 
         except Exception as e:
-            error_msg = f"ERROR: {str(e)}"
-            print(error_msg)
-            yield error_msg
-
-
-
+            error_msg = f"Failed to generate response - {str(e)}"
+            print(f"ERROR: {error_msg}")
+            yield ChatEvent(ERROR, error_msg)
@@ -1,5 +1,21 @@
+import hashlib
+import json
 import uuid
 
 
 def get_rand_hash(length: int = 16) -> str:
     return uuid.uuid4().hex[:length]
+
+
+def content_hash(*parts, length: int = 32) -> str:
+    """
+    Stable fingerprint of strings and JSON-serializable values: equal content
+    gives the same hash across processes and runs, key order does not matter.
+    """
+    digest = hashlib.blake2b(digest_size=length // 2)
+    for part in parts:
+        data = part if isinstance(part, str) else json.dumps(part, sort_keys=True, ensure_ascii=False, default=str)
+        digest.update(data.encode("utf-8"))
+        # Separator, so ("ab", "c") and ("a", "bc") differ
+        digest.update(b"\x00")
+    return digest.hexdigest()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+from typing import AsyncIterator, List
+
+from app.chatbot.events import CHART, DONE, ERROR, SESSION, TERMINAL, TEXT, ChatEvent
+
+_finished = object()
+
+
+class EventCoalescer:
+    """
+    Groups a chat event stream into batches, one per transport write.
+
+    Consecutive text deltas are merged into one text event until
+    `flush_bytes` are buffered or the oldest buffered delta is `flush_ms`
+    old, so a stream makes one write per window instead of one per token.
+    A pause in the stream flushes at the deadline, not at the next token.
+    Buffered text goes out in the same batch as the next other event. A
+    stream that ends without a terminal event is closed with `done`.
+    """
+
+    def __init__(self, flush_ms: float = 20, flush_bytes: int = 512):
+        self.flush_seconds = flush_ms / 1000
+        self.flush_bytes = flush_bytes
+
+    async def batches(self, events: AsyncIterator[ChatEvent]) -> AsyncIterator[List[ChatEvent]]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        # Read ahead on a task, so waiting for the next event can time out
+        # without cancelling the event stream itself
+        pump = asyncio.create_task(self._pump(events, queue))
+        buffer: List[str] = []
+        size = 0
+        deadline = 0.0
+
+        def text() -> List[ChatEvent]:
+            nonlocal buffer, size
+            batch = [ChatEvent(TEXT, "".join(buffer))] if buffer else []
+            buffer, size = [], 0
+            return batch
+
+        try:
+            while True:
+                if buffer and queue.empty():
+                    try:
+                        async with asyncio.timeout_at(deadline):
+                            item = await queue.get()
+                    except TimeoutError:
+                        yield text()
+                        continue
+                else:
+                    item = await queue.get()
+
+                if item is _finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                if item.kind == TEXT:
+                    if not buffer:
+                        deadline = loop.time() + self.flush_seconds
+                    buffer.append(item.data)
+                    size += len(item.data.encode("utf-8"))
+                    if size >= self.flush_bytes:
+                        yield text()
+                    continue
+
+                yield text() + [item]
+                if item.kind in TERMINAL:
+                    return
+
+            yield text() + [ChatEvent(DONE)]
+
+        finally:
+            pump.cancel()
+
+    @staticmethod
+    async def _pump(events: AsyncIterator[ChatEvent], queue: asyncio.Queue):
+        try:
+            async for event in events:
+                queue.put_nowait(event)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(_finished)
+
+
+class SSEWriter(EventCoalescer):
+    """
+    Serializes chat events to server-sent events, one write per coalesced batch.
+    """
+
+    async def frames(self, events: AsyncIterator[ChatEvent]) -> AsyncIterator[str]:
+        async for batch in self.batches(events):
+            yield "".join(self.frame(event) for event in batch)
+
+    @staticmethod
+    def frame(event: ChatEvent) -> str:
+        if event.kind == TEXT:
+            # The client turns the escaped newlines back, data lines cannot hold raw ones
+            text = event.data.replace("\n", "\\n")
+            return f"event: message\ndata: {text}\n\n"
+        if event.kind == CHART:
+            data = json.dumps(event.data, ensure_ascii=False)
+        elif event.kind == SESSION:
+            data = event.data.model_dump_json()
+        elif event.kind == ERROR:
+            data = event.data
+        else:
+            # The client treats any other event with data as answer text
+            data = ""
+        return f"event: {event.kind}\ndata: {data}\n\n"
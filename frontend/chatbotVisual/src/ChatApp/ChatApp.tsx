@@ -13,6 +13,72 @@ export default function ChatApp() {
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
   const chartInstances = useRef<{ [key: string]: Chart }>({});
+  const sessionVersion = useRef<number | null>(null);
+  // Chart being streamed: skeleton first, then points, then the validated chart
+  const streamingChart = useRef<{ id: string; data: any } | null>(null);
+
+  const chartColors = ["#FF6384", "#36A2EB", "#FFCE56", "#4BC0C0", "#9966FF"];
+  const styleDatasets = (datasets: any[] = []) =>
+    datasets.map((ds: any) => ({
+      ...ds,
+      backgroundColor: !ds.backgroundColor || ds.backgroundColor === "auto" ? chartColors : ds.backgroundColor,
+      borderColor: !ds.borderColor || ds.borderColor === "auto" ? chartColors : ds.borderColor,
+    }));
+
+  const refreshStreamingChart = () => {
+    const current = streamingChart.current;
+    const instance = current && chartInstances.current[current.id];
+    if (!current || !instance) return;
+    instance.data.labels = current.data.data.labels;
+    instance.data.datasets = styleDatasets(current.data.data.datasets);
+    instance.update("none");
+  };
+
+  const handleChartEvent = (p: any) => {
+    const current = streamingChart.current;
+
+    if (p.type === "chart_skeleton") {
+      const id = `chart-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+      const data = { ...p, type: "chart" };
+      streamingChart.current = { id, data };
+      setMessages(m => [...m, { type: "chart", id, title: p.config?.title || "Biểu đồ", data }]);
+      return;
+    }
+
+    if (p.type === "chart_points" && current) {
+      const datasets = current.data.data.datasets;
+      for (const update of p.datasets || []) {
+        const ds = datasets[update.index] || (datasets[update.index] = { label: update.label, data: [] });
+        ds.data.splice(update.offset, update.data.length, ...update.data);
+      }
+      refreshStreamingChart();
+      return;
+    }
+
+    if (p.type === "chart_discard" && current) {
+      chartInstances.current[current.id]?.destroy();
+      delete chartInstances.current[current.id];
+      streamingChart.current = null;
+      setMessages(m => m.filter(msg => msg.type !== "chart" || msg.id !== current.id));
+      return;
+    }
+
+    if (p.type === "chart") {
+      if (p.description) {
+        setMessages(m => [...m, { type: "text", content: `🤖 ${p.description}` }]);
+      }
+      if (current) {
+        // Replace the streamed points with the validated chart
+        current.data.data = p.data;
+        current.data.config = p.config;
+        refreshStreamingChart();
+        streamingChart.current = null;
+        return;
+      }
+      const id = `chart-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+      setMessages(m => [...m, { type: "chart", id, title: p.config?.title || p.title || "Biểu đồ", data: p }]);
+    }
+  };
 
   const cleanContent = (raw: string) => {
     let s = raw.replace(/\\n/g, "\n");
@@ -48,19 +114,27 @@ export default function ChatApp() {
     setLoading(true);
 
     try {
-      const res = await fetch("https://validity-meetings-alabama-silent.trycloudflare.com/api/v1/chat/generate-response", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Accept: "text/event-stream",
-        },
-        body: JSON.stringify({
-          session_id: "user456",
-          content: question,
-          history: [],
-          role: "user",
-        }),
-      });
+      const postMessage = (version: number | null) =>
+        fetch("https://validity-meetings-alabama-silent.trycloudflare.com/api/v1/chat/generate-response", {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            Accept: "text/event-stream",
+          },
+          body: JSON.stringify({
+            session_id: "user456",
+            content: question,
+            version,
+            role: "user",
+          }),
+        });
+
+      let res = await postMessage(sessionVersion.current);
+      if (res.status === 409) {
+        // Server-side session is out of date, continue from what the server has
+        sessionVersion.current = null;
+        res = await postMessage(null);
+      }
 
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const reader = res.body?.getReader();
@@ -87,16 +161,16 @@ export default function ChatApp() {
           }
           if (!evtData || evtData === "[DONE]") continue;
 
+          if (evtType === "session") {
+            try {
+              sessionVersion.current = JSON.parse(evtData).version ?? null;
+            } catch {}
+            continue;
+          }
+
           if (evtType === "chart" && evtData.startsWith("{") && evtData.endsWith("}")) {
             try {
-              const p = JSON.parse(evtData);
-              if (p.type === "chart") {
-                const id = `chart-${Date.now()}-${Math.random().toString(36).slice(2)}`;
-                if (p.description) {
-                  setMessages(m => [...m, { type: "text", content: `🤖 ${p.description}` }]);
-                }
-                setMessages(m => [...m, { type: "chart", id, title: p.config?.title || p.title || "Biểu đồ", data: p }]);
-              }
+              handleChartEvent(JSON.parse(evtData));
             } catch {}
             continue;
           }
@@ -124,6 +198,7 @@ export default function ChatApp() {
     } catch (err: any) {
       setMessages(m => [...m, { type: "text", content: `⚠️ Lỗi khi kết nối: ${err.message}` }]);
     } finally {
+      streamingChart.current = null;
       setLoading(false);
     }
   };
@@ -140,15 +215,7 @@ export default function ChatApp() {
           const ctx = canvas.getContext("2d");
           if (!ctx) return;
           try {
-            const data = { ...msg.data.data };
-            const colors = ["#FF6384", "#36A2EB", "#FFCE56", "#4BC0C0", "#9966FF"];
-            if (data.datasets) {
-              data.datasets = data.datasets.map((ds: any) => ({
-                ...ds,
-                backgroundColor: ds.backgroundColor === "auto" ? colors : ds.backgroundColor,
-                borderColor: ds.borderColor === "auto" ? colors : ds.borderColor,
-              }));
-            }
+            const data = { ...msg.data.data, datasets: styleDatasets(msg.data.data?.datasets) };
             const chart = new Chart(ctx, {
               type: msg.data.config?.type || msg.data.type || "bar",
               data,